@@ -0,0 +1,93 @@
+"""Agrupamento de requisições idênticas simultâneas (*single flight*).
+
+Quando várias requisições com a mesma chave chegam enquanto a primeira ainda
+está em andamento, apenas ela executa o trabalho; as demais aguardam e
+recebem o mesmo resultado (ou a mesma exceção). Terminada a execução, a
+chave é liberada e uma nova requisição volta a executar normalmente.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+
+# Execução em andamento compartilhada entre threads
+class _Call:
+    """Resultado de uma execução síncrona aguardada por outras threads."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+# Coalesce chamadas concorrentes com a mesma chave
+class SingleFlight:
+    """Executa uma única vez cada chave em andamento.
+
+    :meth:`do` atende rotas síncronas (executadas em threads) e :meth:`ado`
+    rotas assíncronas. ``calls`` conta as execuções efetivas e ``shared`` as
+    requisições atendidas pelo resultado de outra.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._tasks: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Chama ``fn`` ou aguarda a chamada em andamento para ``key``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Versão assíncrona de :meth:`do`.
+
+        O trabalho roda em uma tarefa própria: se o cliente que a iniciou
+        desconectar, as demais requisições continuam aguardando o resultado.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            self.calls += 1
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        """Retorna quantas requisições foram executadas e compartilhadas."""
+        with self._lock:
+            total = self.calls + self.shared
+            return {
+                "calls": self.calls,
+                "shared": self.shared,
+                "in_flight": len(self._calls) + len(self._tasks),
+                "shared_rate": self.shared / total if total else 0.0,
+            }
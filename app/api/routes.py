@@ -1,24 +1,123 @@
-from fastapi import APIRouter, Body
-from datetime import datetime
+from fastapi import APIRouter, Body, HTTPException
+from fastapi.responses import StreamingResponse
+from datetime import date, datetime
+import asyncio
+import json
 
+from app.api.coalesce import SingleFlight
 from app.ingestion.ingestor import ContractIngestor, ContractStructuredDataIngestor
 from app.storage.vector_store_adapter import VectorStoreAdapter
 from app.storage.relational_db_adapter import (
     RelationalDBAdapter,
-    Contract,
     Prompt,
 )
-from app.models.contrato import Contrato
+from app.models.contrato import CAMPOS_CACHE, CAMPOS_RELATORIO, Contrato
 from app.chat.chatbot import ContractChatbot
+from app.chat.pool import ChatbotPool
+from app.chat.session import SessionStore
+from app.config.settings import (
+    CHAT_MAX_SESSIONS,
+    CHAT_MODEL,
+    CHAT_POOL_SIZE,
+    CHAT_SESSION_TTL,
+    CHAT_WARM_MODELS,
+    TAXAS_CAMBIO_BRL,
+)
 from app.processing.execution import ExhaustiveProcessor
+from app.processing.retention import ExecutionRetentionJob
+from app.processing.vector_sync import ContractVectorSync
+from app.storage.vector_filters import chroma_where
 
 router = APIRouter()
 
 # Initialize shared components
 _vector_store = VectorStoreAdapter()
 _relational_db = RelationalDBAdapter()
+_relational_db.set_exchange_rates(TAXAS_CAMBIO_BRL)
 _ingestor = ContractIngestor("data", _vector_store, _relational_db)
-_chatbot = ContractChatbot(_vector_store)
+_chatbot = ContractChatbot(_vector_store, model=CHAT_MODEL, relational_db=_relational_db)
+
+
+# Cria o chatbot de um modelo adicional, compartilhando vetor e banco
+def _build_chatbot(model: str) -> ContractChatbot:
+    """Instancia o chatbot usado pelo pool para ``model``."""
+    return ContractChatbot(_vector_store, model=model, relational_db=_relational_db)
+
+
+# Chatbots por modelo reaproveitados entre requisições
+_chatbot_pool = ChatbotPool(_build_chatbot, max_size=CHAT_POOL_SIZE)
+_chatbot_pool.register(CHAT_MODEL, _chatbot)
+_chatbot_pool.warm_up(CHAT_WARM_MODELS)
+
+# Conversas em andamento, com histórico mantido no servidor
+_sessions = SessionStore(max_size=CHAT_MAX_SESSIONS, ttl=CHAT_SESSION_TTL)
+
+# Requisições idênticas simultâneas compartilham a mesma execução
+_inflight = SingleFlight()
+
+# Campos devolvidos por padrão na listagem (apenas os usados pela tabela da UI)
+_LIST_FIELDS = (
+    "contrato",
+    "lotacaoGerenteContrato",
+    "valorContratoOriginal",
+    "moeda",
+)
+
+# Campos devolvidos por padrão no detalhe. Texto completo e embedding só são
+# lidos do banco quando solicitados explicitamente via ``fields``.
+_DETAIL_FIELDS = (
+    "id",
+    "name",
+    "path",
+    "ingestion_date",
+    "last_processed",
+    "contrato",
+    "inicioPrazo",
+    "fimPrazo",
+    "empresa",
+    "icj",
+    "valorContratoOriginal",
+    "moeda",
+    "taxaCambio",
+    "valorBRL",
+    "gerenteContrato",
+    "nomeGerenteContrato",
+    "lotacaoGerenteContrato",
+    "areaContrato",
+    "modalidade",
+    "textoModalidade",
+    "reajuste",
+    "fornecedor",
+    "nomeFornecedor",
+    "tipoContrato",
+    "objetoContrato",
+    "linhasServico",
+)
+
+
+def _parse_fields(fields: str | None, default: tuple[str, ...]) -> list[str]:
+    """Converte o parâmetro ``fields`` (separado por vírgulas) em lista."""
+    if not fields:
+        return list(default)
+    return [f.strip() for f in fields.split(",") if f.strip()]
+
+
+def _serialize_contract(row, fields: list[str], *, valor=float) -> dict:
+    """Monta dicionário com os campos pedidos, serializando datas e valores."""
+    data = {}
+    for name in fields:
+        value = getattr(row, name)
+        if isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        elif name == "valorContratoOriginal" and value is not None:
+            value = valor(value)
+        elif name == "vetor_embedding" and value is not None:
+            value = value.tolist()
+        elif name == "linhasServico" and isinstance(value, list):
+            # ``Contrato`` decodifica o JSON; a API devolve o texto original
+            value = json.dumps(value, ensure_ascii=False)
+        data[name] = value
+    return data
 
 
 # Rota para realizar ingestão básica de arquivos
@@ -42,95 +141,313 @@ def ingest_structured(csv_path: str = Body(..., embed=True)) -> dict:
     return {"status": "ok", "id": exec_id}
 
 
+# Valida os filtros de metadados antes de consultar o chatbot
+def _validate_filters(filters: dict | None) -> None:
+    """Converte filtros inválidos em erro 400."""
+    try:
+        chroma_where(filters)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+# Chave das perguntas para o agrupamento de requisições simultâneas
+def _normalize_question(question: str) -> str:
+    """Ignora caixa e espaços extras ao comparar perguntas."""
+    return " ".join(question.casefold().split())
+
+
+# Sessão informada pelo cliente, que precisa ter sido aberta e não expirada
+def _session_or_404(session_id: str):
+    """Devolve a sessão ou responde 404 para ids desconhecidos ou expirados."""
+    session = _sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    return session
+
+
 # Rota para enviar perguntas ao chatbot
 @router.post("/chat")
-def chat(
+async def chat(
     question: str = Body(..., embed=True),
     model: str | None = Body(None, embed=True),
+    filters: dict | None = Body(None, embed=True),
+    session_id: str | None = Body(None, embed=True),
 ) -> dict:
-    """Envie uma pergunta ao chatbot utilizando o modelo informado."""
-    # Usa o chatbot global por padrão, mas permite especificar outro modelo
-    bot = _chatbot if model is None else ContractChatbot(_vector_store, model=model)
-    answer, sources = bot.ask(question)
-    return {"answer": answer, "sources": sources}
+    """Envie uma pergunta ao chatbot utilizando o modelo informado.
+
+    ``filters`` restringe a busca aos contratos com os metadados indicados,
+    por exemplo ``{"moeda": "USD", "fornecedor": "123"}``. Com
+    ``session_id`` a pergunta é interpretada no contexto da conversa.
+    """
+    _validate_filters(filters)
+    # Usa o chatbot global por padrão; outros modelos vêm do pool, que pode
+    # construir o chatbot segurando uma trava
+    bot = (
+        _chatbot if model is None else await asyncio.to_thread(_chatbot_pool.get, model)
+    )
+    if session_id is None:
+        # Perguntas iguais em andamento aguardam a mesma resposta
+        key = (
+            "chat",
+            _normalize_question(question),
+            model or CHAT_MODEL,
+            json.dumps(filters or {}, sort_keys=True),
+        )
+        answer, sources = await _inflight.ado(
+            key, lambda: bot.aask(question, filters=filters)
+        )
+        return {"answer": answer, "sources": sources}
+    session = _session_or_404(session_id)
+    answer, sources = await bot.aask(question, filters=filters, session=session)
+    return {"answer": answer, "sources": sources, "session_id": session_id}
+
+
+# Abre uma conversa com histórico mantido no servidor
+@router.post("/chat/sessions")
+def create_chat_session() -> dict:
+    """Retorna o identificador a ser enviado em ``session_id``."""
+    return {"session_id": _sessions.create().id}
+
+
+# Encerra uma conversa, descartando o histórico
+@router.delete("/chat/sessions/{session_id}")
+def delete_chat_session(session_id: str) -> dict:
+    """Remove a sessão informada."""
+    if not _sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    return {"status": "ok"}
+
+
+# Formata um evento no padrão Server-Sent Events
+def _sse(event: str, data) -> str:
+    """Serializa ``data`` em JSON dentro de um evento SSE."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# Rota de chat com a resposta transmitida token a token
+@router.post("/chat/stream")
+async def chat_stream(
+    question: str = Body(..., embed=True),
+    model: str | None = Body(None, embed=True),
+    filters: dict | None = Body(None, embed=True),
+    session_id: str | None = Body(None, embed=True),
+) -> StreamingResponse:
+    """Transmite a resposta do chatbot via SSE.
+
+    Emite um evento ``sources`` com as fontes recuperadas, eventos ``token``
+    com cada fragmento da resposta e, ao final, ``done`` (ou ``error``).
+    """
+    _validate_filters(filters)
+    bot = (
+        _chatbot if model is None else await asyncio.to_thread(_chatbot_pool.get, model)
+    )
+    extra = {} if session_id is None else {"session": _session_or_404(session_id)}
+
+    async def events():
+        try:
+            async for event, data in bot.astream(question, filters=filters, **extra):
+                yield _sse(event, data)
+        except Exception as exc:
+            yield _sse("error", {"detail": str(exc)})
+            return
+        yield _sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # Lista paginável de contratos
 @router.get("/contracts")
-def list_contracts(page: int = 1, page_size: int = 50) -> dict:
-    """Retorna lista paginada de contratos cadastrados."""
-
-    session = _relational_db._Session()
-    query = session.query(Contract).order_by(Contract.contrato)
-    total = query.count()
-    rows = (
-        query.offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
-    )
+def list_contracts(page: int = 1, page_size: int = 50, fields: str | None = None) -> dict:
+    """Retorna lista paginada de contratos cadastrados.
+
+    ``fields`` define, separado por vírgulas, quais colunas devolver; apenas
+    essas colunas são lidas do banco.
+    """
+    names = _parse_fields(fields, _LIST_FIELDS)
+    try:
+        rows = _relational_db.list_contracts(
+            fields=names,
+            offset=(page - 1) * page_size,
+            limit=page_size,
+            order_by="contrato",
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    total = _relational_db.count_contracts()
+    contracts = [_serialize_contract(r, names) for r in rows]
+    return {"contracts": contracts, "total": total}
 
-    # Apenas campos necessários para a tabela da UI
-    contracts = [
+
+# Consulta estruturada com filtros e ordenação, devolvida em streaming
+@router.get("/contracts/query")
+def query_contracts(
+    moeda: str | None = None,
+    empresa: str | None = None,
+    fornecedor: str | None = None,
+    gerenteContrato: str | None = None,
+    lotacaoGerenteContrato: str | None = None,
+    fimPrazoDe: date | None = None,
+    fimPrazoAte: date | None = None,
+    inicioPrazoDe: date | None = None,
+    inicioPrazoAte: date | None = None,
+    valorMin: float | None = None,
+    valorMax: float | None = None,
+    itemPedido: str | None = None,
+    descricaoItem: str | None = None,
+    sort: str = "fimPrazo",
+    fields: str | None = None,
+    limit: int | None = None,
+) -> StreamingResponse:
+    """Filtra contratos por metadados e devolve NDJSON (um contrato por linha).
+
+    ``sort`` aceita colunas separadas por vírgula, com ``-`` para ordem
+    decrescente (ex.: ``fimPrazo,-valorContratoOriginal``). ``itemPedido`` e
+    ``descricaoItem`` (prefixo) filtram pelas linhas de serviço.
+    """
+    names = _parse_fields(fields, _LIST_FIELDS + ("fimPrazo",))
+    try:
+        rows = _relational_db.query_contracts(
+            moeda=moeda,
+            empresa=empresa,
+            fornecedor=fornecedor,
+            gerenteContrato=gerenteContrato,
+            lotacaoGerenteContrato=lotacaoGerenteContrato,
+            fimPrazoDe=fimPrazoDe,
+            fimPrazoAte=fimPrazoAte,
+            inicioPrazoDe=inicioPrazoDe,
+            inicioPrazoAte=inicioPrazoAte,
+            valorMin=valorMin,
+            valorMax=valorMax,
+            itemPedido=itemPedido,
+            descricaoItem=descricaoItem,
+            sort=_parse_fields(sort, ()),
+            fields=names,
+            limit=limit,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    def lines():
+        for row in rows:
+            data = _serialize_contract(row, names)
+            yield json.dumps(data, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# Totais da carteira pré-agregados por dimensão
+@router.get("/contracts/stats")
+def contract_stats() -> dict:
+    """Retorna quantidade e valores (original e em BRL) por dimensão.
+
+    As dimensões são moeda, empresa, lotação do gerente, fornecedor e mês de
+    vencimento. Os totais são lidos de ``contract_stats``, sem varrer os
+    contratos.
+    """
+    return _relational_db.get_contract_stats()
+
+
+# Log de alterações de contratos para consumidores incrementais
+@router.get("/contracts/changes")
+def contract_changes(since: int = 0, limit: int = 1000) -> dict:
+    """Retorna as alterações com sequência maior que ``since``.
+
+    ``last_seq`` é a sequência do último item devolvido (ou ``since`` se não
+    houver alterações) e deve ser usada na próxima consulta.
+    """
+    rows = _relational_db.changes_since(since, limit=limit)
+    changes = [
         {
+            "seq": r.seq,
+            "contract_id": r.contract_id,
             "contrato": r.contrato,
-            "lotacaoGerenteContrato": r.lotacaoGerenteContrato,
-            "valorContratoOriginal": float(r.valorContratoOriginal)
-            if r.valorContratoOriginal is not None
-            else None,
-            "moeda": r.moeda,
+            "path": r.path,
+            "operacao": r.operacao,
+            "changed_at": r.changed_at.isoformat() if r.changed_at else None,
         }
         for r in rows
     ]
-    session.close()
-    return {"contracts": contracts, "total": total}
+    return {"changes": changes, "last_seq": rows[-1].seq if rows else since}
+
+
+# Atualiza o vetor apenas com os contratos alterados desde a última sincronização
+@router.post("/contracts/sync-vectors")
+def sync_vectors() -> dict:
+    """Sincroniza o Chroma com o log de alterações e retorna o id da execução."""
+    return {"id": ContractVectorSync(_vector_store, _relational_db).run()}
 
 
 # Recupera detalhes de um contrato específico pelo número
 @router.get("/contract/{contract_id}")
-def get_contract(contract_id: str) -> dict:
-    """Retorna os dados completos de um contrato pelo campo 'contrato'."""
-    # Busca no banco utilizando o valor do campo 'contrato'
-    row = _relational_db.get_contract_by_contrato(contract_id)
+def get_contract(contract_id: str, fields: str | None = None) -> dict:
+    """Retorna os dados de um contrato pelo campo 'contrato'.
+
+    Por padrão devolve todos os metadados, exceto texto completo e embedding;
+    ``fields`` permite escolher as colunas (separadas por vírgulas).
+    """
+    names = _parse_fields(fields, _DETAIL_FIELDS)
+    if set(names) <= set(CAMPOS_CACHE):
+        # Campos disponíveis no cache de contratos dispensam o banco
+        row = Contrato.carregar(_relational_db, contract_id)
+    else:
+        # Busca no banco utilizando o valor do campo 'contrato'
+        try:
+            row = _relational_db.get_contract_by_contrato(contract_id, fields=names)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
     if not row:
         return {}
-    return {
-        "id": row.id,
-        "name": row.name,
-        "path": row.path,
-        "ingestion_date": row.ingestion_date.isoformat() if row.ingestion_date else None,
-        "last_processed": row.last_processed.isoformat() if row.last_processed else None,
-        "contrato": row.contrato,
-        "inicioPrazo": row.inicioPrazo.isoformat() if row.inicioPrazo else None,
-        "fimPrazo": row.fimPrazo.isoformat() if row.fimPrazo else None,
-        "empresa": row.empresa,
-        "icj": row.icj,
-        "valorContratoOriginal": str(row.valorContratoOriginal) if row.valorContratoOriginal else None,
-        "moeda": row.moeda,
-        "taxaCambio": row.taxaCambio,
-        "gerenteContrato": row.gerenteContrato,
-        "nomeGerenteContrato": row.nomeGerenteContrato,
-        "lotacaoGerenteContrato": row.lotacaoGerenteContrato,
-        "areaContrato": row.areaContrato,
-        "modalidade": row.modalidade,
-        "textoModalidade": row.textoModalidade,
-        "reajuste": row.reajuste,
-        "fornecedor": row.fornecedor,
-        "nomeFornecedor": row.nomeFornecedor,
-        "tipoContrato": row.tipoContrato,
-        "objetoContrato": row.objetoContrato,
-        "linhasServico": row.linhasServico,
-    }
+    return _serialize_contract(
+        row, names, valor=lambda v: str(v) if v else None
+    )
+
+
+# Busca textual nos contratos (texto, objeto, fornecedor e linhas de serviço)
+@router.get("/search")
+def search(q: str, page: int = 1, page_size: int = 20) -> dict:
+    """Pesquisa contratos por palavras-chave com ranqueamento BM25."""
+    results, total = _relational_db.search_contracts(
+        q, limit=page_size, offset=(page - 1) * page_size
+    )
+    return {"results": results, "total": total}
 
 
 # Endpoint que devolve o relatório textual do contrato
 @router.get("/contract/{contract_id}/report")
 def contract_report(contract_id: str) -> dict:
     """Gera relatório em texto do contrato informado."""
-    row = _relational_db.get_contract_by_contrato(contract_id)
-    if not row:
-        return {"report": ""}
-    contrato = Contrato.from_orm(row)
-    return {"report": contrato.relatorio()}
+
+    def gerar() -> dict:
+        # O relatório inclui o texto completo, que não fica no cache
+        row = _relational_db.get_contract_by_contrato(
+            contract_id, fields=CAMPOS_RELATORIO
+        )
+        if row is None:
+            return {"report": ""}
+        return {"report": Contrato.from_orm(row).relatorio()}
+
+    return _inflight.do(("report", contract_id), gerar)
+
+
+# Métricas internas de desempenho da API
+@router.get("/metrics")
+def metrics() -> dict:
+    """Retorna contadores de uso dos caches em memória."""
+    return {
+        "contract_cache": _relational_db.contract_cache.stats(),
+        "answer_cache": _chatbot.answer_cache.stats(),
+        "chatbot_pool": _chatbot_pool.stats(),
+        "query_router": _chatbot.router.stats() if _chatbot.router else None,
+        "coalescing": _inflight.stats(),
+        "embedding_cache": _vector_store._embedding.stats(),
+        "vector_index": (
+            _vector_store._store.stats() if _vector_store.backend == "numpy" else None
+        ),
+    }
 
 
 # Consulta execuções registradas filtrando por status e período
@@ -172,9 +489,55 @@ def get_execution(exec_id: int) -> dict:
         "status": row.status,
         "progress": row.progress,
         "message": row.message,
+        "archived": bool(row.archive_path),
     }
 
 
+# Resultados que mudaram em relação à execução anterior do mesmo prompt
+@router.get("/executions/{exec_id}/changes")
+def execution_changes(exec_id: int) -> dict:
+    """Lista os contratos cuja resposta difere da execução anterior."""
+    rows = _relational_db.get_execution_changes(exec_id)
+    changes = [
+        {
+            "contract_id": r.contract_id,
+            "resposta_simples": r.resposta_simples,
+            "resposta_completa": r.resposta_completa,
+        }
+        for r in rows
+    ]
+    return {"changes": changes}
+
+
+# Arquiva execuções antigas e compacta o banco
+@router.post("/executions/maintenance")
+def executions_maintenance(keep_last: int | None = Body(None, embed=True)) -> dict:
+    """Aplica a retenção de execuções e retorna o id da rotina registrada.
+
+    ``keep_last`` menor que 1 é recusado com 400.
+    """
+    try:
+        job = (
+            ExecutionRetentionJob(_relational_db)
+            if keep_last is None
+            else ExecutionRetentionJob(_relational_db, keep_last=keep_last)
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"id": job.run()}
+
+
+# Restaura os resultados de uma execução arquivada
+@router.post("/executions/{exec_id}/restore")
+def restore_execution(exec_id: int) -> dict:
+    """Recoloca no banco os resultados guardados no arquivo da execução."""
+    try:
+        restored = _relational_db.restore_execution(exec_id)
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    return {"status": "ok", "restored": restored}
+
+
 # ------------------------------------------------------------
 # Endpoints relacionados aos prompts cadastrados
 
@@ -239,9 +602,16 @@ def delete_prompt(prompt_id: int) -> dict:
 # Endpoint para execução exaustiva de prompts
 
 @router.post("/execute")
-async def execute_prompts(prompt: str | None = Body(None, embed=True)) -> dict:
-    """Dispara processamento dos contratos com prompts."""
+async def execute_prompts(
+    prompt: str | None = Body(None, embed=True),
+    since_seq: int | None = Body(None, embed=True),
+) -> dict:
+    """Dispara processamento dos contratos com prompts.
+
+    ``since_seq`` restringe o processamento aos contratos alterados depois
+    dessa sequência de ``/contracts/changes``.
+    """
     processor = ExhaustiveProcessor(_vector_store, _relational_db)
-    ids = await processor.run(prompt=prompt)
+    ids = await processor.run(prompt=prompt, since_seq=since_seq)
     return {"ids": ids}
 
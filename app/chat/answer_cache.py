@@ -0,0 +1,94 @@
+"""Cache semântico de respostas do chatbot.
+
+Perguntas são comparadas pelo embedding: uma pergunta nova cuja similaridade
+cosseno com alguma já respondida atinja o limiar recebe a mesma resposta e as
+mesmas fontes, sem nova recuperação nem chamada ao modelo.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+import numpy as np
+
+
+# Cache LRU de respostas indexado pelo embedding da pergunta
+class SemanticAnswerCache:
+    """Guarda até ``max_size`` respostas e as recupera por similaridade.
+
+    ``generation`` identifica o estado do conteúdo consultado (por exemplo,
+    a geração do vetor); ao mudar, todas as respostas são descartadas.
+    """
+
+    def __init__(self, max_size: int = 256, threshold: float = 0.95) -> None:
+        self.max_size = max_size
+        self.threshold = threshold
+        self._items: OrderedDict[int, tuple[np.ndarray, Any]] = OrderedDict()
+        self._next_key = 0
+        self._generation: Hashable = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        """Converte o embedding em vetor unitário ``float32``."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) + 1e-12)
+
+    def _check_generation(self, generation: Hashable) -> None:
+        """Esvazia o cache quando o conteúdo de origem mudou."""
+        if generation != self._generation:
+            self._items.clear()
+            self._generation = generation
+
+    def get(self, embedding, generation: Hashable = None) -> Any:
+        """Retorna o valor da pergunta mais parecida ou ``None``."""
+        if self.max_size <= 0:
+            return None
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_generation(generation)
+            if self._items:
+                keys = list(self._items)
+                matrix = np.stack([self._items[k][0] for k in keys])
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._items.move_to_end(keys[best])
+                    self.hits += 1
+                    return self._items[keys[best]][1]
+            self.misses += 1
+            return None
+
+    def put(self, embedding, value: Any, generation: Hashable = None) -> None:
+        """Armazena ``value`` para a pergunta, descartando a menos usada.
+
+        ``generation`` deve ser a mesma informada no :meth:`get` anterior; se
+        outra consulta já observou uma geração diferente, a resposta foi
+        calculada sobre conteúdo obsoleto e não é guardada.
+        """
+        if self.max_size <= 0:
+            return
+        vector = self._normalize(embedding)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._items[self._next_key] = (vector, value)
+            self._next_key += 1
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Retorna métricas de uso do cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -1,11 +1,82 @@
 from __future__ import annotations
 
-from typing import List, Tuple
+import asyncio
+import logging
+from typing import Any, AsyncIterator, List, Tuple
 
-from langchain.chains import RetrievalQA
+from langchain_core.documents import Document
+
+from app.config.settings import (
+    CHAT_CACHE_SIZE,
+    CHAT_CACHE_THRESHOLD,
+    CHAT_CONTEXT_TOKENS,
+    CHAT_HISTORY_TOKENS,
+    CHAT_MAP_REDUCE,
+    CHAT_MMR,
+    CHAT_MMR_FETCH_K,
+    CHAT_MMR_LAMBDA,
+    CHAT_MODEL,
+    CHAT_SCORE_THRESHOLD,
+    CHAT_SUMMARY_TOKENS,
+    CHAT_TOP_K,
+)
 from app.integrations.openai_provider import get_chat_model
 
 from app.storage.vector_store_adapter import VectorStoreAdapter
+from app.storage.relational_db_adapter import RelationalDBAdapter
+from .answer_cache import SemanticAnswerCache
+from .context import ContextPacker, PackedContext
+from .retrieval import HybridRetriever, LexicalContractRetriever, ScoredVectorRetriever
+from .router import QueryRouter
+from .session import ChatSession
+
+# Instruções enviadas ao modelo junto com os trechos recuperados
+_PROMPT = (
+    "Use os trechos de contratos abaixo para responder à pergunta ao final. "
+    "Se não souber a resposta, diga que não sabe; não invente informações.\n\n"
+    "{context}\n\n"
+    "{history}"
+    "Pergunta: {question}\n"
+    "Resposta:"
+)
+
+# Reescrita de perguntas de acompanhamento para a busca
+_CONDENSE_PROMPT = (
+    "Dada a conversa abaixo e uma pergunta de acompanhamento, reescreva a "
+    "pergunta para que ela possa ser entendida sem a conversa, mantendo "
+    "números de contrato e demais referências. Responda apenas com a "
+    "pergunta reescrita.\n\n"
+    "{history}\n\n"
+    "Pergunta de acompanhamento: {question}\n"
+    "Pergunta reescrita:"
+)
+
+# Incorporação das trocas antigas ao resumo da sessão
+_SUMMARY_PROMPT = (
+    "Atualize o resumo da conversa incorporando as novas mensagens. Preserve "
+    "números de contrato, valores, datas e conclusões; seja conciso.\n\n"
+    "Resumo atual: {summary}\n\n"
+    "Novas mensagens:\n{turns}\n\n"
+    "Resumo atualizado:"
+)
+
+# Instruções da etapa de resumo dos trechos que excedem o orçamento
+_MAP_PROMPT = (
+    "Extraia do trecho de contrato abaixo, de forma concisa, apenas as "
+    "informações úteis para responder à pergunta. Se nada for útil, não "
+    "escreva nada.\n\n"
+    "{context}\n\n"
+    "Pergunta: {question}\n"
+    "Informações:"
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Extrai o texto da resposta do modelo (mensagem ou string)
+def _content(resposta) -> str:
+    """Devolve o conteúdo textual de uma resposta do modelo."""
+    return getattr(resposta, "content", resposta)
 
 
 # Classe que provê interação com contratos via modelo de linguagem
@@ -13,26 +84,452 @@ class ContractChatbot:
     """Simple RAG chatbot over ingested contracts."""
 
     # Inicializa com o vetor de contratos e modelo de linguagem
-    def __init__(self, vector_store: VectorStoreAdapter, model: str = "gpt-3.5-turbo") -> None:
+    def __init__(
+        self,
+        vector_store: VectorStoreAdapter,
+        model: str = CHAT_MODEL,
+        relational_db: RelationalDBAdapter | None = None,
+        *,
+        top_k: int = CHAT_TOP_K,
+        score_threshold: float | None = CHAT_SCORE_THRESHOLD,
+        mmr: bool = CHAT_MMR,
+        answer_cache: SemanticAnswerCache | None = None,
+        context_packer: ContextPacker | None = None,
+        map_reduce: bool = CHAT_MAP_REDUCE,
+        router: QueryRouter | None = None,
+        history_tokens: int = CHAT_HISTORY_TOKENS,
+        summary_tokens: int = CHAT_SUMMARY_TOKENS,
+    ) -> None:
         # Guarda a referência ao repositório vetorial
         self._vector_store = vector_store
         # Obtém o modelo adequado ao ambiente (interno ou público)
         self._llm = get_chat_model(model=model)
-        # Cria cadeia de consulta com base no Chroma
-        self._chain = RetrievalQA.from_chain_type(
-            llm=self._llm,
-            chain_type="stuff",
-            retriever=self._vector_store._store.as_retriever(),
+        self._relational_db = relational_db
+        self.top_k = top_k
+        # Respostas reaproveitadas para perguntas quase idênticas
+        self.answer_cache = answer_cache or SemanticAnswerCache(
+            max_size=CHAT_CACHE_SIZE, threshold=CHAT_CACHE_THRESHOLD
+        )
+        # Trechos limitados ao orçamento de tokens, sem sobreposição
+        self.context_packer = context_packer or ContextPacker(CHAT_CONTEXT_TOKENS)
+        self.map_reduce = map_reduce
+        # Limites do histórico das sessões: trocas recentes e resumo
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        # Busca vetorial única, já com similaridade, limiar e MMR aplicados
+        self._vector_retriever = ScoredVectorRetriever(
+            store=vector_store,
+            k=top_k,
+            score_threshold=score_threshold,
+            mmr=mmr,
+            fetch_k=CHAT_MMR_FETCH_K,
+            lambda_mult=CHAT_MMR_LAMBDA,
         )
+        retriever: Any = self._vector_retriever
+        # Com o banco relacional disponível, a recuperação é híbrida: busca
+        # lexical (BM25) e vetorial em paralelo, unidas por RRF
+        if relational_db is not None:
+            self._lexical_retriever = LexicalContractRetriever(db=relational_db, k=top_k)
+            retriever = HybridRetriever(
+                retrievers={
+                    "vector": self._vector_retriever,
+                    "lexical": self._lexical_retriever,
+                },
+                k=top_k,
+            )
+        self._retriever = retriever
+        # Perguntas cadastrais sobre um contrato são respondidas pelo banco
+        if router is None and relational_db is not None:
+            router = QueryRouter(relational_db)
+        self.router = router
+
+    # Estado do conteúdo consultado, usado para invalidar o cache de respostas
+    def _generation(self) -> tuple:
+        """Combina as gerações do vetor e, se houver, dos contratos."""
+        generation = (self._vector_store.generation,)
+        if self._relational_db is not None:
+            generation += (self._relational_db.contract_cache.generation,)
+        return generation
+
+    # Filtros só são repassados quando informados
+    @staticmethod
+    def _filter_kwargs(filters: dict | None) -> dict:
+        """Argumentos extras da consulta aos recuperadores."""
+        return {"filters": filters} if filters else {}
+
+    # Recupera os documentos usados como contexto da pergunta
+    def retrieve(
+        self, question: str, top_k: int | None = None, filters: dict | None = None
+    ) -> list[Document]:
+        """Consulta os recuperadores uma única vez e devolve os documentos.
+
+        ``filters`` (ver :func:`~app.storage.vector_filters.chroma_where`)
+        restringe a busca aos contratos com os metadados indicados.
+        """
+        docs = self._retriever.invoke(question, **self._filter_kwargs(filters))
+        return docs[: top_k or self.top_k]
+
+    # Monta o texto enviado ao modelo a partir dos documentos recuperados
+    @staticmethod
+    def build_prompt(question: str, docs: list[Document], history: str = "") -> str:
+        """Concatena os trechos recuperados e o histórico à pergunta."""
+        context = "\n\n".join(d.page_content for d in docs)
+        if history:
+            history = f"Conversa até aqui:\n{history}\n\n"
+        return _PROMPT.format(context=context, history=history, question=question)
+
+    # Converte os metadados dos documentos na lista de fontes da resposta
+    @staticmethod
+    def sources(docs: list[Document]) -> list[dict]:
+        """Retorna origem e pontuações de cada documento usado."""
+        fontes = []
+        for doc in docs:
+            fonte = {"source": doc.metadata.get("source", "")}
+            for key in ("contrato", "score", "bm25_score", "rrf_score"):
+                if key in doc.metadata:
+                    fonte[key] = doc.metadata[key]
+            fontes.append(fonte)
+        return fontes
+
+    # Chama o modelo contabilizando tokens de entrada e de saída
+    def _invoke(self, prompt: str, usage: list[int]) -> str:
+        """Executa ``prompt`` e soma os tokens em ``usage``."""
+        answer = _content(self._llm.invoke(prompt))
+        usage[0] += self.context_packer.count_tokens(prompt)
+        usage[1] += self.context_packer.count_tokens(answer)
+        return answer
+
+    async def _ainvoke(self, prompt: str, usage: list[int]) -> str:
+        """Versão assíncrona de :meth:`_invoke`."""
+        answer = _content(await self._llm.ainvoke(prompt))
+        usage[0] += self.context_packer.count_tokens(prompt)
+        usage[1] += self.context_packer.count_tokens(answer)
+        return answer
+
+    # Prompts da etapa map, um por trecho do excedente escolhido para resumo
+    def _map_prompts(self, question: str, packed: PackedContext) -> list[str]:
+        """Monta os pedidos de resumo, cada trecho limitado ao orçamento."""
+        budget = self.context_packer.budget
+        return [
+            _MAP_PROMPT.format(
+                context=self.context_packer.truncate(doc.page_content, budget),
+                question=question,
+            )
+            for doc in packed.summarized
+        ]
+
+    # Etapa reduce: resumos ocupam o espaço reservado no orçamento
+    def _reduce(self, packed: PackedContext, resumos: list[str]) -> list[Document]:
+        """Acrescenta os resumos aos trechos que couberam inteiros."""
+        docs = list(packed.docs)
+        for doc, resumo in zip(packed.summarized, resumos):
+            texto = self.context_packer.truncate(resumo.strip(), packed.summary_tokens)
+            if texto:
+                docs.append(Document(page_content=texto, metadata=doc.metadata))
+        return docs
+
+    # Empacota os trechos no orçamento; resumir o excedente exige reservar
+    # espaço, senão os resumos pagos seriam cortados a quase nada
+    def _pack_docs(self, docs: list[Document]) -> PackedContext:
+        """Empacota com reserva para resumos apenas quando há map-reduce."""
+        if self.map_reduce:
+            return self.context_packer.pack_for_summaries(docs)
+        return self.context_packer.pack(docs)
+
+    # Empacota os trechos no orçamento e, se preciso, resume o excedente
+    def _pack(
+        self, question: str, docs: list[Document], usage: list[int]
+    ) -> tuple[PackedContext, list[Document]]:
+        """Devolve o empacotamento e os documentos que irão ao prompt."""
+        packed = self._pack_docs(docs)
+        if not packed.summarized:
+            return packed, packed.docs
+        prompts = self._map_prompts(question, packed)
+        resumos = [self._invoke(prompt, usage) for prompt in prompts]
+        return packed, self._reduce(packed, resumos)
+
+    # Versão assíncrona: os resumos do excedente são pedidos em paralelo
+    async def _apack(
+        self, question: str, docs: list[Document], usage: list[int]
+    ) -> tuple[PackedContext, list[Document]]:
+        """Versão assíncrona de :meth:`_pack`."""
+        packed = self._pack_docs(docs)
+        if not packed.summarized:
+            return packed, packed.docs
+        prompts = self._map_prompts(question, packed)
+        resumos = await asyncio.gather(*(self._ainvoke(p, usage) for p in prompts))
+        return packed, self._reduce(packed, resumos)
+
+    # Registra o consumo de tokens da pergunta
+    @staticmethod
+    def _log_usage(packed: PackedContext, usage: list[int]) -> None:
+        """Emite no log os tokens enviados e recebidos do modelo."""
+        logger.info(
+            "Tokens do chat: entrada=%d saída=%d (trechos=%d, resumidos=%d, "
+            "repetidos=%d)",
+            usage[0],
+            usage[1],
+            len(packed.docs),
+            len(packed.summarized),
+            packed.duplicates,
+        )
+
+    # Reescreve a pergunta de acompanhamento de forma independente
+    def _condense(self, question: str, history: str, usage: list[int]) -> str:
+        """Usa o histórico para tornar a pergunta autossuficiente."""
+        if not history:
+            return question
+        prompt = _CONDENSE_PROMPT.format(history=history, question=question)
+        return self._invoke(prompt, usage).strip() or question
+
+    async def _acondense(self, question: str, history: str, usage: list[int]) -> str:
+        """Versão assíncrona de :meth:`_condense`."""
+        if not history:
+            return question
+        prompt = _CONDENSE_PROMPT.format(history=history, question=question)
+        return (await self._ainvoke(prompt, usage)).strip() or question
+
+    # Pedido de resumo das trocas que excederam o orçamento da sessão
+    def _summary_prompt(self, session: ChatSession) -> str | None:
+        """Retira as trocas antigas da sessão e monta o prompt de resumo."""
+        antigas = session.overflow(
+            self.context_packer.count_tokens, self.history_tokens
+        )
+        if not antigas:
+            return None
+        return _SUMMARY_PROMPT.format(
+            summary=session.summary or "(vazio)",
+            turns=ChatSession.format_turns(antigas),
+        )
+
+    # Incorpora ao resumo as trocas que não cabem mais no histórico
+    def _compress(self, session: ChatSession, usage: list[int]) -> None:
+        """Atualiza o resumo da sessão, limitado a ``summary_tokens``."""
+        prompt = self._summary_prompt(session)
+        if prompt is not None:
+            resumo = self._invoke(prompt, usage).strip()
+            session.summary = self.context_packer.truncate(resumo, self.summary_tokens)
+
+    async def _acompress(self, session: ChatSession, usage: list[int]) -> None:
+        """Versão assíncrona de :meth:`_compress`."""
+        prompt = self._summary_prompt(session)
+        if prompt is not None:
+            resumo = (await self._ainvoke(prompt, usage)).strip()
+            session.summary = self.context_packer.truncate(resumo, self.summary_tokens)
+
+    # Registra os tokens gastos na reescrita e no resumo da sessão
+    @staticmethod
+    def _log_session(usage: list[int]) -> None:
+        """Emite no log o custo adicional do histórico da sessão."""
+        logger.info("Tokens da sessão: entrada=%d saída=%d", usage[0], usage[1])
+
+    # Consulta o roteador sem bloquear o event loop com a leitura do banco
+    async def _aroute(self, question: str) -> Tuple[str, List[dict]] | None:
+        """Versão assíncrona de :meth:`QueryRouter.route`."""
+        if self.router is None:
+            return None
+        return await asyncio.to_thread(self.router.route, question)
 
     # Envia uma pergunta e retorna resposta e fontes
-    def ask(self, question: str, top_k: int = 3) -> Tuple[str, List[str]]:
-        """Return answer and list of source contract paths."""
-        # Executa a cadeia para obter resposta
-        result = self._chain({"query": question})
-        answer = result.get("result", "")
-
-        # Busca documentos mais relevantes
-        docs = self._vector_store._store.similarity_search(question, k=top_k)
-        sources = [d.metadata.get("source", "") for d in docs]
+    def ask(
+        self,
+        question: str,
+        top_k: int | None = None,
+        filters: dict | None = None,
+        session: ChatSession | None = None,
+    ) -> Tuple[str, List[dict]]:
+        """Return answer and the scored sources used as context.
+
+        Com ``session`` a pergunta é reescrita de forma independente da
+        conversa para a busca, o histórico comprimido acompanha o prompt e a
+        troca é registrada na sessão ao final. A troca inteira ocorre sob a
+        trava da sessão (:meth:`ChatSession.turn`). Ver :meth:`_answer`.
+        """
+        if session is None:
+            return self._answer(question, top_k, filters)
+        with session.turn():
+            history = session.history()
+            usage = [0, 0]
+            standalone = self._condense(question, history, usage)
+            answer, sources = self._answer(standalone, top_k, filters, history)
+            session.add_turn(question, answer)
+            self._compress(session, usage)
+            self._log_session(usage)
         return answer, sources
+
+    # Responde a pergunta já independente do histórico
+    def _answer(
+        self,
+        question: str,
+        top_k: int | None = None,
+        filters: dict | None = None,
+        history: str = "",
+    ) -> Tuple[str, List[dict]]:
+        """Recupera, empacota o contexto e consulta o modelo.
+
+        Os documentos são recuperados uma única vez; os mesmos trechos
+        compõem o prompt e a lista de fontes devolvida, limitados ao
+        orçamento de tokens do :class:`ContextPacker`. Perguntas parecidas
+        com uma já respondida (ver :class:`SemanticAnswerCache`) devolvem a
+        resposta guardada sem recuperação nem chamada ao modelo, e consultas
+        cadastrais são atendidas pelo :class:`QueryRouter`. Perguntas com
+        ``filters`` ou com ``history`` não usam o cache de respostas: a
+        resposta depende do que não faz parte da chave do cache.
+        """
+        if self.router is not None:
+            routed = self.router.route(question)
+            if routed is not None:
+                return routed
+        cacheable = top_k in (None, self.top_k) and not filters and not history
+        if cacheable:
+            embedding = self._vector_store.embed_query(question)
+            generation = self._generation()
+            cached = self.answer_cache.get(embedding, generation)
+            if cached is not None:
+                return cached
+        docs = self.retrieve(question, top_k, filters)
+        usage = [0, 0]
+        packed, docs = self._pack(question, docs, usage)
+        answer = self._invoke(self.build_prompt(question, docs, history), usage)
+        self._log_usage(packed, usage)
+        result = (answer, self.sources(docs))
+        if cacheable:
+            self.answer_cache.put(embedding, result, generation)
+        return result
+
+    # Versão assíncrona de ``ask``, sem ocupar threads durante a resposta
+    async def aask(
+        self,
+        question: str,
+        top_k: int | None = None,
+        filters: dict | None = None,
+        session: ChatSession | None = None,
+    ) -> Tuple[str, List[dict]]:
+        """Versão assíncrona de :meth:`ask`, inclusive com ``session``."""
+        if session is None:
+            return await self._aanswer(question, top_k, filters)
+        async with session.aturn():
+            history = session.history()
+            usage = [0, 0]
+            standalone = await self._acondense(question, history, usage)
+            answer, sources = await self._aanswer(standalone, top_k, filters, history)
+            session.add_turn(question, answer)
+            await self._acompress(session, usage)
+            self._log_session(usage)
+        return answer, sources
+
+    async def _aanswer(
+        self,
+        question: str,
+        top_k: int | None = None,
+        filters: dict | None = None,
+        history: str = "",
+    ) -> Tuple[str, List[dict]]:
+        """Recupera com ``ainvoke`` e aguarda o modelo com ``ainvoke``.
+
+        Buscas bloqueantes (Chroma local e SQLite) rodam em threads curtas;
+        a espera pelo modelo, que domina a latência, não ocupa nenhuma. O
+        roteador e o cache de respostas são consultados como em :meth:`ask`.
+        """
+        routed = await self._aroute(question)
+        if routed is not None:
+            return routed
+        cacheable = top_k in (None, self.top_k) and not filters and not history
+        if cacheable:
+            embedding = await self._vector_store.aembed_query(question)
+            # A geração dos contratos pode consultar o SQLite
+            generation = await asyncio.to_thread(self._generation)
+            cached = self.answer_cache.get(embedding, generation)
+            if cached is not None:
+                return cached
+        docs = await self._retriever.ainvoke(question, **self._filter_kwargs(filters))
+        docs = docs[: top_k or self.top_k]
+        usage = [0, 0]
+        packed, docs = await self._apack(question, docs, usage)
+        answer = await self._ainvoke(
+            self.build_prompt(question, docs, history), usage
+        )
+        self._log_usage(packed, usage)
+        result = (answer, self.sources(docs))
+        if cacheable:
+            self.answer_cache.put(embedding, result, generation)
+        return result
+
+    # Versão em streaming: fontes primeiro, depois os tokens da resposta
+    async def astream(
+        self,
+        question: str,
+        top_k: int | None = None,
+        filters: dict | None = None,
+        session: ChatSession | None = None,
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Gera os eventos de :meth:`_astream`, registrando a troca na sessão.
+
+        Com ``session`` a trava da sessão fica retida até o fim da transmissão.
+        """
+        if session is None:
+            async for event in self._astream(question, top_k, filters):
+                yield event
+            return
+        async with session.aturn():
+            history = session.history()
+            usage = [0, 0]
+            standalone = await self._acondense(question, history, usage)
+            tokens = []
+            async for event, data in self._astream(
+                standalone, top_k, filters, history
+            ):
+                if event == "token":
+                    tokens.append(data)
+                yield event, data
+            session.add_turn(question, "".join(tokens))
+            await self._acompress(session, usage)
+            self._log_session(usage)
+
+    async def _astream(
+        self,
+        question: str,
+        top_k: int | None = None,
+        filters: dict | None = None,
+        history: str = "",
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Gera eventos ``("sources", fontes)`` e ``("token", texto)``.
+
+        As fontes são emitidas logo após a recuperação, antes de o modelo
+        começar a responder; em seguida cada fragmento produzido pela
+        interface assíncrona de streaming do modelo é repassado. Respostas
+        em cache ou do roteador são emitidas como um único token.
+        """
+        routed = await self._aroute(question)
+        if routed is not None:
+            yield "sources", routed[1]
+            yield "token", routed[0]
+            return
+        cacheable = top_k in (None, self.top_k) and not filters and not history
+        if cacheable:
+            embedding = await self._vector_store.aembed_query(question)
+            # A geração dos contratos pode consultar o SQLite
+            generation = await asyncio.to_thread(self._generation)
+            cached = self.answer_cache.get(embedding, generation)
+            if cached is not None:
+                yield "sources", cached[1]
+                yield "token", cached[0]
+                return
+        docs = await self._retriever.ainvoke(question, **self._filter_kwargs(filters))
+        docs = docs[: top_k or self.top_k]
+        usage = [0, 0]
+        packed, docs = await self._apack(question, docs, usage)
+        sources = self.sources(docs)
+        yield "sources", sources
+        tokens = []
+        prompt = self.build_prompt(question, docs, history)
+        usage[0] += self.context_packer.count_tokens(prompt)
+        async for chunk in self._llm.astream(prompt):
+            token = _content(chunk)
+            if token:
+                tokens.append(token)
+                yield "token", token
+        usage[1] += self.context_packer.count_tokens("".join(tokens))
+        self._log_usage(packed, usage)
+        if cacheable:
+            self.answer_cache.put(embedding, ("".join(tokens), sources), generation)
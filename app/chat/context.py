@@ -0,0 +1,225 @@
+"""Montagem do contexto enviado ao modelo dentro de um orçamento de tokens.
+
+Os trechos recuperados são contados localmente (``tiktoken`` quando o
+vocabulário já está no cache em disco, senão uma estimativa por caracteres;
+o vocabulário nunca é baixado), trechos
+sobrepostos são descartados e os demais entram em ordem de relevância até o
+orçamento. O que não couber é devolvido à parte para ser resumido pelo
+chatbot (etapa *map-reduce*), apenas quando necessário e com uma parte do
+orçamento reservada aos resumos.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from typing import Callable
+
+from langchain_core.documents import Document
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - biblioteca opcional
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Caracteres por token usados na estimativa quando não há ``tiktoken``
+_CHARS_PER_TOKEN = 4
+# Tamanho dos n-gramas de palavras usados para detectar sobreposição
+_SHINGLE = 5
+_WORD_RE = re.compile(r"\w+")
+
+# Arquivos de vocabulário do ``tiktoken``; o cache local é indexado pela URL
+_VOCAB_URLS = {
+    name: f"https://openaipublic.blob.core.windows.net/encodings/{name}.tiktoken"
+    for name in ("cl100k_base", "o200k_base", "p50k_base", "r50k_base")
+}
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+# Caminho do vocabulário no cache usado pelo ``tiktoken``
+def _cached_vocab_path(name: str) -> str | None:
+    """Arquivo do vocabulário no cache local, ou ``None`` se não houver.
+
+    Segue a mesma convenção do ``tiktoken`` (``TIKTOKEN_CACHE_DIR``,
+    ``DATA_GYM_CACHE_DIR`` ou ``<tmp>/data-gym-cache``, arquivo nomeado pelo
+    SHA-1 da URL). Sem o arquivo, ``tiktoken.get_encoding`` faria o download.
+    """
+    url = _VOCAB_URLS.get(name)
+    if url is None:
+        return None
+    cache_dir = os.environ.get(
+        "TIKTOKEN_CACHE_DIR",
+        os.environ.get(
+            "DATA_GYM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "data-gym-cache")
+        ),
+    )
+    if not cache_dir:
+        return None
+    path = os.path.join(cache_dir, hashlib.sha1(url.encode()).hexdigest())
+    return path if os.path.exists(path) else None
+
+
+def _get_encoding(name: str):
+    """Carrega o vocabulário do ``tiktoken`` uma única vez (ou ``None``).
+
+    Só usa vocabulários já presentes em disco: a contagem nunca acessa a rede.
+    """
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            _encoding_loaded = True
+            if tiktoken is not None and _cached_vocab_path(name) is None:
+                logger.info(
+                    "Vocabulário %s fora do cache local; tokens serão estimados", name
+                )
+            elif tiktoken is not None:
+                try:
+                    _encoding = tiktoken.get_encoding(name)
+                except Exception:
+                    # Arquivo em cache corrompido ou ilegível
+                    logger.warning(
+                        "Vocabulário %s indisponível; tokens serão estimados", name
+                    )
+        return _encoding
+
+
+def count_tokens(text: str, encoding: str = "cl100k_base") -> int:
+    """Conta os tokens de ``text`` sem chamar nenhum serviço externo."""
+    enc = _get_encoding(encoding)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def _shingles(text: str) -> set[tuple[str, ...]]:
+    """Conjunto de n-gramas de palavras (minúsculas) do texto."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < _SHINGLE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + _SHINGLE]) for i in range(len(words) - _SHINGLE + 1)}
+
+
+def _relevance(doc: Document) -> float:
+    """Pontuação de relevância gravada pelos recuperadores."""
+    for key in ("rrf_score", "score"):
+        if doc.metadata.get(key) is not None:
+            return float(doc.metadata[key])
+    return 0.0
+
+
+# Resultado do empacotamento dos trechos
+@dataclass
+class PackedContext:
+    """Trechos que cabem no orçamento e os que ficaram de fora."""
+
+    docs: list[Document] = field(default_factory=list)
+    overflow: list[Document] = field(default_factory=list)
+    tokens: int = 0
+    duplicates: int = 0
+    # Trechos do excedente a resumir e o limite de tokens de cada resumo
+    summarized: list[Document] = field(default_factory=list)
+    summary_tokens: int = 0
+
+
+# Seleciona trechos para o prompt respeitando o orçamento de tokens
+class ContextPacker:
+    """Remove sobreposições e limita os trechos a ``budget`` tokens.
+
+    ``overlap`` é a fração mínima dos n-gramas de um trecho já presentes em
+    outro mais relevante para que ele seja descartado como repetido. Quando
+    algum trecho não cabe, :meth:`pack_for_summaries` reserva
+    ``summary_share`` do orçamento aos resumos, cada um com pelo menos
+    ``min_summary_tokens`` tokens.
+    """
+
+    def __init__(
+        self,
+        budget: int = 3000,
+        *,
+        overlap: float = 0.8,
+        count_tokens: Callable[[str], int] = count_tokens,
+        summary_share: float = 0.25,
+        min_summary_tokens: int = 64,
+    ) -> None:
+        self.budget = budget
+        self.overlap = overlap
+        self.count_tokens = count_tokens
+        self.summary_share = summary_share
+        self.min_summary_tokens = min_summary_tokens
+
+    def dedupe(self, docs: list[Document]) -> tuple[list[Document], int]:
+        """Descarta trechos contidos (quase) inteiramente em outro."""
+        kept: list[tuple[Document, set]] = []
+        removed = 0
+        for doc in sorted(docs, key=_relevance, reverse=True):
+            grams = _shingles(doc.page_content)
+            repetido = any(
+                not grams or len(grams & other) / len(grams) >= self.overlap
+                for _, other in kept
+            )
+            if repetido:
+                removed += 1
+                continue
+            kept.append((doc, grams))
+        return [doc for doc, _ in kept], removed
+
+    def pack(self, docs: list[Document], budget: int | None = None) -> PackedContext:
+        """Preenche o orçamento pelos trechos mais relevantes primeiro."""
+        budget = self.budget if budget is None else budget
+        unique, removed = self.dedupe(docs)
+        packed = PackedContext(duplicates=removed)
+        for doc in unique:
+            tokens = self.count_tokens(doc.page_content)
+            if packed.tokens + tokens <= budget:
+                packed.docs.append(doc)
+                packed.tokens += tokens
+            else:
+                packed.overflow.append(doc)
+        return packed
+
+    def pack_for_summaries(self, docs: list[Document]) -> PackedContext:
+        """Empacota deixando espaço para resumir o excedente.
+
+        Se todos os trechos couberem, equivale a :meth:`pack`. Caso
+        contrário, os trechos inteiros ocupam no máximo o orçamento menos a
+        reserva, e ``summarized`` recebe os trechos mais relevantes do
+        excedente que podem ser resumidos com ``min_summary_tokens`` cada.
+        """
+        packed = self.pack(docs)
+        if not packed.overflow:
+            return packed
+        reserve = int(self.budget * self.summary_share)
+        packed = self.pack(docs, self.budget - reserve)
+        restante = self.budget - packed.tokens
+        minimo = max(self.min_summary_tokens, 1)
+        count = min(len(packed.overflow), restante // minimo)
+        if count:
+            packed.summarized = packed.overflow[:count]
+            packed.summary_tokens = restante // count
+        return packed
+
+    def truncate(self, text: str, tokens: int) -> str:
+        """Corta ``text`` para no máximo ``tokens`` tokens."""
+        if tokens <= 0:
+            return ""
+        if self.count_tokens(text) <= tokens:
+            return text
+        # Busca binária pelo maior prefixo que cabe no limite
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.count_tokens(text[:mid]) <= tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low]
@@ -0,0 +1,73 @@
+"""Registro de chatbots reaproveitados entre requisições.
+
+Cada modelo de linguagem tem um único :class:`ContractChatbot` (e, portanto,
+um único cliente do modelo e suas conexões HTTP). Os chatbots são guardados
+num LRU limitado; o menos usado é descartado quando o limite é atingido.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+
+# Pool LRU de chatbots indexado pelo nome do modelo
+class ChatbotPool:
+    """Cria sob demanda e reaproveita um chatbot por modelo.
+
+    ``factory`` recebe o nome do modelo e devolve o chatbot. Chatbots
+    registrados com :meth:`register` (como o padrão da aplicação) são fixos e
+    não contam para ``max_size`` nem são descartados.
+    """
+
+    def __init__(self, factory: Callable[[str], Any], max_size: int = 4) -> None:
+        self._factory = factory
+        self.max_size = max_size
+        self._pinned: dict[str, Any] = {}
+        self._items: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.hits = 0
+
+    def register(self, model: str, bot: Any) -> None:
+        """Fixa ``bot`` como o chatbot do modelo ``model``."""
+        with self._lock:
+            self._pinned[model] = bot
+            self._items.pop(model, None)
+
+    def get(self, model: str) -> Any:
+        """Devolve o chatbot do modelo, criando-o na primeira solicitação."""
+        with self._lock:
+            bot = self._pinned.get(model)
+            if bot is None and model in self._items:
+                self._items.move_to_end(model)
+                bot = self._items[model]
+            if bot is not None:
+                self.hits += 1
+                return bot
+            # A criação fica sob o lock para que requisições simultâneas do
+            # mesmo modelo não construam clientes duplicados
+            bot = self._factory(model)
+            self.created += 1
+            if self.max_size > 0:
+                self._items[model] = bot
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+            return bot
+
+    def warm_up(self, models: Iterable[str]) -> None:
+        """Cria antecipadamente os chatbots dos modelos informados."""
+        for model in models:
+            self.get(model)
+
+    def stats(self) -> dict:
+        """Retorna métricas de uso do pool."""
+        with self._lock:
+            return {
+                "size": len(self._items) + len(self._pinned),
+                "max_size": self.max_size,
+                "models": list(self._pinned) + list(self._items),
+                "created": self.created,
+                "hits": self.hits,
+            }
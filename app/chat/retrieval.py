@@ -0,0 +1,289 @@
+"""Recuperadores de documentos usados pelo chatbot.
+
+Combina a busca lexical (índice FTS5 do banco relacional) com a busca vetorial
+do Chroma. Os resultados das duas fontes são unidos por *Reciprocal Rank
+Fusion* (RRF), que favorece documentos bem posicionados em ambas as listas sem
+depender da escala das pontuações de cada busca. Cada pontuação fica em sua
+própria chave de metadados: ``score`` (similaridade cosseno, busca vetorial),
+``bm25_score`` (busca lexical) e ``rrf_score`` (fusão).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import Field
+
+from app.models.contrato import Contrato
+from app.storage.relational_db_adapter import Contract
+from app.storage.vector_filters import chroma_where, matches_filters
+
+logger = logging.getLogger(__name__)
+
+# Colunas usadas no texto dos documentos lexicais; texto completo e embedding
+# ficam de fora para não estourar o contexto enviado ao modelo
+_LEXICAL_FIELDS = tuple(
+    c.name
+    for c in Contract.__table__.columns
+    if c.name not in ("texto_completo", "vetor_embedding")
+)
+
+
+# Recuperador que consulta o índice de palavras-chave dos contratos
+class LexicalContractRetriever(BaseRetriever):
+    """Busca contratos por BM25 no índice FTS5 do banco relacional.
+
+    A relevância BM25 fica em ``metadata["bm25_score"]``, separada da
+    similaridade cosseno da busca vetorial, que tem outra escala.
+    """
+
+    db: Any
+    k: int = 4
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        filters: dict | None = None,
+    ) -> list[Document]:
+        """Converte os contratos encontrados em documentos do LangChain.
+
+        Com ``filters`` busca mais candidatos e mantém apenas os contratos
+        cujos metadados satisfazem os filtros.
+        """
+        limit = self.k * 5 if filters else self.k
+        # Perguntas em linguagem natural: basta casar algum termo relevante
+        results, _ = self.db.search_contracts(query, limit=limit, any_term=True)
+        docs = []
+        for result in results:
+            if len(docs) >= self.k:
+                break
+            row = self.db.get_contract(result["id"], fields=_LEXICAL_FIELDS)
+            if row is None:
+                continue
+            contrato = Contrato.from_orm(row)
+            if filters and not matches_filters(contrato.metadados_vetor(), filters):
+                continue
+            content = contrato.relatorio()
+            if result["snippet"]:
+                content = f"{content}\ntrecho: {result['snippet']}"
+            docs.append(
+                Document(
+                    page_content=content,
+                    metadata={
+                        "source": result["path"],
+                        "contrato": result["contrato"],
+                        "bm25_score": result["score"],
+                    },
+                )
+            )
+        return docs
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+        filters: dict | None = None,
+    ) -> list[Document]:
+        """Consulta o SQLite em uma thread para não bloquear o event loop."""
+        return await asyncio.to_thread(
+            self._get_relevant_documents,
+            query,
+            run_manager=run_manager.get_sync(),
+            filters=filters,
+        )
+
+
+# Recuperador vetorial que preserva a similaridade de cada documento
+class ScoredVectorRetriever(BaseRetriever):
+    """Consulta o :class:`VectorStoreAdapter` uma única vez por pergunta.
+
+    A similaridade cosseno fica em ``metadata["score"]``. Documentos abaixo
+    de ``score_threshold`` não são devolvidos e, com ``mmr``, o resultado é
+    diversificado por Maximal Marginal Relevance. O limite vale apenas para
+    esta busca: documentos lexicais não têm similaridade cosseno.
+    """
+
+    store: Any
+    k: int = 4
+    score_threshold: float | None = None
+    mmr: bool = False
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+
+    def _search_kwargs(self, filters: dict | None = None) -> dict:
+        """Parâmetros repassados à busca do adaptador."""
+        return {
+            "k": self.k,
+            "score_threshold": self.score_threshold,
+            "mmr": self.mmr,
+            "fetch_k": self.fetch_k,
+            "lambda_mult": self.lambda_mult,
+            "where": chroma_where(filters),
+        }
+
+    @staticmethod
+    def _with_scores(results: list[tuple[Document, float]]) -> list[Document]:
+        """Copia cada documento gravando a similaridade nos metadados."""
+        return [
+            Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "score": score},
+            )
+            for doc, score in results
+        ]
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        filters: dict | None = None,
+    ) -> list[Document]:
+        """Executa a busca e grava a pontuação nos metadados."""
+        return self._with_scores(
+            self.store.similarity_search(query, **self._search_kwargs(filters))
+        )
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+        filters: dict | None = None,
+    ) -> list[Document]:
+        """Versão assíncrona, com embedding assíncrono da pergunta."""
+        return self._with_scores(
+            await self.store.asimilarity_search(query, **self._search_kwargs(filters))
+        )
+
+
+# Identifica o mesmo documento vindo de recuperadores diferentes
+def _doc_key(doc: Document) -> str:
+    """Usa a origem do documento como chave, ou o próprio texto na falta dela."""
+    return doc.metadata.get("source") or doc.page_content
+
+
+# Une listas ranqueadas usando Reciprocal Rank Fusion
+def reciprocal_rank_fusion(
+    rankings: list[list[Document]], *, k: int = 60
+) -> list[tuple[Document, float]]:
+    """Retorna documentos ordenados pela soma de ``1 / (k + posição)``.
+
+    Quando o mesmo documento aparece em mais de uma lista, mantém o texto
+    da lista em que ele ficou mais bem posicionado e une os metadados de
+    todas (os da melhor posição prevalecem), preservando as pontuações de
+    cada recuperador.
+    """
+    scores: dict[str, float] = {}
+    best: dict[str, tuple[int, Document]] = {}
+    metadata: dict[str, dict] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            if key not in best or rank < best[key][0]:
+                best[key] = (rank, doc)
+                metadata[key] = {**metadata.get(key, {}), **doc.metadata}
+            else:
+                metadata[key] = {**doc.metadata, **metadata[key]}
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [
+        (
+            Document(page_content=best[key][1].page_content, metadata=metadata[key]),
+            scores[key],
+        )
+        for key in ordered
+    ]
+
+
+# Recuperador híbrido que consulta várias fontes em paralelo
+class HybridRetriever(BaseRetriever):
+    """Consulta os recuperadores em paralelo e funde os resultados por RRF.
+
+    ``latencies`` guarda, em segundos, o tempo da última consulta de cada
+    recuperador, identificado pelo nome usado em ``retrievers``.
+    """
+
+    retrievers: dict[str, Any]
+    k: int = 4
+    rrf_k: int = 60
+    latencies: dict[str, float] = Field(default_factory=dict)
+
+    def _fuse(self, rankings: list[list[Document]]) -> list[Document]:
+        """Aplica RRF e registra a pontuação fundida nos metadados."""
+        fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)[: self.k]
+        docs = []
+        for doc, score in fused:
+            metadata = {**doc.metadata, "rrf_score": score}
+            docs.append(Document(page_content=doc.page_content, metadata=metadata))
+        return docs
+
+    def _record(self, name: str, started: float) -> None:
+        """Armazena e registra em log a latência de um recuperador."""
+        elapsed = time.perf_counter() - started
+        self.latencies[name] = elapsed
+        logger.debug("Recuperador %s respondeu em %.1f ms", name, elapsed * 1000)
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        filters: dict | None = None,
+    ) -> list[Document]:
+        """Executa os recuperadores em threads e funde as listas."""
+        extra = {"filters": filters} if filters else {}
+
+        def timed(name: str, retriever: Any) -> list[Document]:
+            started = time.perf_counter()
+            try:
+                return retriever.invoke(
+                    query, config={"callbacks": run_manager.get_child(name)}, **extra
+                )
+            finally:
+                self._record(name, started)
+
+        with ThreadPoolExecutor(max_workers=len(self.retrievers)) as pool:
+            futures = [
+                pool.submit(timed, name, retriever)
+                for name, retriever in self.retrievers.items()
+            ]
+            rankings = [f.result() for f in futures]
+        return self._fuse(rankings)
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+        filters: dict | None = None,
+    ) -> list[Document]:
+        """Versão assíncrona: consulta os recuperadores concorrentemente."""
+        extra = {"filters": filters} if filters else {}
+
+        async def timed(name: str, retriever: Any) -> list[Document]:
+            started = time.perf_counter()
+            try:
+                return await retriever.ainvoke(
+                    query, config={"callbacks": run_manager.get_child(name)}, **extra
+                )
+            finally:
+                self._record(name, started)
+
+        rankings = await asyncio.gather(
+            *(timed(name, r) for name, r in self.retrievers.items())
+        )
+        return self._fuse(list(rankings))
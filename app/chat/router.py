@@ -0,0 +1,172 @@
+"""Roteamento de perguntas entre o banco relacional e o RAG.
+
+Perguntas que citam um contrato e pedem um dado cadastral (valor, prazo,
+gerente, fornecedor...) são respondidas direto do banco, via
+:meth:`Contrato.carregar`, sem busca vetorial nem chamada ao modelo. As
+demais seguem para o fluxo de recuperação do chatbot.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from datetime import date, datetime
+from typing import Any
+
+from app.models.contrato import Contrato
+
+# Números de contrato: sequências longas de dígitos (ex.: 4600637168) ou o
+# código que segue a palavra "contrato"
+_NUMERO_RE = re.compile(r"\b\d{8,}\b")
+_CODIGO_RE = re.compile(
+    r"\bcontrato\s+(?:n[º°o.]*\s*)?([a-z]*\d[\w./-]*)", re.IGNORECASE
+)
+
+# Intenções reconhecidas e os campos que as respondem
+_INTENCOES: tuple[tuple[re.Pattern, tuple[str, ...]], ...] = tuple(
+    (re.compile(padrao, re.IGNORECASE), campos)
+    for padrao, campos in (
+        (r"\bvalor", ("valorContratoOriginal", "moeda", "valorBRL")),
+        (r"\bmoeda", ("moeda",)),
+        (r"\bc[aâ]mbio", ("taxaCambio",)),
+        (r"\b(prazo|vig[eê]ncia)", ("inicioPrazo", "fimPrazo")),
+        (r"\b(in[ií]cio|inicia|come[cç]a)", ("inicioPrazo",)),
+        (r"\b(t[eé]rmino|termina|fim|final|vence|vencimento|encerra)", ("fimPrazo",)),
+        (r"\b(gerente|gestor)", ("nomeGerenteContrato", "gerenteContrato")),
+        (r"\blota[cç][aã]o", ("lotacaoGerenteContrato",)),
+        (r"\b(fornecedor|contratada)", ("nomeFornecedor", "fornecedor")),
+        (r"\bempresa", ("empresa",)),
+        (r"\bobjeto", ("objetoContrato",)),
+        (r"\bmodalidade", ("modalidade", "textoModalidade")),
+        (r"\breajuste", ("reajuste",)),
+        (r"\b[aá]rea", ("areaContrato",)),
+        (r"\btipo", ("tipoContrato",)),
+        (r"\bicj\b", ("icj",)),
+    )
+)
+
+# Pedidos da ficha completa do contrato
+_FICHA_RE = re.compile(
+    r"\b(dados|ficha|relat[oó]rio|detalhes|informa[cç][oõ]es)\b", re.IGNORECASE
+)
+
+# Perguntas abertas, que exigem leitura do texto, sempre vão para o RAG
+_ABERTA_RE = re.compile(
+    r"\b(por\s*qu[eê]|explique|explica|analise|compare|resuma|cl[aá]usula|"
+    r"risco|multa|penalidade|obriga[cç])",
+    re.IGNORECASE,
+)
+
+# Rótulos legíveis dos campos usados na resposta
+_ROTULOS = {
+    "valorContratoOriginal": "valor original",
+    "moeda": "moeda",
+    "valorBRL": "valor em BRL",
+    "taxaCambio": "taxa de câmbio",
+    "inicioPrazo": "início do prazo",
+    "fimPrazo": "fim do prazo",
+    "nomeGerenteContrato": "gerente",
+    "gerenteContrato": "chave do gerente",
+    "lotacaoGerenteContrato": "lotação do gerente",
+    "nomeFornecedor": "fornecedor",
+    "fornecedor": "código do fornecedor",
+    "empresa": "empresa",
+    "objetoContrato": "objeto",
+    "modalidade": "modalidade",
+    "textoModalidade": "descrição da modalidade",
+    "reajuste": "reajuste",
+    "areaContrato": "área",
+    "tipoContrato": "tipo",
+    "icj": "ICJ",
+}
+
+
+def _formatar(valor: Any) -> str:
+    """Formata datas e números no padrão brasileiro."""
+    if isinstance(valor, (date, datetime)):
+        return valor.strftime("%d/%m/%Y")
+    if isinstance(valor, float):
+        texto = f"{valor:,.2f}"
+        return texto.replace(",", "_").replace(".", ",").replace("_", ".")
+    return str(valor)
+
+
+# Decide se a pergunta pode ser respondida pelo banco relacional
+class QueryRouter:
+    """Responde consultas cadastrais sobre contratos sem usar o modelo.
+
+    :meth:`route` devolve ``(resposta, fontes)`` quando a pergunta foi
+    atendida pelo banco ou ``None`` quando deve seguir para o RAG. Os
+    contadores ``questions`` e ``routed`` medem a fração de perguntas
+    desviadas.
+    """
+
+    def __init__(self, db: Any) -> None:
+        self._db = db
+        self._lock = threading.Lock()
+        self.questions = 0
+        self.routed = 0
+
+    @staticmethod
+    def contract_numbers(question: str) -> list[str]:
+        """Números de contrato citados na pergunta, sem repetição."""
+        numeros = _NUMERO_RE.findall(question) + _CODIGO_RE.findall(question)
+        return list(dict.fromkeys(n.rstrip("./-") for n in numeros))
+
+    @staticmethod
+    def intent_fields(question: str) -> list[str]:
+        """Campos pedidos pela pergunta, na ordem das intenções."""
+        campos: list[str] = []
+        for padrao, nomes in _INTENCOES:
+            if padrao.search(question):
+                campos.extend(n for n in nomes if n not in campos)
+        return campos
+
+    def route(self, question: str) -> tuple[str, list[dict]] | None:
+        """Tenta responder pelo banco; ``None`` encaminha ao RAG."""
+        result = self._answer(question)
+        with self._lock:
+            self.questions += 1
+            if result is not None:
+                self.routed += 1
+        return result
+
+    def _answer(self, question: str) -> tuple[str, list[dict]] | None:
+        """Monta a resposta a partir dos contratos citados."""
+        if _ABERTA_RE.search(question):
+            return None
+        numeros = self.contract_numbers(question)
+        if not numeros:
+            return None
+        campos = self.intent_fields(question)
+        if not campos and not _FICHA_RE.search(question):
+            return None
+        contratos = [Contrato.carregar(self._db, n) for n in numeros]
+        if any(c is None for c in contratos):
+            # Número desconhecido: deixa o RAG procurar no texto
+            return None
+        partes = []
+        for contrato in contratos:
+            if campos:
+                valores = [
+                    f"{_ROTULOS[c]}: {_formatar(getattr(contrato, c))}"
+                    for c in campos
+                    if getattr(contrato, c) is not None
+                ]
+                corpo = "; ".join(valores) or "informação não cadastrada"
+                partes.append(f"Contrato {contrato.contrato} — {corpo}.")
+            else:
+                partes.append(contrato.relatorio())
+        fontes = [
+            {"source": c.path or "", "contrato": c.contrato} for c in contratos
+        ]
+        return "\n\n".join(partes), fontes
+
+    def stats(self) -> dict:
+        """Retorna a fração de perguntas respondidas sem o modelo."""
+        with self._lock:
+            return {
+                "questions": self.questions,
+                "short_circuited": self.routed,
+                "share": self.routed / self.questions if self.questions else 0.0,
+            }
@@ -0,0 +1,155 @@
+"""Sessões de conversa do chatbot com histórico comprimido.
+
+Cada sessão guarda as últimas trocas na íntegra e um resumo das anteriores.
+Quando as trocas recentes excedem o orçamento de tokens, as mais antigas são
+incorporadas ao resumo pelo chatbot, de modo que o histórico enviado ao
+modelo tenha tamanho aproximadamente constante em conversas longas.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Iterator
+
+
+# Estado de uma conversa mantido no servidor
+@dataclass
+class ChatSession:
+    """Resumo das trocas antigas e as trocas recentes da conversa.
+
+    ``lock`` protege as estruturas internas; ``turn_lock`` serializa as
+    trocas inteiras (leitura do histórico, reescrita, resposta e registro),
+    de modo que perguntas simultâneas na mesma sessão não se intercalem.
+    """
+
+    id: str
+    summary: str = ""
+    turns: list[tuple[str, str]] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    turn_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @contextmanager
+    def turn(self) -> Iterator[None]:
+        """Mantém a sessão exclusiva durante uma troca síncrona."""
+        with self.turn_lock:
+            yield
+
+    @asynccontextmanager
+    async def aturn(self) -> AsyncIterator[None]:
+        """Versão assíncrona de :meth:`turn`.
+
+        Sem disputa a trava é obtida na hora; havendo outra troca em
+        andamento, a espera ocorre em uma thread para não bloquear o event
+        loop. Se a espera for cancelada, a trava é liberada assim que obtida.
+        """
+        if not self.turn_lock.acquire(blocking=False):
+            waiter = asyncio.ensure_future(asyncio.to_thread(self.turn_lock.acquire))
+            try:
+                await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                waiter.add_done_callback(lambda _: self.turn_lock.release())
+                raise
+        try:
+            yield
+        finally:
+            self.turn_lock.release()
+
+    @staticmethod
+    def format_turns(turns: list[tuple[str, str]]) -> str:
+        """Formata trocas como linhas ``Usuário:``/``Assistente:``."""
+        return "\n".join(
+            f"Usuário: {pergunta}\nAssistente: {resposta}"
+            for pergunta, resposta in turns
+        )
+
+    def history(self) -> str:
+        """Texto do histórico enviado ao modelo (resumo e trocas recentes)."""
+        with self.lock:
+            partes = []
+            if self.summary:
+                partes.append(f"Resumo da conversa: {self.summary}")
+            if self.turns:
+                partes.append(self.format_turns(self.turns))
+            return "\n".join(partes)
+
+    def add_turn(self, question: str, answer: str) -> None:
+        """Registra uma troca completa."""
+        with self.lock:
+            self.turns.append((question, answer))
+
+    def overflow(
+        self, count_tokens: Callable[[str], int], budget: int
+    ) -> list[tuple[str, str]]:
+        """Retira as trocas mais antigas até as recentes caberem em ``budget``.
+
+        A troca mais recente é sempre mantida. As retiradas são devolvidas
+        para serem incorporadas ao resumo.
+        """
+        with self.lock:
+            removidas = []
+            while len(self.turns) > 1 and (
+                count_tokens(self.format_turns(self.turns)) > budget
+            ):
+                removidas.append(self.turns.pop(0))
+            return removidas
+
+
+# Sessões em memória com limite de quantidade e expiração por inatividade
+class SessionStore:
+    """Guarda até ``max_size`` sessões; a menos usada é descartada.
+
+    Sessões sem uso há mais de ``ttl`` segundos expiram. Sessões só são
+    abertas por :meth:`create`; :meth:`get` não recria sessões desconhecidas
+    ou expiradas.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        ttl: float | None = 3600.0,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._items: OrderedDict[str, tuple[float, ChatSession]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self) -> ChatSession:
+        """Abre uma nova sessão com identificador aleatório."""
+        session = ChatSession(id=uuid.uuid4().hex)
+        with self._lock:
+            self._items[session.id] = (self._clock(), session)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> ChatSession | None:
+        """Devolve a sessão e renova sua validade.
+
+        Retorna ``None`` se a sessão não existir ou tiver expirado.
+        """
+        now = self._clock()
+        with self._lock:
+            item = self._items.get(session_id)
+            if item is None:
+                return None
+            if self.ttl is not None and now - item[0] > self.ttl:
+                del self._items[session_id]
+                return None
+            session = item[1]
+            self._items[session_id] = (now, session)
+            self._items.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        """Encerra a sessão; retorna ``False`` se ela não existia."""
+        with self._lock:
+            return self._items.pop(session_id, None) is not None
@@ -7,3 +7,61 @@ load_dotenv()
 
 # Endereço base da API utilizado pelo frontend
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+
+# Quantidade de execuções mantidas no banco para cada prompt; as mais antigas
+# são movidas para arquivos compactados em ``EXECUTION_ARCHIVE_DIR``
+EXECUTION_KEEP_RUNS = int(os.getenv("EXECUTION_KEEP_RUNS", "5"))
+EXECUTION_ARCHIVE_DIR = os.getenv("EXECUTION_ARCHIVE_DIR", "data/archive")
+
+# Parâmetros da recuperação do chatbot: quantidade de trechos enviados ao
+# modelo, similaridade mínima (cosseno) e diversificação por MMR
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", "4"))
+_threshold = os.getenv("CHAT_SCORE_THRESHOLD", "")
+CHAT_SCORE_THRESHOLD = float(_threshold) if _threshold else None
+CHAT_MMR = os.getenv("CHAT_MMR", "0") == "1"
+CHAT_MMR_FETCH_K = int(os.getenv("CHAT_MMR_FETCH_K", "20"))
+CHAT_MMR_LAMBDA = float(os.getenv("CHAT_MMR_LAMBDA", "0.5"))
+
+# Cache semântico de respostas do chatbot: quantidade máxima de respostas e
+# similaridade mínima entre perguntas para reaproveitar uma resposta
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "256"))
+CHAT_CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", "0.95"))
+
+# Modelo padrão do chatbot, modelos adicionais criados já na inicialização
+# (separados por vírgula) e limite de chatbots mantidos em memória
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-3.5-turbo")
+CHAT_WARM_MODELS = [
+    m.strip() for m in os.getenv("CHAT_WARM_MODELS", "").split(",") if m.strip()
+]
+CHAT_POOL_SIZE = int(os.getenv("CHAT_POOL_SIZE", "4"))
+
+# Orçamento de tokens dos trechos enviados ao modelo; o que exceder é resumido
+# por pergunta (map-reduce) quando ``CHAT_MAP_REDUCE=1`` ou descartado
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "3000"))
+CHAT_MAP_REDUCE = os.getenv("CHAT_MAP_REDUCE", "1") == "1"
+
+# Sessões de conversa: tokens das trocas mantidas na íntegra, tamanho máximo
+# do resumo das anteriores, quantidade de sessões e expiração (segundos)
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1000"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", "3600"))
+
+# Quantidade de embeddings (perguntas e documentos) mantidos em memória
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+
+# Backend vetorial: ``chroma`` (padrão) ou ``numpy`` (índice exato mapeado em
+# memória) e a precisão dos vetores gravados por este último
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+
+# Cotações em reais usadas no valor em BRL dos contratos, no formato
+# ``USD=5.40,EUR=5.90``; a ``taxaCambio`` do CSV converte para USD, então a
+# cotação do dólar basta para as demais moedas
+TAXAS_CAMBIO_BRL = {
+    moeda.strip().upper(): float(taxa)
+    for moeda, _, taxa in (
+        item.partition("=") for item in os.getenv("TAXAS_CAMBIO_BRL", "").split(",")
+    )
+    if moeda.strip() and taxa.strip()
+}
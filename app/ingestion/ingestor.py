@@ -4,11 +4,11 @@ from datetime import datetime
 from pathlib import Path
 from datetime import date
 import csv
-import json
 
 import fitz  # PyMuPDF
 from docx import Document as DocxDocument
 
+from app.models.contrato import Contrato
 from app.storage.vector_store_adapter import VectorStoreAdapter
 from app.storage.relational_db_adapter import RelationalDBAdapter
 from app.storage.execution_tracker import ExecutionTracker
@@ -55,6 +55,9 @@ class ContractIngestor:
                 continue
 
             metadata = {"source": str(file_path)}
+            if existing:
+                # Metadados do contrato permitem filtrar a busca vetorial
+                metadata.update(Contrato.from_orm(existing).metadados_vetor())
             self.vector_store.add_document(text, metadata)  # armazena texto no Chroma
             if existing:
                 self.relational_db.update_processing_date(str(file_path))
@@ -89,10 +92,17 @@ class ContractStructuredDataIngestor:
     """Load structured contract data from a CSV file."""
 
     # Recebe caminho do CSV e dependências de banco
-    def __init__(self, csv_path: str | Path, relational_db: RelationalDBAdapter) -> None:
+    def __init__(
+        self,
+        csv_path: str | Path,
+        relational_db: RelationalDBAdapter,
+        batch_size: int = 500,
+    ) -> None:
         # Caminho do arquivo CSV com dados estruturados
         self.csv_path = Path(csv_path)
         self.relational_db = relational_db
+        # Quantidade de contratos gravados por transação
+        self.batch_size = batch_size
         self.progress = 0.0
         self._resolver = EmployeeResolver()
 
@@ -191,20 +201,22 @@ class ContractStructuredDataIngestor:
 
             total = len(contracts)
             processed = 0
-            for data in contracts.values():  # percorre cada contrato carregado
-                if self.relational_db.get_contract_by_contrato(data["contrato"]):
-                    processed += 1
-                    self.progress = processed / total * 100
-                    tracker.update(progress=self.progress)
-                    continue
-                emp = self._resolver.resolve(data["gerenteContrato"])
-                data["nomeGerenteContrato"] = emp["nome"]
-                data["lotacaoGerenteContrato"] = emp["lotacao"]
-                data["linhasServico"] = json.dumps(
-                    data["linhasServico"], ensure_ascii=False
-                )
-                self.relational_db.add_contract_structured(**data)
-                processed += 1
+            # Consulta única para descobrir quais contratos já existem
+            existing = self.relational_db.existing_contratos(contracts.keys())
+            items = list(contracts.values())
+            for start in range(0, total, self.batch_size):  # percorre em lotes
+                batch = []
+                for data in items[start : start + self.batch_size]:
+                    if data["contrato"] in existing:
+                        continue
+                    emp = self._resolver.resolve(data["gerenteContrato"])
+                    data["nomeGerenteContrato"] = emp["nome"]
+                    data["lotacaoGerenteContrato"] = emp["lotacao"]
+                    batch.append(data)
+                # Contratos e linhas de serviço do lote são gravados juntos
+                if batch:
+                    self.relational_db.add_contracts_structured(batch)
+                processed = min(start + self.batch_size, total)
                 self.progress = processed / total * 100
                 tracker.update(progress=self.progress)
 
@@ -0,0 +1,140 @@
+"""Cache em memória de embeddings na frente do provedor.
+
+Textos repetidos (a mesma pergunta vinda da interface, dos testes ou de
+várias etapas da recuperação) são convertidos em embedding uma única vez.
+As entradas são indexadas pelo modelo e pelo hash do texto e descartadas por
+ordem de uso (LRU).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.embeddings import Embeddings
+
+
+# Envolve um objeto de embeddings do LangChain com um cache LRU
+class CachedEmbeddings(Embeddings):
+    """Repassa ao provedor apenas os textos ainda não vistos.
+
+    ``embed_documents`` consulta o provedor uma única vez com todos os
+    textos ausentes do cache. Atributos não definidos aqui (como ``model``)
+    são lidos do objeto original.
+    """
+
+    def __init__(
+        self,
+        embeddings: Any,
+        *,
+        model: str | None = None,
+        max_size: int = 2048,
+        cache_documents: bool = True,
+    ) -> None:
+        self.inner = embeddings
+        self.model = (
+            model or getattr(embeddings, "model", None) or type(embeddings).__name__
+        )
+        self.max_size = max_size
+        self.cache_documents = cache_documents
+        self._items: OrderedDict[tuple[str, str], list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name: str) -> Any:
+        # Só é chamado para atributos ausentes; ``inner`` evita recursão
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def _key(self, text: str) -> tuple[str, str]:
+        """Chave do texto: modelo e hash SHA-1 do conteúdo."""
+        return self.model, hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, texts: list[str]) -> list[list[float] | None]:
+        """Devolve os embeddings em cache (``None`` para os ausentes)."""
+        with self._lock:
+            found = []
+            for text in texts:
+                key = self._key(text)
+                vector = self._items.get(key)
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                found.append(vector)
+            return found
+
+    def _store(self, texts: list[str], vectors: list[list[float]]) -> None:
+        """Guarda os embeddings calculados, descartando os menos usados."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self._key(text)
+                self._items[key] = vector
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embedding da pergunta, chamando o provedor só na primeira vez."""
+        (vector,) = self._lookup([text])
+        if vector is None:
+            vector = self.inner.embed_query(text)
+            self._store([text], [vector])
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """Versão assíncrona de :meth:`embed_query`."""
+        (vector,) = self._lookup([text])
+        if vector is None:
+            vector = await self.inner.aembed_query(text)
+            self._store([text], [vector])
+        return vector
+
+    def _missing(self, texts: list[str]) -> tuple[list, list[int]]:
+        """Resultados já em cache e posições dos textos que faltam."""
+        found = self._lookup(texts) if self.cache_documents else [None] * len(texts)
+        return found, [i for i, v in enumerate(found) if v is None]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embeddings dos documentos, calculando apenas os ausentes."""
+        found, missing = self._missing(texts)
+        if missing:
+            pending = [texts[i] for i in missing]
+            vectors = self.inner.embed_documents(pending)
+            if self.cache_documents:
+                self._store(pending, vectors)
+            for i, vector in zip(missing, vectors):
+                found[i] = vector
+        return found
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Versão assíncrona de :meth:`embed_documents`."""
+        found, missing = self._missing(texts)
+        if missing:
+            pending = [texts[i] for i in missing]
+            vectors = await self.inner.aembed_documents(pending)
+            if self.cache_documents:
+                self._store(pending, vectors)
+            for i, vector in zip(missing, vectors):
+                found[i] = vector
+        return found
+
+    def stats(self) -> dict:
+        """Retorna métricas de uso do cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "model": self.model,
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
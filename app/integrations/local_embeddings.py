@@ -0,0 +1,81 @@
+"""Embeddings locais, determinísticos e sem acesso à rede.
+
+Cada texto é convertido em termos (palavras e pares de palavras, em
+minúsculas e sem acentos) que são distribuídos por *feature hashing* em um
+vetor de dimensão fixa. A frequência recebe escala logarítmica e o vetor é
+normalizado, de modo que a similaridade cosseno aproxima a sobreposição de
+vocabulário ponderada. Serve para indexar em ambientes sem acesso à API e
+para medir ingestão e busca sem custo por chamada.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WORD_RE = re.compile(r"\w+")
+# Marcas diacríticas combinantes (bloco U+0300–U+036F), removidas após NFKD
+_DIACRITICOS_RE = re.compile("[\u0300-\u036f]+")
+
+
+@lru_cache(maxsize=65536)
+def _bucket(term: str, dim: int) -> tuple[int, float]:
+    """Posição e sinal do termo no vetor (hash estável entre processos)."""
+    h = zlib.crc32(term.encode("utf-8"))
+    return h % dim, 1.0 if h & 0x80000000 else -1.0
+
+
+def _terms(text: str) -> list[str]:
+    """Palavras normalizadas e pares de palavras consecutivas."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = _DIACRITICOS_RE.sub("", text)
+    words = _WORD_RE.findall(text)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+# Embeddings por feature hashing, vetorizados com NumPy
+class HashingEmbeddings(Embeddings):
+    """Gera vetores ``float32`` de ``dim`` posições sem serviço externo.
+
+    O resultado depende apenas do texto e de ``dim``: o mesmo texto produz o
+    mesmo vetor em qualquer máquina.
+    """
+
+    def __init__(self, dim: int = 384) -> None:
+        self.dim = dim
+        self.model = f"hashing-{dim}"
+
+    def embed_matrix(self, texts: list[str]) -> np.ndarray:
+        """Matriz ``(len(texts), dim)`` com uma linha normalizada por texto."""
+        termos = [_terms(text) for text in texts]
+        # Cada termo distinto do lote é convertido em posição uma única vez
+        ids: dict[str, int] = {}
+        flat = [ids.setdefault(t, len(ids)) for lista in termos for t in lista]
+        buckets = np.array(
+            [_bucket(t, self.dim) for t in ids], dtype=np.float64
+        ).reshape(-1, 2)
+        flat = np.asarray(flat, dtype=np.intp)
+        rows = np.repeat(np.arange(len(texts)), [len(lista) for lista in termos])
+        cols = buckets[flat, 0].astype(np.intp) if len(flat) else flat
+        weights = buckets[flat, 1] if len(flat) else np.zeros(0)
+        matrix = np.bincount(
+            rows * self.dim + cols, weights=weights, minlength=len(texts) * self.dim
+        ).reshape(len(texts), self.dim)
+        # Frequências altas crescem devagar; o sinal do hash é preservado
+        matrix = (np.sign(matrix) * np.log1p(np.abs(matrix))).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+        return matrix
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embeddings de vários textos de uma só vez."""
+        return self.embed_matrix(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embedding de uma pergunta."""
+        return self.embed_matrix([text])[0].tolist()
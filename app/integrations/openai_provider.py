@@ -1,5 +1,7 @@
 import os
 import logging
+import threading
+from typing import Any, Callable
 from pathlib import Path
 from configparser import ConfigParser, ExtendedInterpolation
 
@@ -20,6 +22,8 @@ except Exception:  # pragma: no cover - fora do ambiente interno
 from langchain.chat_models import ChatOpenAI
 from langchain.embeddings import OpenAIEmbeddings
 
+from app.integrations.local_embeddings import HashingEmbeddings
+
 # Constantes com parâmetros usados no ambiente corporativo
 _OPENAI_API_VERSION = "2024-03-01-preview"
 _OPENAI_BASE_URL = (
@@ -37,6 +41,15 @@ _CERT_PATH = _CONFIG_DIR / "petrobras-ca-root.pem"
 _CONFIG_FILE = _CONFIG_DIR / "config-v1.x.ini"
 
 
+# Chave lida do arquivo de configuração, indexada por caminho e data de
+# modificação: o arquivo só é relido quando muda
+_key_cache: dict[tuple[Path, float], str | None] = {}
+# Clientes HTTP compartilhados por todos os modelos, um por certificado, para
+# que as conexões com o gateway interno sejam reaproveitadas
+_http_clients: dict[Path, object] = {}
+_http_lock = threading.Lock()
+
+
 def _load_internal_key() -> str | None:
     """Lê a chave de API do arquivo de configuração interno."""
     # Caso o arquivo não exista, simplesmente retornamos ``None``
@@ -45,12 +58,28 @@ def _load_internal_key() -> str | None:
         logger.warning("Arquivo de configuração %s não encontrado", _CONFIG_FILE)
         return None
 
+    cache_key = (_CONFIG_FILE, _CONFIG_FILE.stat().st_mtime)
+    if cache_key in _key_cache:
+        return _key_cache[cache_key]
     cfg = ConfigParser(interpolation=ExtendedInterpolation())
     try:
         cfg.read(_CONFIG_FILE, "UTF-8")
-        return cfg.get("OPENAI", "OPENAI_API_KEY")
+        key = cfg.get("OPENAI", "OPENAI_API_KEY")
     except Exception:  # pragma: no cover - arquivo opcional
-        return None
+        key = None
+    _key_cache.clear()
+    _key_cache[cache_key] = key
+    return key
+
+
+def _http_client():
+    """Devolve o cliente HTTP compartilhado para o certificado interno."""
+    with _http_lock:
+        client = _http_clients.get(_CERT_PATH)
+        if client is None or not isinstance(client, Client):
+            client = Client(verify=_CERT_PATH)
+            _http_clients[_CERT_PATH] = client
+        return client
 
 
 def _create_azure_chat(model: str):
@@ -69,7 +98,7 @@ def _create_azure_chat(model: str):
         openai_api_version=_OPENAI_API_VERSION,
         openai_api_key=key,
         base_url=f"{_OPENAI_BASE_URL}/{model}",
-        http_client=Client(verify=_CERT_PATH),
+        http_client=_http_client(),
     )
 
 
@@ -89,7 +118,7 @@ def _create_azure_embeddings(model: str):
         openai_api_version=_OPENAI_API_VERSION,
         openai_api_key=key,
         base_url=f"{_OPENAI_BASE_URL}/{model}",
-        http_client=Client(verify=_CERT_PATH),
+        http_client=_http_client(),
     )
 
 
@@ -110,8 +139,8 @@ def get_chat_model(model: str = "gpt-3.5-turbo"):
     return ChatOpenAI(model=model)
 
 
-def get_embeddings(model: str = "text-embedding-ada-002"):
-    """Retorna objeto de embeddings adequado ao ambiente."""
+def _openai_embeddings(model: str):
+    """Embeddings da OpenAI: Azure interno na VPN ou API pública."""
     if _use_internal_services():
         emb = _create_azure_embeddings(model)
         if emb is not None:
@@ -121,3 +150,35 @@ def get_embeddings(model: str = "text-embedding-ada-002"):
         return OpenAIEmbeddings(model=model)
     except TypeError:  # pragma: no cover - compatibilidade com stubs
         return OpenAIEmbeddings()
+
+
+def _hashing_embeddings(model: str):
+    """Embeddings locais por feature hashing, sem acesso à rede."""
+    return HashingEmbeddings(dim=int(os.getenv("EMBEDDING_DIM", "384")))
+
+
+# Backends de embeddings disponíveis, indexados pelo nome usado em
+# ``EMBEDDING_BACKEND``; cada um recebe o nome do modelo solicitado
+_EMBEDDING_BACKENDS: dict[str, Callable[[str], Any]] = {
+    "openai": _openai_embeddings,
+    "hashing": _hashing_embeddings,
+}
+
+
+def register_embedding_backend(name: str, factory: Callable[[str], Any]) -> None:
+    """Registra (ou substitui) um backend de embeddings."""
+    _EMBEDDING_BACKENDS[name] = factory
+
+
+def get_embeddings(model: str = "text-embedding-ada-002", backend: str | None = None):
+    """Retorna objeto de embeddings adequado ao ambiente.
+
+    ``backend`` (ou a variável ``EMBEDDING_BACKEND``, padrão ``"openai"``)
+    escolhe a implementação registrada; ``"hashing"`` funciona offline.
+    """
+    name = backend or os.getenv("EMBEDDING_BACKEND", "openai")
+    try:
+        factory = _EMBEDDING_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Backend de embeddings desconhecido: {name}") from None
+    return factory(model)
@@ -9,14 +9,38 @@ relatórios em texto.
 
 from __future__ import annotations
 
+import copy
 # Utilizamos dataclasses para simplificar a definição do objeto de domínio
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, fields, asdict
 from datetime import datetime, date
 import json
 from typing import Any
 
+import numpy as np
+from sqlalchemy import inspect as sa_inspect
+
 # Importação absoluta do ORM de contratos para evitar problemas de path
 from app.storage.relational_db_adapter import Contract
+from app.storage.vector_filters import date_key
+
+
+# Colunas usadas pelo relatório textual do contrato. O embedding fica de
+# fora: é volumoso e não é usado em relatórios nem nas rotas de detalhe.
+CAMPOS_RELATORIO = tuple(
+    c.name for c in Contract.__table__.columns if c.name != "vetor_embedding"
+)
+
+# Colunas carregadas para os contratos mantidos em cache; o texto completo
+# fica de fora para que cada entrada ocupe poucos bytes
+CAMPOS_CACHE = tuple(c for c in CAMPOS_RELATORIO if c != "texto_completo")
+
+
+def _valor_carregado(row: Any, nome: str) -> Any:
+    """Lê ``nome`` de ``row`` devolvendo ``None`` para colunas não carregadas."""
+    estado = sa_inspect(row, raiseerr=False)
+    if estado is not None and nome in estado.unloaded:
+        return None
+    return getattr(row, nome, None)
 
 
 @dataclass
@@ -40,6 +64,7 @@ class Contrato:
     valorContratoOriginal: float | None = None
     moeda: str | None = None
     taxaCambio: float | None = None
+    valorBRL: float | None = None
     gerenteContrato: str | None = None
     nomeGerenteContrato: str | None = None
     lotacaoGerenteContrato: str | None = None
@@ -55,8 +80,8 @@ class Contrato:
     # Linhas de serviço armazenadas em formato JSON
     linhasServico: list[dict[str, Any]] | None = field(default=None)
 
-    # Vetor de embedding gerado pelo modelo e o texto completo do contrato
-    vetor_embedding: list[float] | None = field(default=None)
+    # Vetor de embedding gerado pelo modelo (float32) e o texto completo
+    vetor_embedding: np.ndarray | None = field(default=None)
     texto_completo: str | None = None
 
     # ------------------------------------------------------------------
@@ -64,52 +89,61 @@ class Contrato:
     # ------------------------------------------------------------------
     @classmethod
     def from_orm(cls, row: Contract) -> "Contrato":
-        """Cria instância a partir de um registro ORM."""
-
-        # Decodifica o JSON armazenado nas colunas ``linhasServico`` e
-        # ``vetor_embedding`` caso existam. Isso facilita o uso em código
-        # Python, evitando que cada chamada precise fazer ``json.loads``.
-        linhas = (
-            json.loads(row.linhasServico)
-            if getattr(row, "linhasServico", None)
-            else None
-        )
-        vetor = (
-            json.loads(row.vetor_embedding)
-            if getattr(row, "vetor_embedding", None)
-            else None
-        )
-        return cls(
-            id=row.id,
-            name=row.name,
-            path=row.path,
-            ingestion_date=row.ingestion_date,
-            last_processed=row.last_processed,
-            contrato=row.contrato,
-            inicioPrazo=row.inicioPrazo,
-            fimPrazo=row.fimPrazo,
-            empresa=row.empresa,
-            icj=row.icj,
-            valorContratoOriginal=float(row.valorContratoOriginal)
-            if row.valorContratoOriginal is not None
-            else None,
-            moeda=row.moeda,
-            taxaCambio=row.taxaCambio,
-            gerenteContrato=row.gerenteContrato,
-            nomeGerenteContrato=row.nomeGerenteContrato,
-            lotacaoGerenteContrato=row.lotacaoGerenteContrato,
-            areaContrato=row.areaContrato,
-            modalidade=row.modalidade,
-            textoModalidade=row.textoModalidade,
-            reajuste=row.reajuste,
-            fornecedor=row.fornecedor,
-            nomeFornecedor=row.nomeFornecedor,
-            tipoContrato=row.tipoContrato,
-            objetoContrato=row.objetoContrato,
-            linhasServico=linhas,
-            vetor_embedding=vetor,
-            texto_completo=row.texto_completo,
-        )
+        """Cria instância a partir de um registro ORM.
+
+        Colunas que não foram carregadas na consulta (por exemplo, as colunas
+        volumosas adiadas ou fora de uma projeção ``load_only``) resultam em
+        ``None`` em vez de disparar uma nova leitura no banco.
+        """
+        valores = {f.name: _valor_carregado(row, f.name) for f in fields(cls)}
+
+        # Decodifica o JSON armazenado em ``linhasServico`` caso exista. O
+        # embedding já chega como ``np.ndarray`` a partir do tipo da coluna.
+        if valores["linhasServico"]:
+            valores["linhasServico"] = json.loads(valores["linhasServico"])
+        else:
+            valores["linhasServico"] = None
+        if valores["valorContratoOriginal"] is not None:
+            valores["valorContratoOriginal"] = float(valores["valorContratoOriginal"])
+        return cls(**valores)
+
+    @classmethod
+    def carregar(cls, db: Any, contrato: str) -> "Contrato | None":
+        """Obtém o contrato pelo número, usando o cache do adaptador.
+
+        Em caso de acerto o banco não é consultado. Na falta, o registro é lido
+        com as colunas de :data:`CAMPOS_CACHE` (sem ``texto_completo``) e
+        guardado no cache, a menos que uma escrita tenha ocorrido durante a
+        leitura. Cada chamada recebe uma cópia, que pode ser alterada sem
+        afetar o cache.
+        """
+        cache = db.contract_cache
+        encontrado = cache.get(contrato)
+        if encontrado is not None:
+            return copy.deepcopy(encontrado)
+        geracao = cache.generation
+        row = db.get_contract_by_contrato(contrato, fields=CAMPOS_CACHE)
+        if row is None:
+            return None
+        encontrado = cls.from_orm(row)
+        cache.put(contrato, encontrado, generation=geracao)
+        return copy.deepcopy(encontrado)
+
+    def metadados_vetor(self) -> dict:
+        """Metadados gravados junto ao documento do contrato no vetor.
+
+        Campos vazios são omitidos, pois o Chroma não aceita ``None``, e
+        ``fimPrazo`` é gravado como inteiro ``AAAAMMDD`` para permitir
+        filtros de intervalo.
+        """
+        metadados = {}
+        for nome in ("contrato", "moeda", "fornecedor", "empresa"):
+            valor = getattr(self, nome)
+            if valor:
+                metadados[nome] = str(valor)
+        if self.fimPrazo is not None:
+            metadados["fimPrazo"] = date_key(self.fimPrazo)
+        return metadados
 
     def to_dict(self) -> dict:
         """Converte o contrato para ``dict`` padrão do Python.
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 from datetime import datetime
 
 from app.integrations.openai_provider import get_chat_model
@@ -9,8 +10,9 @@ from app.storage.relational_db_adapter import (
     RelationalDBAdapter,
     Contract,
 )
-from app.models.contrato import Contrato
+from app.models.contrato import CAMPOS_RELATORIO, Contrato
 
+logger = logging.getLogger(__name__)
 
 # Classe responsável por executar prompts em todos os contratos
 class ExhaustiveProcessor:
@@ -30,12 +32,21 @@ class ExhaustiveProcessor:
         self._llm = get_chat_model(model=model)
         self._max_concurrent = max_concurrent
 
-    async def run(self, prompt: str | None = None) -> list[int]:
-        """Dispara a execução e retorna ids das execuções criadas."""
-        # Recupera todos os contratos disponíveis
-        session = self._db._Session()
-        contracts = session.query(Contract).order_by(Contract.id).all()
-        session.close()
+    async def run(
+        self, prompt: str | None = None, *, since_seq: int | None = None
+    ) -> list[int]:
+        """Dispara a execução e retorna ids das execuções criadas.
+
+        Com ``since_seq`` apenas os contratos inseridos ou alterados depois
+        dessa sequência do log de alterações (ver
+        :meth:`RelationalDBAdapter.changes_since`) são processados.
+        """
+        # Recupera apenas id e número dos contratos; os dados completos de
+        # cada um são lidos sob demanda durante o processamento
+        contracts = self._db.list_contracts(fields=("id", "contrato"))
+        if since_seq is not None:
+            changed = {c.contract_id for c in self._db.changes_since(since_seq)}
+            contracts = [c for c in contracts if c.id in changed]
 
         # Determina os prompts a executar: único ad-hoc ou todos cadastrados
         if prompt is not None:
@@ -69,21 +80,32 @@ class ExhaustiveProcessor:
         async def handle(contract: Contract) -> None:
             nonlocal processed
             async with sem:
-                # Monta o texto completo a ser enviado ao modelo
-                contrato = Contrato.from_orm(contract)
-                texto = f"{prompt_text}\n\n{contrato.relatorio()}"
-                # Chamada assíncrona ao modelo de linguagem
-                if hasattr(self._llm, "ainvoke"):
-                    resposta = await self._llm.ainvoke(texto)
+                # Monta o texto completo a ser enviado ao modelo. O registro é
+                # lido só agora, sem o embedding e fora do cache, para que
+                # apenas os contratos em processamento tenham o texto em memória
+                row = self._db.get_contract(contract.id, fields=CAMPOS_RELATORIO)
+                if row is None:
+                    # Contrato excluído depois de listado: não há o que analisar
+                    logger.warning(
+                        "Contrato %s removido durante a execução %s; ignorado",
+                        contract.contrato,
+                        exec_id,
+                    )
                 else:
-                    resposta = await asyncio.to_thread(self._llm.predict, texto)
-                simples = resposta.strip().split("\n", 1)[0] if resposta else None
-                self._db.add_execution_result(
-                    exec_id,
-                    contract.id,
-                    resposta_completa=resposta,
-                    resposta_simples=simples,
-                )
+                    contrato = Contrato.from_orm(row)
+                    texto = f"{prompt_text}\n\n{contrato.relatorio()}"
+                    # Chamada assíncrona ao modelo de linguagem
+                    if hasattr(self._llm, "ainvoke"):
+                        resposta = await self._llm.ainvoke(texto)
+                    else:
+                        resposta = await asyncio.to_thread(self._llm.predict, texto)
+                    simples = resposta.strip().split("\n", 1)[0] if resposta else None
+                    self._db.add_execution_result(
+                        exec_id,
+                        contract.id,
+                        resposta_completa=resposta,
+                        resposta_simples=simples,
+                    )
                 # Atualiza progresso de forma sincronizada
                 async with lock:
                     processed += 1
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from app.config.settings import EXECUTION_ARCHIVE_DIR, EXECUTION_KEEP_RUNS
+from app.storage.execution_tracker import ExecutionTracker
+from app.storage.relational_db_adapter import RelationalDBAdapter
+
+
+# Rotina de manutenção dos resultados de execução de prompts
+class ExecutionRetentionJob:
+    """Arquiva execuções antigas de cada prompt e compacta o banco.
+
+    Mantém no banco apenas as ``keep_last`` execuções mais recentes de cada
+    prompt; os resultados das demais são gravados em arquivos gzip em
+    ``archive_dir`` e podem ser restaurados depois. A rotina é registrada
+    como uma execução comum via :class:`ExecutionTracker`. ``keep_last``
+    menor que 1 gera ``ValueError``: arquivaria todas as execuções.
+    """
+
+    def __init__(
+        self,
+        relational_db: RelationalDBAdapter,
+        *,
+        keep_last: int = EXECUTION_KEEP_RUNS,
+        archive_dir: str = EXECUTION_ARCHIVE_DIR,
+    ) -> None:
+        if keep_last < 1:
+            raise ValueError("keep_last deve ser pelo menos 1")
+        self._db = relational_db
+        self.keep_last = keep_last
+        self.archive_dir = archive_dir
+
+    # Executa arquivamento e compactação, retornando o id da execução
+    def run(self) -> int:
+        """Aplica a política de retenção e libera o espaço no arquivo."""
+        tracker = ExecutionTracker(
+            self._db, "execution_compaction", self.__class__.__name__
+        )
+        exec_id = tracker.start()
+        try:
+            old = self._db.executions_beyond_retention(self.keep_last)
+            for done, old_id in enumerate(old, start=1):
+                self._db.archive_execution(old_id, self.archive_dir)
+                tracker.update(progress=done / len(old) * 90)
+            # Respostas referenciadas apenas pelos resultados arquivados
+            self._db.prune_answers()
+            freed = self._db.compact()
+            tracker.update(
+                progress=100.0,
+                message=f"{len(old)} execuções arquivadas, {freed} bytes liberados",
+            )
+            tracker.finish()
+            return exec_id
+        except Exception:
+            # Em caso de erro marca a execução como falha
+            tracker.finish(status="failed")
+            raise
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from app.models.contrato import CAMPOS_CACHE, Contrato
+from app.storage.execution_tracker import ExecutionTracker
+from app.storage.relational_db_adapter import ContractChange, RelationalDBAdapter
+from app.storage.vector_store_adapter import VectorStoreAdapter
+
+
+# Sincroniza o vetor com os contratos alterados desde a última execução
+class ContractVectorSync:
+    """Consome ``contract_changes`` e atualiza apenas os contratos afetados.
+
+    Os documentos de cada contrato são os trechos gravados pela ingestão,
+    identificados no vetor pelo metadado ``source`` (o ``path`` do
+    contrato). A sincronização não recalcula embeddings: contratos inseridos
+    ou alterados têm os metadados de filtro regravados nesses documentos e
+    contratos excluídos têm os documentos removidos. A posição no log de
+    alterações é gravada sob o nome ``consumer`` ao final de cada lote, de
+    modo que uma falha não perde alterações já confirmadas.
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStoreAdapter,
+        relational_db: RelationalDBAdapter,
+        *,
+        consumer: str = "vector_store",
+        batch_size: int = 200,
+    ) -> None:
+        self._vector_store = vector_store
+        self._db = relational_db
+        self.consumer = consumer
+        self.batch_size = batch_size
+
+    # Processa as alterações pendentes e retorna o id da execução
+    def run(self) -> int:
+        """Atualiza metadados de contratos alterados e remove os excluídos."""
+        tracker = ExecutionTracker(self._db, "vector_sync", self.__class__.__name__)
+        exec_id = tracker.start()
+        try:
+            offset = self._db.get_consumer_offset(self.consumer)
+            last = self._db.last_change_seq()
+            synced = 0
+            while True:
+                changes = self._db.changes_since(offset, limit=self.batch_size)
+                if not changes:
+                    break
+                # Apenas o estado final de cada contrato no lote importa
+                latest = {c.contract_id: c for c in changes}
+                self._apply(latest)
+                synced += len(latest)
+                offset = changes[-1].seq
+                self._db.set_consumer_offset(self.consumer, offset)
+                if last:
+                    tracker.update(progress=min(offset / last * 100, 100.0))
+            self._vector_store.persist()
+            tracker.update(progress=100.0, message=f"{synced} contratos sincronizados")
+            tracker.finish()
+            return exec_id
+        except Exception:
+            # Em caso de erro marca a execução como falha
+            tracker.finish(status="failed")
+            raise
+
+    def _apply(self, latest: dict[int, ContractChange]) -> None:
+        """Atualiza o vetor para um lote de contratos alterados."""
+        for contract_id, change in latest.items():
+            row = None
+            if change.operacao != "delete":
+                row = self._db.get_contract(contract_id, fields=CAMPOS_CACHE)
+            if row is None:
+                # O mesmo arquivo pode ter sido regravado com outro id (recarga)
+                if change.path and self._db.get_contract_by_path(change.path) is None:
+                    self._vector_store.delete_where({"source": change.path})
+                continue
+            contrato = Contrato.from_orm(row)
+            if not contrato.path:
+                continue
+            self._vector_store.update_metadata(
+                {"source": contrato.path},
+                {"contract_id": contract_id, **contrato.metadados_vetor()},
+            )
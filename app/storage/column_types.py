@@ -0,0 +1,181 @@
+"""Tipos de coluna personalizados usados pelos modelos ORM."""
+
+from __future__ import annotations
+
+import json
+import threading
+import zlib
+
+import numpy as np
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - biblioteca opcional
+    zstandard = None
+
+# Primeiro byte dos textos comprimidos identifica o codec utilizado
+_CODEC_ZLIB = b"\x01"
+_CODEC_ZSTD = b"\x02"
+
+
+# Dicionários zstd de um banco, indexados pelo ``dict_id`` gravado nos frames
+class TextDictionaries:
+    """Dicionários de compressão gravados em um banco específico.
+
+    Cada adaptador mantém a sua instância, associada ao dialeto do engine,
+    de modo que só se comprime com dicionários guardados no próprio banco.
+    Compressores e descompressores são criados por thread, pois os objetos
+    do zstd não são seguros entre threads.
+    """
+
+    def __init__(self) -> None:
+        self._data: dict[int, bytes] = {}
+        # Dicionário usado nas novas gravações (``None`` comprime sem dicionário)
+        self.active: int | None = None
+        self._local = threading.local()
+
+    def register(self, dict_id: int, data: bytes, *, active: bool = True) -> None:
+        """Registra um dicionário zstd e, opcionalmente, o torna o ativo."""
+        self._data[dict_id] = data
+        if active:
+            self.active = dict_id
+
+    def __contains__(self, dict_id: int) -> bool:
+        return dict_id in self._data
+
+    def _zstd_dict(self, dict_id: int):
+        """Cria o objeto de dicionário do zstd a partir dos bytes registrados."""
+        try:
+            return zstandard.ZstdCompressionDict(self._data[dict_id])
+        except KeyError:
+            raise ValueError(
+                f"Dicionário zstd {dict_id} não está gravado neste banco"
+            ) from None
+
+    def compressor(self):
+        """Devolve o compressor zstd da thread para o dicionário ativo."""
+        cache = self._local.__dict__.setdefault("compressors", {})
+        key = self.active
+        if key not in cache:
+            if key is None:
+                cache[key] = zstandard.ZstdCompressor(level=10)
+            else:
+                cache[key] = zstandard.ZstdCompressor(
+                    level=10, dict_data=self._zstd_dict(key)
+                )
+        return cache[key]
+
+    def decompressor(self, dict_id: int):
+        """Devolve o descompressor zstd da thread para ``dict_id`` (0 = nenhum)."""
+        cache = self._local.__dict__.setdefault("decompressors", {})
+        if dict_id not in cache:
+            if dict_id:
+                cache[dict_id] = zstandard.ZstdDecompressor(
+                    dict_data=self._zstd_dict(dict_id)
+                )
+            else:
+                cache[dict_id] = zstandard.ZstdDecompressor()
+        return cache[dict_id]
+
+
+# Conjunto vazio usado quando o dialeto não tem dicionários associados
+_NO_DICTIONARIES = TextDictionaries()
+
+
+# Dicionários associados ao engine que está gravando ou lendo
+def dialect_dictionaries(dialect) -> TextDictionaries:
+    """Lê os dicionários que o adaptador associou ao dialeto do engine."""
+    return getattr(dialect, "vcc_text_dictionaries", None) or _NO_DICTIONARIES
+
+
+def compress_text(value: str, dictionaries: TextDictionaries | None = None) -> bytes:
+    """Comprime texto com zstd (e dicionário ativo) ou, na falta, com zlib."""
+    raw = value.encode("utf-8")
+    if zstandard is None:
+        return _CODEC_ZLIB + zlib.compress(raw, 6)
+    dictionaries = dictionaries or _NO_DICTIONARIES
+    return _CODEC_ZSTD + dictionaries.compressor().compress(raw)
+
+
+def decompress_text(
+    value: bytes | str | None, dictionaries: TextDictionaries | None = None
+) -> str | None:
+    """Reverte :func:`compress_text`; textos ainda não comprimidos passam direto."""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    codec, payload = value[:1], value[1:]
+    if codec == _CODEC_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if codec == _CODEC_ZSTD:
+        dict_id = zstandard.get_frame_parameters(payload).dict_id
+        dictionaries = dictionaries or _NO_DICTIONARIES
+        return dictionaries.decompressor(dict_id).decompress(payload).decode("utf-8")
+    raise ValueError("Formato de texto comprimido desconhecido")
+
+
+# Vetor de embedding armazenado como BLOB de floats compactados
+class EmbeddingVector(TypeDecorator):
+    """Guarda vetores como bytes ``float32`` (ou ``float16``) contíguos.
+
+    Na escrita aceita listas, arrays NumPy ou o JSON legado; na leitura
+    devolve um ``np.ndarray`` criado com ``np.frombuffer``, sem cópia dos
+    dados (o array resultante é somente leitura).
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, dtype: str = "float32") -> None:
+        super().__init__()
+        self.dtype = np.dtype(dtype)
+
+    def process_bind_param(self, value, dialect):
+        """Converte o vetor recebido em bytes antes de gravar."""
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        if isinstance(value, str):
+            # Valores antigos eram gravados como lista JSON (ou ``null``)
+            value = json.loads(value)
+            if value is None:
+                return None
+        return np.asarray(value, dtype=self.dtype).tobytes()
+
+    def process_result_value(self, value, dialect):
+        """Cria o array NumPy diretamente sobre o buffer lido do banco."""
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # Linha ainda não migrada do formato JSON
+            value = json.loads(value)
+            return None if value is None else np.asarray(value, dtype=self.dtype)
+        return np.frombuffer(value, dtype=self.dtype)
+
+
+# Texto longo armazenado de forma comprimida e transparente para o ORM
+class CompressedText(TypeDecorator):
+    """Grava ``str`` como BLOB comprimido (zstd com dicionário ou zlib).
+
+    Os dicionários vêm de :func:`dialect_dictionaries`, isto é, do banco em
+    que o valor é gravado ou lido.
+
+    A leitura devolve o texto original. Valores antigos em texto puro são
+    aceitos e retornados sem alteração até serem migrados.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        """Comprime o texto antes de gravar."""
+        if value is None or isinstance(value, (bytes, bytearray)):
+            return value
+        return compress_text(value, dialect_dictionaries(dialect))
+
+    def process_result_value(self, value, dialect):
+        """Descomprime o BLOB lido do banco."""
+        return decompress_text(value, dialect_dictionaries(dialect))
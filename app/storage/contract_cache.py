@@ -0,0 +1,135 @@
+"""Cache em memória para leituras frequentes de contratos.
+
+O cache é um LRU limitado em quantidade de itens e com tempo de vida (TTL)
+por entrada. A invalidação é feita por um contador de geração: cada escrita
+na tabela de contratos incrementa a geração e as entradas gravadas em
+gerações anteriores deixam de ser válidas, sem varrer o cache. Escritas de
+outros processos são percebidas por um ``validator`` opcional, que devolve
+uma marca do estado do banco consultada no máximo a cada
+``check_interval`` segundos.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+# Marca ainda não lida do banco
+_UNKNOWN = object()
+
+# Cache LRU com TTL e invalidação por geração
+class ContractCache:
+    """Guarda objetos por chave com limite de tamanho e expiração.
+
+    ``hits`` e ``misses`` contam as consultas atendidas ou não pelo cache e
+    podem ser lidos a qualquer momento via :meth:`stats`. Quando a marca
+    devolvida por ``validator`` muda, o cache é invalidado como em
+    :meth:`bump`.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float | None = 300.0,
+        *,
+        validator: Callable[[], Hashable] | None = None,
+        check_interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.validator = validator
+        self.check_interval = check_interval
+        self._clock = clock
+        self._items: OrderedDict[Hashable, tuple[int, float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        # Marca do banco na última verificação (``_UNKNOWN`` força releitura)
+        self._token: Any = _UNKNOWN
+        self._checked_at = float("-inf")
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        """Geração atual, já considerando escritas feitas por outros processos."""
+        self.validate()
+        return self._generation
+
+    def validate(self) -> None:
+        """Consulta ``validator`` e invalida o cache se o banco mudou."""
+        if self.validator is None:
+            return
+        now = self._clock()
+        with self._lock:
+            recent = now - self._checked_at < self.check_interval
+            if self._token is not _UNKNOWN and recent:
+                return
+            self._checked_at = now
+        token = self.validator()
+        with self._lock:
+            previous, self._token = self._token, token
+            if previous is _UNKNOWN or previous == token:
+                return
+            self._generation += 1
+            self._items.clear()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Devolve o valor em cache ou ``default`` se ausente ou inválido."""
+        self.validate()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                generation, stored_at, value = item
+                expired = self.ttl is not None and self._clock() - stored_at > self.ttl
+                if generation == self._generation and not expired:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._items[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any, *, generation: int | None = None) -> None:
+        """Armazena ``value``, descartando o item menos usado se necessário.
+
+        ``generation`` deve ser a geração lida antes de consultar o banco;
+        se uma escrita ocorreu no meio tempo o valor já nasce obsoleto e não
+        é guardado.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._items[key] = (self._generation, self._clock(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def bump(self) -> int:
+        """Invalida todas as entradas incrementando a geração.
+
+        A marca do banco é relida na próxima consulta sem nova invalidação,
+        pois a escrita que motivou o ``bump`` já foi considerada.
+        """
+        with self._lock:
+            self._generation += 1
+            self._items.clear()
+            self._token = _UNKNOWN
+            return self._generation
+
+    def stats(self) -> dict:
+        """Retorna métricas de uso do cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
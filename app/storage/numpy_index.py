@@ -0,0 +1,497 @@
+"""Índice vetorial exato em NumPy, com os vetores mapeados em memória.
+
+É uma alternativa ao Chroma para acervos de até alguns milhões de trechos. Os
+vetores normalizados ficam em matrizes ``.npy`` (``float32`` ou ``float16``)
+abertas com ``mmap``, de modo que carregar o índice não lê os vetores do
+disco. Ids, textos e metadados ficam em um arquivo JSON ao lado de cada
+matriz. A busca é exata: multiplicação de matrizes por blocos, máscara de
+metadados e seleção dos ``k`` melhores com ``argpartition``.
+
+As escritas são acumuladas em memória (já visíveis nas buscas) e gravadas em
+um segmento novo por :meth:`NumpyVectorIndex.persist` ou quando o acúmulo
+passa de ``flush_rows``; segmentos gravados nunca são alterados. Exclusões e
+substituições são registradas no segmento seguinte e aplicadas na ordem ao
+carregar. Com segmentos demais (ou linhas mortas demais), o índice é
+compactado: as linhas vivas são reescritas em um único segmento.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from app.storage.vector_filters import where_clauses
+
+# Linhas multiplicadas de uma vez na busca
+_BLOCK_ROWS = 65536
+
+
+# Conjunto de linhas gravadas juntas (ou ainda pendentes)
+class _Segment:
+    """Vetores, ids, textos e metadados de um segmento.
+
+    ``alive`` marca as linhas que não foram excluídas nem substituídas.
+    """
+
+    def __init__(
+        self,
+        name: str | None,
+        vectors: np.ndarray,
+        ids: list[str],
+        documents: list[str],
+        metadatas: list[dict],
+        deleted: list[str] | None = None,
+    ) -> None:
+        self.name = name
+        self.vectors = vectors
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.deleted = deleted or []
+        self.alive = np.ones(len(ids), dtype=bool)
+        self._columns: dict[tuple[str, str], Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(
+        self, vectors: np.ndarray, ids: list[str], documents: list[str], metadatas: list[dict]
+    ) -> None:
+        """Acrescenta linhas (usado apenas no segmento pendente)."""
+        self.vectors = np.concatenate([self.vectors, vectors])
+        self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+        self.ids.extend(ids)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+        self._columns.clear()
+
+    def _codes(self, name: str) -> tuple[np.ndarray, dict]:
+        """Códigos inteiros do campo (``-1`` quando ausente) e o vocabulário."""
+        key = (name, "codes")
+        if key not in self._columns:
+            vocab: dict = {}
+            codes = np.fromiter(
+                (
+                    -1 if (v := md.get(name)) is None else vocab.setdefault(v, len(vocab))
+                    for md in self.metadatas
+                ),
+                dtype=np.int32,
+                count=len(self.metadatas),
+            )
+            self._columns[key] = (codes, vocab)
+        return self._columns[key]
+
+    def _numbers(self, name: str) -> np.ndarray:
+        """Valores numéricos do campo (``nan`` quando ausente)."""
+        key = (name, "numbers")
+        if key not in self._columns:
+            self._columns[key] = np.array(
+                [
+                    v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+                    for v in (md.get(name) for md in self.metadatas)
+                ],
+                dtype=np.float64,
+            )
+        return self._columns[key]
+
+    def mask(self, where: dict | None) -> np.ndarray:
+        """Linhas vivas cujos metadados satisfazem ``where``."""
+        mask = self.alive.copy()
+        for name, op, expected in where_clauses(where):
+            if op in ("$gte", "$lte"):
+                values = self._numbers(name)
+                with np.errstate(invalid="ignore"):
+                    mask &= values >= expected if op == "$gte" else values <= expected
+                continue
+            codes, vocab = self._codes(name)
+            wanted = [vocab[v] for v in (expected if op == "$in" else [expected]) if v in vocab]
+            mask &= np.isin(codes, wanted)
+        return mask
+
+
+# Índice exato com segmentos somente de acréscimo
+class NumpyVectorIndex:
+    """Guarda e busca vetores em ``directory``.
+
+    Oferece o subconjunto da interface do Chroma usado por
+    :class:`~app.storage.vector_store_adapter.VectorStoreAdapter`:
+    ``add_texts``, ``get``, ``update``, ``delete``, ``persist`` e ``query``
+    (mesmos formatos de resposta da ``Collection`` do Chroma). ``dtype`` define a precisão dos vetores
+    gravados; ``float16`` ocupa metade do espaço com perda pequena de
+    precisão nas similaridades.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        embedding_function: Any = None,
+        *,
+        dtype: str = "float32",
+        flush_rows: int = 1024,
+        max_segments: int = 8,
+    ) -> None:
+        self.directory = Path(directory)
+        self.embedding_function = embedding_function
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float16, np.float32):
+            raise ValueError(f"dtype não suportado: {dtype}")
+        self.flush_rows = flush_rows
+        self.max_segments = max_segments
+        self.dim: int | None = None
+        self._segments: list[_Segment] = []
+        self._pending: _Segment | None = None
+        self._locations: dict[str, tuple[_Segment, int]] = {}
+        self._next = 1
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self) -> None:
+        """Abre os segmentos listados no manifesto e reaplica as exclusões."""
+        path = self.directory / "manifest.json"
+        if not path.exists():
+            return
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        self.dim = manifest.get("dim")
+        self.dtype = np.dtype(manifest.get("dtype", self.dtype.name))
+        self._next = manifest.get("next", 1)
+        for name in manifest["segments"]:
+            self._apply(self._open_segment(name))
+
+    def _open_segment(self, name: str) -> _Segment:
+        """Carrega metadados do segmento e mapeia seus vetores em memória."""
+        meta = json.loads((self.directory / f"{name}.json").read_text(encoding="utf-8"))
+        if meta["ids"]:
+            vectors = np.load(self.directory / f"{name}.npy", mmap_mode="r")
+        else:
+            vectors = np.empty((0, self.dim or 0), dtype=self.dtype)
+        return _Segment(
+            name, vectors, meta["ids"], meta["documents"], meta["metadatas"], meta["deleted"]
+        )
+
+    def _apply(self, segment: _Segment) -> None:
+        """Registra o segmento: exclusões primeiro, depois as linhas novas."""
+        for id_ in segment.deleted:
+            self._kill(id_)
+        for row, id_ in enumerate(segment.ids):
+            self._kill(id_)
+            self._locations[id_] = (segment, row)
+        self._segments.append(segment)
+
+    def _kill(self, id_: str) -> None:
+        """Marca como morta a linha atual de ``id_``, se houver."""
+        location = self._locations.pop(id_, None)
+        if location is not None:
+            segment, row = location
+            segment.alive[row] = False
+
+    def _write_segment(
+        self,
+        vectors: np.ndarray,
+        ids: list[str],
+        documents: list[str],
+        metadatas: list[dict],
+        deleted: list[str],
+    ) -> str:
+        """Grava um segmento novo e devolve seu nome."""
+        name = f"seg-{self._next:06d}"
+        self._next += 1
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if ids:
+            tmp = self.directory / f"{name}.tmp.npy"
+            np.save(tmp, np.ascontiguousarray(vectors, dtype=self.dtype))
+            os.replace(tmp, self.directory / f"{name}.npy")
+        meta = {"deleted": deleted, "ids": ids, "documents": documents, "metadatas": metadatas}
+        self._write_json(f"{name}.json", meta)
+        return name
+
+    def _write_json(self, filename: str, data: dict) -> None:
+        """Grava JSON de forma atômica (arquivo temporário e ``os.replace``)."""
+        tmp = self.directory / f"{filename}.tmp"
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.directory / filename)
+
+    def _write_manifest(self) -> None:
+        """Grava a lista de segmentos vigentes, tornando a escrita visível."""
+        self._write_json(
+            "manifest.json",
+            {
+                "dim": self.dim,
+                "dtype": self.dtype.name,
+                "next": self._next,
+                "segments": [s.name for s in self._segments],
+            },
+        )
+
+    def _pending_segment(self) -> _Segment:
+        """Segmento em memória que acumula as escritas ainda não gravadas."""
+        if self._pending is None:
+            empty = np.empty((0, self.dim or 0), dtype=self.dtype)
+            self._pending = _Segment(None, empty, [], [], [])
+        elif not len(self._pending) and self.dim is not None:
+            # Exclusões podem ter criado o segmento antes de a dimensão ser conhecida
+            self._pending.vectors = np.empty((0, self.dim), dtype=self.dtype)
+        return self._pending
+
+    def add_vectors(
+        self,
+        ids: list[str],
+        vectors,
+        documents: list[str],
+        metadatas: list[dict] | None = None,
+    ) -> None:
+        """Insere ou substitui linhas com vetores já calculados."""
+        if not ids:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("Esperado um vetor por id")
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(
+                    f"Dimensão {vectors.shape[1]} difere da do índice ({self.dim})"
+                )
+            vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+            pending = self._pending_segment()
+            start = len(pending)
+            pending.append(
+                vectors.astype(self.dtype),
+                list(ids),
+                list(documents),
+                [dict(m or {}) for m in (metadatas or [{}] * len(ids))],
+            )
+            for row, id_ in enumerate(ids, start):
+                self._kill(id_)
+                self._locations[id_] = (pending, row)
+            if int(pending.alive.sum()) >= self.flush_rows:
+                self.persist()
+
+    def add_texts(
+        self,
+        texts: list[str],
+        metadatas: list[dict] | None = None,
+        ids: list[str] | None = None,
+    ) -> list[str]:
+        """Calcula os embeddings com ``embedding_function`` e grava os textos."""
+        texts = list(texts)
+        ids = list(ids) if ids is not None else [uuid.uuid4().hex for _ in texts]
+        vectors = self.embedding_function.embed_documents(texts) if texts else []
+        self.add_vectors(ids, vectors, texts, metadatas)
+        return ids
+
+    def get(
+        self,
+        ids: list[str] | None = None,
+        where: dict | None = None,
+        include: list[str] | tuple = ("metadatas", "documents"),
+    ) -> dict:
+        """Lista as linhas vivas (de ``ids``, se informados) que satisfazem ``where``."""
+        with self._lock:
+            segments = self._segments + ([self._pending] if self._pending else [])
+            wanted = None if ids is None else set(ids)
+            hits = [
+                (segment, row)
+                for segment in segments
+                for row in np.flatnonzero(segment.mask(where))
+                if wanted is None or segment.ids[row] in wanted
+            ]
+        response: dict[str, Any] = {"ids": [s.ids[r] for s, r in hits]}
+        if "documents" in include:
+            response["documents"] = [s.documents[r] for s, r in hits]
+        if "metadatas" in include:
+            response["metadatas"] = [dict(s.metadatas[r]) for s, r in hits]
+        return response
+
+    def update(self, ids: list[str], metadatas: list[dict]) -> None:
+        """Troca os metadados das linhas, reaproveitando vetor e texto gravados."""
+        with self._lock:
+            rows = [(id_, self._locations[id_], md) for id_, md in zip(ids, metadatas)]
+            for id_, (segment, row), metadata in rows:
+                self.add_vectors(
+                    [id_],
+                    segment.vectors[row : row + 1],
+                    [segment.documents[row]],
+                    [metadata],
+                )
+
+    def delete(self, ids: list[str]) -> None:
+        """Exclui as linhas dos ids informados."""
+        with self._lock:
+            pending = self._pending_segment()
+            for id_ in ids:
+                self._kill(id_)
+                pending.deleted.append(id_)
+
+    def persist(self) -> None:
+        """Grava as escritas pendentes em um segmento novo.
+
+        Com mais de ``max_segments`` segmentos, ou mais linhas mortas que
+        vivas, compacta o índice em seguida.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, None
+            if pending is None or (not len(pending) and not pending.deleted):
+                return
+            live = np.flatnonzero(pending.alive)
+            name = self._write_segment(
+                pending.vectors[live],
+                [pending.ids[i] for i in live],
+                [pending.documents[i] for i in live],
+                [pending.metadatas[i] for i in live],
+                pending.deleted,
+            )
+            segment = self._open_segment(name)
+            for row, id_ in enumerate(segment.ids):
+                self._locations[id_] = (segment, row)
+            self._segments.append(segment)
+            self._write_manifest()
+            total = sum(len(s) for s in self._segments)
+            if len(self._segments) > self.max_segments or total > 2 * len(self._locations):
+                self.compact()
+
+    def compact(self) -> None:
+        """Reescreve as linhas vivas de todos os segmentos em um só."""
+        with self._lock:
+            self.persist()
+            old = [s.name for s in self._segments]
+            live = [(s, np.flatnonzero(s.alive)) for s in self._segments]
+            total = sum(len(rows) for _, rows in live)
+            name = f"seg-{self._next:06d}"
+            self._next += 1
+            self.directory.mkdir(parents=True, exist_ok=True)
+            ids, documents, metadatas = [], [], []
+            if total:
+                tmp = self.directory / f"{name}.tmp.npy"
+                out = np.lib.format.open_memmap(
+                    tmp, mode="w+", dtype=self.dtype, shape=(total, self.dim)
+                )
+                offset = 0
+                for segment, rows in live:
+                    for start in range(0, len(rows), _BLOCK_ROWS):
+                        chunk = rows[start : start + _BLOCK_ROWS]
+                        out[offset : offset + len(chunk)] = segment.vectors[chunk]
+                        offset += len(chunk)
+                    ids.extend(segment.ids[i] for i in rows)
+                    documents.extend(segment.documents[i] for i in rows)
+                    metadatas.extend(segment.metadatas[i] for i in rows)
+                out.flush()
+                del out
+                os.replace(tmp, self.directory / f"{name}.npy")
+            self._write_json(
+                f"{name}.json",
+                {"deleted": [], "ids": ids, "documents": documents, "metadatas": metadatas},
+            )
+            self._segments, self._locations = [], {}
+            self._apply(self._open_segment(name))
+            self._write_manifest()
+            for old_name in old:
+                for suffix in (".npy", ".json"):
+                    (self.directory / f"{old_name}{suffix}").unlink(missing_ok=True)
+
+    def search(
+        self, queries, k: int = 4, where: dict | None = None
+    ) -> list[list[tuple[float, str, str, dict, np.ndarray]]]:
+        """Busca exata para um lote de perguntas.
+
+        ``queries`` é uma matriz ``(m, dim)`` (ou um único vetor). Para cada
+        pergunta devolve até ``k`` tuplas ``(similaridade, id, texto,
+        metadados, vetor)`` em ordem decrescente de similaridade cosseno,
+        considerando só as linhas que satisfazem ``where``.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12)
+        m = len(queries)
+        with self._lock:
+            segments = self._segments + ([self._pending] if self._pending else [])
+            masks = [s.mask(where) for s in segments]
+        best = np.empty((m, 0), dtype=np.float32)
+        best_seg = np.empty((m, 0), dtype=np.intp)
+        best_row = np.empty((m, 0), dtype=np.intp)
+        if k <= 0:
+            return [[] for _ in range(m)]
+        for s, (segment, mask) in enumerate(zip(segments, masks)):
+            rows = np.flatnonzero(mask)
+            contiguous = len(rows) == len(segment)
+            for start in range(0, len(rows), _BLOCK_ROWS):
+                if contiguous:
+                    block_rows = np.arange(start, min(start + _BLOCK_ROWS, len(rows)))
+                    block = segment.vectors[start : start + _BLOCK_ROWS]
+                else:
+                    block_rows = rows[start : start + _BLOCK_ROWS]
+                    block = segment.vectors[block_rows]
+                scores = queries @ block.astype(np.float32, copy=False).T
+                kk = min(k, scores.shape[1])
+                top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+                best = np.concatenate([best, np.take_along_axis(scores, top, 1)], 1)
+                best_seg = np.concatenate([best_seg, np.full(top.shape, s)], 1)
+                best_row = np.concatenate([best_row, block_rows[top]], 1)
+                if best.shape[1] > k:
+                    keep = np.argpartition(-best, k - 1, axis=1)[:, :k]
+                    best = np.take_along_axis(best, keep, 1)
+                    best_seg = np.take_along_axis(best_seg, keep, 1)
+                    best_row = np.take_along_axis(best_row, keep, 1)
+        order = np.argsort(-best, axis=1, kind="stable")
+        results = []
+        for q in range(m):
+            hits = []
+            for j in order[q]:
+                segment = segments[best_seg[q, j]]
+                row = best_row[q, j]
+                hits.append(
+                    (
+                        float(best[q, j]),
+                        segment.ids[row],
+                        segment.documents[row],
+                        segment.metadatas[row],
+                        segment.vectors[row],
+                    )
+                )
+            results.append(hits)
+        return results
+
+    def query(
+        self,
+        query_embeddings: list[list[float]],
+        n_results: int = 10,
+        include: list[str] | tuple = ("documents", "metadatas", "distances"),
+        where: dict | None = None,
+    ) -> dict:
+        """Busca com a mesma resposta de ``Collection.query`` do Chroma.
+
+        ``distances`` é a distância cosseno (``1 - similaridade``).
+        """
+        results = self.search(query_embeddings, n_results, where)
+        response: dict[str, Any] = {"ids": [[h[1] for h in hits] for hits in results]}
+        if "documents" in include:
+            response["documents"] = [[h[2] for h in hits] for hits in results]
+        if "metadatas" in include:
+            response["metadatas"] = [[dict(h[3]) for h in hits] for hits in results]
+        if "embeddings" in include:
+            response["embeddings"] = [
+                [np.asarray(h[4], dtype=np.float32) for h in hits] for hits in results
+            ]
+        if "distances" in include:
+            response["distances"] = [[1.0 - h[0] for h in hits] for hits in results]
+        return response
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def stats(self) -> dict:
+        """Retorna tamanho, segmentos e linhas pendentes do índice."""
+        with self._lock:
+            return {
+                "rows": len(self._locations),
+                "segments": len(self._segments),
+                "stored_rows": sum(len(s) for s in self._segments),
+                "pending_rows": int(self._pending.alive.sum()) if self._pending else 0,
+                "dim": self.dim,
+                "dtype": self.dtype.name,
+            }
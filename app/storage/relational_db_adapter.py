@@ -1,6 +1,14 @@
-from datetime import datetime
+from datetime import date, datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+from typing import Iterable, Iterator, Sequence
+
 from sqlalchemy import (
     create_engine,
+    Boolean,
     Column,
     Integer,
     String,
@@ -9,15 +17,130 @@ from sqlalchemy import (
     Float,
     Numeric,
     ForeignKey,
+    func,
+    Index,
+    LargeBinary,
+    insert,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy import event
+from sqlalchemy.orm import declarative_base, load_only, relationship, sessionmaker
+import numpy as np
+
+from .column_types import (
+    CompressedText,
+    EmbeddingVector,
+    TextDictionaries,
+    decompress_text,
+    zstandard,
 )
-from sqlalchemy.orm import declarative_base, sessionmaker
+from .contract_cache import ContractCache
 
 Base = declarative_base()
 
+# Versão do esquema gravada em ``PRAGMA user_version``. As migrações de
+# ``RelationalDBAdapter`` só rodam quando o banco está em versão anterior;
+# incremente ao adicionar ou alterar uma migração.
+SCHEMA_VERSION = 5
+
+# Colunas de ``contracts`` indexadas na tabela de busca textual FTS5
+FULLTEXT_FIELDS = (
+    "texto_completo",
+    "objetoContrato",
+    "nomeFornecedor",
+    "linhasServico",
+    "contrato",
+    "fornecedor",
+)
+
+# Palavras sem valor de busca, descartadas das perguntas em linguagem natural
+FULLTEXT_STOPWORDS = frozenset(
+    """
+    a o as os um uma uns umas de do da dos das no na nos nas em ao aos à às
+    e ou que qual quais quando quanto quantos onde como quem por para pelo
+    pela pelos pelas com sem se é são foi ser está estão tem têm há sobre
+    meu minha seu sua seus suas esse essa este esta isso isto me mais
+    contrato contratos
+    """.split()
+)
+
+# Dimensões agregadas em ``contract_stats`` e a expressão SQL da chave de
+# cada uma; ``{row}`` é substituído por ``new``/``old`` nos gatilhos
+STATS_DIMENSIONS = {
+    "moeda": "{row}.moeda",
+    "empresa": "{row}.empresa",
+    "lotacaoGerenteContrato": "{row}.lotacaoGerenteContrato",
+    "fornecedor": "{row}.fornecedor",
+    "vencimento": "strftime('%Y-%m', {row}.fimPrazo)",
+}
+
+
+# Correspondência entre as chaves do JSON ``linhasServico`` e as colunas da
+# tabela normalizada ``contract_service_lines``
+SERVICE_LINE_KEYS = {
+    "ItemPedido": "itemPedido",
+    "DescricaoItem": "descricaoItem",
+    "NumeroExterno": "numeroExterno",
+    "DescriçãoItem": "descricaoDetalhada",
+}
+
+
+# Funções SQL registradas em cada conexão SQLite de um adaptador
+def _sqlite_functions(dictionaries: TextDictionaries):
+    """Cria o ouvinte de conexão que registra as funções do banco."""
+
+    def register(dbapi_connection, connection_record) -> None:
+        """Disponibiliza ``vcc_texto`` (descompressão) para gatilhos e visões."""
+        dbapi_connection.create_function(
+            "vcc_texto",
+            1,
+            lambda value: decompress_text(value, dictionaries),
+            deterministic=True,
+        )
+
+    return register
+
+
+# Expressão SQL do valor em reais de uma linha de ``contracts``
+def valor_brl_sql(row: str) -> str:
+    """Converte ``valorContratoOriginal`` para BRL com ``exchange_rates``.
+
+    A ``taxaCambio`` do CSV converte a moeda do contrato para USD (BRL e USD
+    valem 1.0), então o valor em reais usa a cotação BRL cadastrada para a
+    moeda ou, na falta dela, ``taxaCambio`` vezes a cotação do dólar. Sem
+    cotação o resultado é ``NULL``. ``row`` é ``new``, ``old`` ou o nome da
+    tabela.
+    """
+    return (
+        f"CASE WHEN {row}.moeda = 'BRL' THEN {row}.valorContratoOriginal "
+        f"ELSE {row}.valorContratoOriginal * coalesce("
+        f"(SELECT taxaBRL FROM exchange_rates WHERE moeda = {row}.moeda), "
+        f"{row}.taxaCambio * "
+        "(SELECT taxaBRL FROM exchange_rates WHERE moeda = 'USD')) END"
+    )
+
 
 # Modelo ORM representando os contratos armazenados
 class Contract(Base):
     __tablename__ = "contracts"
+    # Índices compostos para as combinações de filtro mais comuns da rota
+    # ``/contracts/query``; ``fimPrazo`` fica por último para servir de
+    # intervalo e de ordenação depois das igualdades
+    __table_args__ = (
+        Index("ix_contracts_contrato", "contrato"),
+        Index("ix_contracts_fimPrazo", "fimPrazo"),
+        Index("ix_contracts_inicioPrazo", "inicioPrazo"),
+        Index("ix_contracts_moeda_fimPrazo", "moeda", "fimPrazo"),
+        Index("ix_contracts_moeda_valor", "moeda", "valorContratoOriginal"),
+        Index("ix_contracts_empresa_moeda_fimPrazo", "empresa", "moeda", "fimPrazo"),
+        Index("ix_contracts_fornecedor_fimPrazo", "fornecedor", "fimPrazo"),
+        Index("ix_contracts_gerente_fimPrazo", "gerenteContrato", "fimPrazo"),
+        Index(
+            "ix_contracts_lotacao_fimPrazo", "lotacaoGerenteContrato", "fimPrazo"
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
@@ -34,6 +157,8 @@ class Contract(Base):
     valorContratoOriginal = Column(Numeric, nullable=True)
     moeda = Column(String, nullable=True)
     taxaCambio = Column(Float, nullable=True)
+    # Valor original convertido para reais, calculado na gravação
+    valorBRL = Column(Float, nullable=True)
     gerenteContrato = Column(String, nullable=True)
     nomeGerenteContrato = Column(String, nullable=True)
     lotacaoGerenteContrato = Column(String, nullable=True)
@@ -46,8 +171,82 @@ class Contract(Base):
     tipoContrato = Column(String, nullable=True)
     objetoContrato = Column(String, nullable=True)
     linhasServico = Column(String, nullable=True)
-    vetor_embedding = Column(String, nullable=True)
-    texto_completo = Column(String, nullable=True)
+    # Embedding gravado como BLOB float32 e lido como ``np.ndarray``
+    vetor_embedding = Column(EmbeddingVector(), nullable=True)
+    # Texto integral comprimido (zstd com dicionário treinado ou zlib)
+    texto_completo = Column(CompressedText(), nullable=True)
+
+
+# Linha de serviço de um contrato, normalizada a partir de ``linhasServico``
+class ContractServiceLine(Base):
+    __tablename__ = "contract_service_lines"
+    __table_args__ = (
+        Index("ix_service_lines_itemPedido", "itemPedido"),
+        Index("ix_service_lines_descricaoItem", "descricaoItem"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    contract_id = Column(
+        Integer, ForeignKey("contracts.id"), nullable=False, index=True
+    )
+    itemPedido = Column(String, nullable=True)
+    # NOCASE permite que buscas por prefixo com LIKE usem o índice
+    descricaoItem = Column(String(collation="NOCASE"), nullable=True)
+    numeroExterno = Column(String, nullable=True)
+    descricaoDetalhada = Column(String, nullable=True)
+
+
+# Dicionários zstd treinados sobre o corpus de textos dos contratos
+class TextDictionary(Base):
+    __tablename__ = "text_dictionaries"
+
+    dict_id = Column(Integer, primary_key=True, autoincrement=False)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Totais pré-agregados da carteira, mantidos por gatilhos em ``contracts``
+class ContractStat(Base):
+    __tablename__ = "contract_stats"
+
+    dimensao = Column(String, primary_key=True)
+    chave = Column(String, primary_key=True)
+    quantidade = Column(Integer, nullable=False, default=0)
+    valorOriginal = Column(Float, nullable=False, default=0.0)
+    valorBRL = Column(Float, nullable=False, default=0.0)
+
+
+# Cotações em reais usadas no cálculo de ``contracts.valorBRL``
+class ExchangeRate(Base):
+    __tablename__ = "exchange_rates"
+
+    moeda = Column(String, primary_key=True)
+    taxaBRL = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Registro sequencial das alterações em ``contracts``, gravado por gatilhos
+class ContractChange(Base):
+    __tablename__ = "contract_changes"
+    # AUTOINCREMENT impede a reutilização de ``seq`` mesmo após exclusões
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True)
+    contract_id = Column(Integer, nullable=False)
+    contrato = Column(String, nullable=True)
+    # Arquivo de origem, que identifica os documentos do contrato no vetor
+    path = Column(String, nullable=True)
+    operacao = Column(String, nullable=False)
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Última sequência de ``contract_changes`` processada por cada consumidor
+class ChangeConsumerOffset(Base):
+    __tablename__ = "change_consumer_offsets"
+
+    consumer = Column(String, primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
 
 # Tabela que armazena prompts reutilizáveis para execução de análises
@@ -76,18 +275,45 @@ class Execution(Base):
     status = Column(String, default="running")
     progress = Column(Float, default=0.0)
     message = Column(String, nullable=True)
+    # Arquivo compactado com os resultados quando a execução foi arquivada
+    archive_path = Column(String, nullable=True)
+
+
+# Texto de resposta do modelo armazenado uma única vez, endereçado pelo hash
+class Answer(Base):
+    __tablename__ = "answers"
+
+    hash = Column(String(64), primary_key=True)
+    texto = Column(CompressedText(), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 # Resultado gerado após uma execução em um contrato específico
 class ExecutionResult(Base):
     __tablename__ = "execution_results"
+    __table_args__ = (
+        # Busca da resposta anterior do mesmo contrato ao gravar um resultado
+        Index("ix_execution_results_contract_execution", "contract_id", "execution_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     execution_id = Column(Integer, ForeignKey("executions.id"), nullable=False)
     contract_id = Column(Integer, ForeignKey("contracts.id"), nullable=True)
-    resposta_completa = Column(String, nullable=True)
+    # Texto gravado diretamente na linha, antes da tabela ``answers``
+    resposta_legada = Column("resposta_completa", String, nullable=True)
+    answer_hash = Column(String(64), ForeignKey("answers.hash"), nullable=True)
+    # Indica se a resposta difere da execução anterior do mesmo prompt
+    changed = Column(Boolean, nullable=True)
     resposta_simples = Column(String, nullable=True)
     confianca = Column(Float, nullable=True)
+    answer = relationship(Answer, lazy="joined")
+
+    @property
+    def resposta_completa(self) -> str | None:
+        """Texto completo da resposta, lido de ``answers`` quando possível."""
+        if self.answer is not None:
+            return self.answer.texto
+        return self.resposta_legada
 
 
 # Adaptador simples para persistência usando SQLite
@@ -95,11 +321,559 @@ class RelationalDBAdapter:
     """Simple SQLite wrapper for storing contract metadata."""
 
     # Inicializa conexões e cria tabelas no banco SQLite
-    def __init__(self, db_url: str = "sqlite:///data/contracts.db") -> None:
-        """Cria engine e classe de sessão."""
+    def __init__(
+        self,
+        db_url: str = "sqlite:///data/contracts.db",
+        *,
+        cache_size: int = 1024,
+        cache_ttl: float | None = 300.0,
+        cache_check_interval: float = 1.0,
+    ) -> None:
+        """Cria engine e classe de sessão.
+
+        ``cache_size`` e ``cache_ttl`` configuram :attr:`contract_cache`, o
+        cache de leitura de contratos invalidado a cada escrita em
+        ``contracts`` feita por este adaptador. Escritas de outros adaptadores
+        ou processos são detectadas pelo log de alterações, consultado no
+        máximo a cada ``cache_check_interval`` segundos.
+        """
+        self.contract_cache = ContractCache(
+            max_size=cache_size,
+            ttl=cache_ttl,
+            validator=self._cache_token,
+            check_interval=cache_check_interval,
+        )
         self._engine = create_engine(db_url, connect_args={"check_same_thread": False})
-        Base.metadata.create_all(self._engine)
+        # Dicionários zstd deste banco; ``CompressedText`` os lê pelo dialeto
+        self._text_dictionaries = TextDictionaries()
+        self._engine.dialect.vcc_text_dictionaries = self._text_dictionaries
+        if self._engine.dialect.name == "sqlite":
+            event.listen(
+                self._engine, "connect", _sqlite_functions(self._text_dictionaries)
+            )
         self._Session = sessionmaker(bind=self._engine)
+        if self._schema_version() < SCHEMA_VERSION:
+            self._migrate()
+        self._load_text_dictionaries()
+
+    # Marca do estado dos contratos usada para validar o cache
+    def _cache_token(self) -> tuple:
+        """Última sequência do log de alterações e última mudança de cotação."""
+        with self._engine.connect() as conn:
+            return tuple(
+                conn.execute(
+                    text(
+                        "SELECT (SELECT max(seq) FROM contract_changes), "
+                        "(SELECT max(updated_at) FROM exchange_rates)"
+                    )
+                ).one()
+            )
+
+    # Versão do esquema gravada no banco
+    def _schema_version(self) -> int:
+        """Lê ``PRAGMA user_version`` (0 em bancos novos ou fora do SQLite)."""
+        if self._engine.dialect.name != "sqlite":
+            return 0
+        with self._engine.connect() as conn:
+            return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+    # Cria tabelas e aplica as migrações pendentes do esquema
+    def _migrate(self) -> None:
+        """Leva o banco à versão :data:`SCHEMA_VERSION`.
+
+        Todas as etapas são idempotentes; a versão só é gravada ao final, de
+        modo que uma inicialização interrompida repete a migração inteira.
+        """
+        existing_tables = set(inspect(self._engine).get_table_names())
+        sqlite = self._engine.dialect.name == "sqlite"
+        with self._engine.begin() as conn:
+            if sqlite and not existing_tables:
+                # Bancos novos liberam páginas sob demanda em ``compact``
+                conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            Base.metadata.create_all(conn)
+        self._ensure_columns()
+        self._ensure_indexes()
+        if "contract_service_lines" not in existing_tables:
+            self._backfill_service_lines()
+        self._migrate_legacy_answers()
+        if sqlite:
+            self._migrate_json_embeddings()
+            self.compress_texts()
+            self._setup_fulltext()
+            self._setup_valor_brl()
+            self._setup_stats()
+            self._setup_change_log()
+            with self._engine.begin() as conn:
+                conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    # Adiciona colunas declaradas nos modelos que ainda não existam no banco
+    def _ensure_columns(self) -> None:
+        """Executa ``ALTER TABLE ADD COLUMN`` para colunas novas."""
+        inspector = inspect(self._engine)
+        with self._engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                existing = {c["name"] for c in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    col_type = column.type.compile(dialect=self._engine.dialect)
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {table.name} "
+                            f'ADD COLUMN "{column.name}" {col_type}'
+                        )
+                    )
+
+    # Popula a tabela de linhas de serviço a partir do JSON já gravado
+    def _backfill_service_lines(self, batch_size: int = 500) -> None:
+        """Normaliza ``linhasServico`` de contratos anteriores à tabela filha."""
+        session = self._Session()
+        query = (
+            session.query(Contract.id, Contract.linhasServico)
+            .filter(Contract.linhasServico.isnot(None))
+            .order_by(Contract.id)
+        )
+        batch: list[dict] = []
+        for contract_id, linhas in query.yield_per(batch_size):
+            batch.extend(self._service_line_rows(contract_id, json.loads(linhas)))
+            if len(batch) >= batch_size:
+                session.execute(insert(ContractServiceLine), batch)
+                batch = []
+        if batch:
+            session.execute(insert(ContractServiceLine), batch)
+        session.commit()
+        session.close()
+
+    # Converte as linhas de serviço de um contrato em registros da tabela filha
+    @staticmethod
+    def _service_line_rows(contract_id: int, linhas: list[dict] | None) -> list[dict]:
+        """Mapeia cada item do JSON para as colunas de ``contract_service_lines``."""
+        return [
+            {
+                "contract_id": contract_id,
+                **{col: item.get(key) for key, col in SERVICE_LINE_KEYS.items()},
+            }
+            for item in linhas or []
+        ]
+
+    # Registra os dicionários de compressão gravados neste banco
+    def _load_text_dictionaries(self) -> None:
+        """Carrega os dicionários zstd; o mais recente passa a ser o ativo."""
+        session = self._Session()
+        rows = session.query(TextDictionary).order_by(TextDictionary.created_at).all()
+        session.close()
+        for row in rows:
+            self._text_dictionaries.register(row.dict_id, row.data)
+
+    # Treina um dicionário zstd com amostras do texto dos contratos
+    def train_text_dictionary(
+        self, *, samples: int = 2000, dict_size: int = 110 * 1024
+    ) -> int | None:
+        """Treina e grava um dicionário compartilhado para ``texto_completo``.
+
+        Retorna o ``dict_id`` do novo dicionário, já ativo para as próximas
+        gravações, ou ``None`` quando o zstd não está disponível ou o corpus é
+        pequeno demais para o treinamento. Use :meth:`compress_texts` com
+        ``recompress=True`` para aplicar o dicionário às linhas existentes.
+        """
+        if zstandard is None:
+            return None
+        session = self._Session()
+        rows = (
+            session.query(Contract.texto_completo)
+            .filter(Contract.texto_completo.isnot(None))
+            .order_by(Contract.id.desc())
+            .limit(samples)
+            .all()
+        )
+        corpus = [r.texto_completo.encode("utf-8") for r in rows if r.texto_completo]
+        try:
+            trained = zstandard.train_dictionary(dict_size, corpus)
+        except zstandard.ZstdError:
+            session.close()
+            return None
+        dict_id = trained.dict_id()
+        session.merge(TextDictionary(dict_id=dict_id, data=trained.as_bytes()))
+        session.commit()
+        session.close()
+        self._text_dictionaries.register(dict_id, trained.as_bytes())
+        return dict_id
+
+    # Comprime textos gravados em formato puro (ou recomprime todos)
+    def compress_texts(self, *, recompress: bool = False, batch_size: int = 200) -> int:
+        """Regrava ``texto_completo`` no formato comprimido.
+
+        Sem ``recompress`` apenas linhas ainda em texto puro são convertidas
+        (migração). Com ``recompress`` todas são regravadas com o codec e o
+        dicionário ativos. Retorna a quantidade de linhas regravadas.
+        """
+        text_type = Contract.__table__.c.texto_completo.type
+        condition = "texto_completo IS NOT NULL"
+        if not recompress:
+            condition += " AND typeof(texto_completo) = 'text'"
+        select_sql = text(
+            f"SELECT id, texto_completo FROM contracts WHERE {condition} "
+            "AND id > :last ORDER BY id LIMIT :n"
+        )
+        update_sql = text("UPDATE contracts SET texto_completo = :t WHERE id = :id")
+        converted = 0
+        last = 0
+        with self._engine.begin() as conn:
+            while True:
+                rows = conn.execute(select_sql, {"last": last, "n": batch_size}).fetchall()
+                if not rows:
+                    break
+                params = [
+                    {
+                        "id": r.id,
+                        "t": text_type.process_bind_param(
+                            decompress_text(r.texto_completo, self._text_dictionaries),
+                            self._engine.dialect,
+                        ),
+                    }
+                    for r in rows
+                ]
+                conn.execute(update_sql, params)
+                converted += len(rows)
+                last = rows[-1].id
+        return converted
+
+    # Cria os gatilhos que mantêm ``valorBRL`` coerente com valor e moeda
+    def _setup_valor_brl(self) -> None:
+        """Recalcula ``valorBRL`` a cada inserção ou mudança de valor/moeda.
+
+        A coluna é derivada: o valor informado na gravação é sobrescrito pelo
+        gatilho. As linhas existentes são recalculadas na migração.
+        """
+        update = (
+            f"UPDATE contracts SET valorBRL = {valor_brl_sql('new')} "
+            "WHERE id = new.id;"
+        )
+        with self._engine.begin() as conn:
+            conn.execute(
+                text(
+                    "CREATE TRIGGER IF NOT EXISTS contracts_valor_brl_ai AFTER INSERT "
+                    f"ON contracts BEGIN {update} END"
+                )
+            )
+            conn.execute(
+                text(
+                    "CREATE TRIGGER IF NOT EXISTS contracts_valor_brl_au AFTER UPDATE OF "
+                    "valorContratoOriginal, moeda, taxaCambio ON contracts "
+                    f"BEGIN {update} END"
+                )
+            )
+        self._recalculate_valor_brl()
+
+    # Recalcula ``valorBRL`` de todos os contratos
+    def _recalculate_valor_brl(self) -> None:
+        """Aplica as cotações atuais a toda a tabela de contratos."""
+        with self._engine.begin() as conn:
+            conn.execute(
+                text(f"UPDATE contracts SET valorBRL = {valor_brl_sql('contracts')}")
+            )
+
+    # Cadastra ou atualiza cotações em reais
+    def set_exchange_rates(self, rates: dict[str, float]) -> int:
+        """Grava ``rates`` (moeda -> BRL por unidade) e recalcula os valores.
+
+        Só as cotações que mudaram são regravadas; havendo alguma,
+        ``valorBRL`` e ``contract_stats`` são recalculados. Retorna a
+        quantidade de cotações alteradas.
+        """
+        session = self._Session()
+        changed = 0
+        for moeda, taxa in rates.items():
+            if taxa is None or taxa <= 0:
+                session.close()
+                raise ValueError(f"Cotação inválida para {moeda}: {taxa}")
+            row = session.get(ExchangeRate, moeda)
+            if row is None:
+                session.add(ExchangeRate(moeda=moeda, taxaBRL=float(taxa)))
+            elif row.taxaBRL != float(taxa):
+                row.taxaBRL = float(taxa)
+                row.updated_at = datetime.utcnow()
+            else:
+                continue
+            changed += 1
+        session.commit()
+        session.close()
+        if changed:
+            self._recalculate_valor_brl()
+            self.refresh_contract_stats()
+            self.contract_cache.bump()
+        return changed
+
+    # Cotações em reais cadastradas
+    def get_exchange_rates(self) -> dict[str, float]:
+        """Retorna as cotações usadas no cálculo de ``valorBRL``."""
+        session = self._Session()
+        rows = session.query(ExchangeRate).order_by(ExchangeRate.moeda).all()
+        session.close()
+        return {r.moeda: r.taxaBRL for r in rows}
+
+    # Cria os gatilhos que mantêm ``contract_stats`` atualizada
+    def _setup_stats(self) -> None:
+        """Mantém os agregados incrementalmente a cada escrita em ``contracts``.
+
+        Inserções somam a linha em cada dimensão, exclusões subtraem e
+        atualizações fazem as duas coisas. O valor em reais é calculado pela
+        mesma expressão de ``valorBRL``, sem depender da ordem em que os
+        gatilhos rodam. Na migração os agregados são recalculados a partir da
+        tabela de contratos.
+        """
+
+        def upsert(row: str, sign: str) -> str:
+            statements = []
+            for dimension, key in STATS_DIMENSIONS.items():
+                key_sql = key.format(row=row)
+                statements.append(
+                    "INSERT INTO contract_stats "
+                    "(dimensao, chave, quantidade, valorOriginal, valorBRL) "
+                    f"VALUES ('{dimension}', coalesce({key_sql}, ''), {sign}1, "
+                    f"{sign}coalesce({row}.valorContratoOriginal, 0), "
+                    f"{sign}coalesce({valor_brl_sql(row)}, 0)) "
+                    "ON CONFLICT(dimensao, chave) DO UPDATE SET "
+                    "quantidade = quantidade + excluded.quantidade, "
+                    "valorOriginal = valorOriginal + excluded.valorOriginal, "
+                    "valorBRL = valorBRL + excluded.valorBRL;"
+                )
+            return " ".join(statements)
+
+        cleanup = "DELETE FROM contract_stats WHERE quantidade <= 0;"
+        watched = (
+            "moeda, empresa, lotacaoGerenteContrato, fornecedor, fimPrazo, "
+            "valorContratoOriginal, taxaCambio"
+        )
+        with self._engine.begin() as conn:
+            # Gatilhos de versões anteriores somavam a coluna ``valorBRL``
+            for suffix in ("ai", "ad", "au"):
+                conn.execute(text(f"DROP TRIGGER IF EXISTS contract_stats_{suffix}"))
+            conn.execute(
+                text(
+                    "CREATE TRIGGER IF NOT EXISTS contract_stats_ai AFTER INSERT "
+                    f"ON contracts BEGIN {upsert('new', '')} END"
+                )
+            )
+            conn.execute(
+                text(
+                    "CREATE TRIGGER IF NOT EXISTS contract_stats_ad AFTER DELETE "
+                    f"ON contracts BEGIN {upsert('old', '-')} {cleanup} END"
+                )
+            )
+            conn.execute(
+                text(
+                    f"CREATE TRIGGER IF NOT EXISTS contract_stats_au AFTER UPDATE OF "
+                    f"{watched} ON contracts BEGIN {upsert('old', '-')} "
+                    f"{upsert('new', '')} {cleanup} END"
+                )
+            )
+        self.refresh_contract_stats()
+
+    # Cria os gatilhos que registram alterações em ``contract_changes``
+    def _setup_change_log(self) -> None:
+        """Registra inserções, exclusões e atualizações de contratos.
+
+        Atualizações só geram registro quando algum valor muda de fato: o
+        embedding é ignorado e o texto completo é comparado já descomprimido,
+        de modo que migrações de formato não aparecem como alterações. Na
+        primeira instalação os contratos existentes são registrados como
+        inserções, permitindo que consumidores novos partam da sequência 0.
+        """
+
+        def log(row: str, operacao: str) -> str:
+            return (
+                "INSERT INTO contract_changes "
+                "(contract_id, contrato, path, operacao, changed_at) "
+                f"VALUES ({row}.id, {row}.contrato, {row}.path, '{operacao}', "
+                "CURRENT_TIMESTAMP);"
+            )
+
+        # ``valorBRL`` é derivado e muda junto com as cotações; ficando fora
+        # da lista, o recálculo em massa nem dispara o gatilho
+        tracked = [
+            column.name
+            for column in Contract.__table__.columns
+            if column.name not in ("vetor_embedding", "valorBRL")
+        ]
+        differences = [
+            f'old."{name}" IS NOT new."{name}"'
+            for name in tracked
+            if name != "texto_completo"
+        ]
+        # Comparação mais cara por último: só descomprime se nada mais mudou
+        differences.append(
+            "vcc_texto(old.texto_completo) IS NOT vcc_texto(new.texto_completo)"
+        )
+        watched = ", ".join(f'"{name}"' for name in tracked)
+        with self._engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'contract_changes_ai'")
+            ).first()
+            # Versões anteriores não registravam ``path`` e disparavam com
+            # qualquer atualização, inclusive de ``valorBRL``
+            for suffix in ("ai", "ad", "au"):
+                conn.execute(text(f"DROP TRIGGER IF EXISTS contract_changes_{suffix}"))
+            conn.execute(
+                text(
+                    "CREATE TRIGGER IF NOT EXISTS contract_changes_ai AFTER INSERT "
+                    f"ON contracts BEGIN {log('new', 'insert')} END"
+                )
+            )
+            conn.execute(
+                text(
+                    "CREATE TRIGGER IF NOT EXISTS contract_changes_ad AFTER DELETE "
+                    f"ON contracts BEGIN {log('old', 'delete')} END"
+                )
+            )
+            conn.execute(
+                text(
+                    "CREATE TRIGGER IF NOT EXISTS contract_changes_au AFTER UPDATE "
+                    f"OF {watched} ON contracts WHEN {' OR '.join(differences)} "
+                    f"BEGIN {log('new', 'update')} END"
+                )
+            )
+            if not exists:
+                conn.execute(
+                    text(
+                        "INSERT INTO contract_changes "
+                        "(contract_id, contrato, path, operacao, changed_at) "
+                        "SELECT id, contrato, path, 'insert', CURRENT_TIMESTAMP "
+                        "FROM contracts ORDER BY id"
+                    )
+                )
+
+    # Recalcula todos os agregados a partir da tabela de contratos
+    def refresh_contract_stats(self) -> None:
+        """Reconstrói ``contract_stats`` do zero (uso em manutenção)."""
+        with self._engine.begin() as conn:
+            conn.execute(text("DELETE FROM contract_stats"))
+            for dimension, key in STATS_DIMENSIONS.items():
+                key_sql = f"coalesce({key.format(row='contracts')}, '')"
+                conn.execute(
+                    text(
+                        "INSERT INTO contract_stats "
+                        "(dimensao, chave, quantidade, valorOriginal, valorBRL) "
+                        f"SELECT '{dimension}', {key_sql}, count(*), "
+                        "coalesce(sum(valorContratoOriginal), 0), "
+                        "coalesce(sum(valorBRL), 0) "
+                        f"FROM contracts GROUP BY {key_sql}"
+                    )
+                )
+
+    # Cria o índice FTS5 e os gatilhos que o mantêm sincronizado
+    def _setup_fulltext(self) -> None:
+        """Cria ``contracts_fts`` (conteúdo externo) e seus gatilhos.
+
+        O conteúdo indexado vem da visão ``contracts_fts_source``, que
+        descomprime ``texto_completo`` com a função ``vcc_texto``. O índice é
+        reconstruído quando a tabela virtual é criada ou recriada.
+        """
+        cols = ", ".join(FULLTEXT_FIELDS)
+
+        def values(row: str) -> str:
+            return ", ".join(
+                f"vcc_texto({row}.{c})" if c == "texto_completo" else f"{row}.{c}"
+                for c in FULLTEXT_FIELDS
+            )
+
+        source_cols = ", ".join(
+            "vcc_texto(texto_completo) AS texto_completo" if c == "texto_completo" else c
+            for c in FULLTEXT_FIELDS
+        )
+        insert_new = (
+            f"INSERT INTO contracts_fts(rowid, {cols}) VALUES (new.id, {values('new')});"
+        )
+        delete_old = (
+            f"INSERT INTO contracts_fts(contracts_fts, rowid, {cols}) "
+            f"VALUES ('delete', old.id, {values('old')});"
+        )
+        with self._engine.begin() as conn:
+            current = conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE name = 'contracts_fts'")
+            ).scalar()
+            # Índices criados antes da compressão apontavam direto para a tabela,
+            # e os mais antigos não tinham todas as colunas atuais
+            if current is not None and (
+                "contracts_fts_source" not in current
+                or f"fts5({cols}," not in current
+            ):
+                conn.execute(text("DROP TABLE contracts_fts"))
+                conn.execute(text("DROP VIEW IF EXISTS contracts_fts_source"))
+                for suffix in ("ai", "ad", "au"):
+                    conn.execute(text(f"DROP TRIGGER IF EXISTS contracts_fts_{suffix}"))
+                current = None
+            conn.execute(
+                text(
+                    "CREATE VIEW IF NOT EXISTS contracts_fts_source AS "
+                    f"SELECT id, {source_cols} FROM contracts"
+                )
+            )
+            conn.execute(
+                text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS contracts_fts USING fts5("
+                    f"{cols}, content='contracts_fts_source', content_rowid='id', "
+                    f"tokenize='unicode61 remove_diacritics 2')"
+                )
+            )
+            conn.execute(
+                text(
+                    "CREATE TRIGGER IF NOT EXISTS contracts_fts_ai AFTER INSERT "
+                    f"ON contracts BEGIN {insert_new} END"
+                )
+            )
+            conn.execute(
+                text(
+                    "CREATE TRIGGER IF NOT EXISTS contracts_fts_ad AFTER DELETE "
+                    f"ON contracts BEGIN {delete_old} END"
+                )
+            )
+            conn.execute(
+                text(
+                    f"CREATE TRIGGER IF NOT EXISTS contracts_fts_au AFTER UPDATE OF "
+                    f"{cols} ON contracts BEGIN {delete_old} {insert_new} END"
+                )
+            )
+            if current is None:
+                conn.execute(
+                    text("INSERT INTO contracts_fts(contracts_fts) VALUES ('rebuild')")
+                )
+
+    # Cria índices declarados nos modelos que ainda não existam no banco
+    def _ensure_indexes(self) -> None:
+        """Garante os índices em bancos criados antes de sua declaração."""
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self._engine, checkfirst=True)
+
+    # Converte embeddings antigos, gravados como JSON, para o formato binário
+    def _migrate_json_embeddings(self, batch_size: int = 500) -> int:
+        """Regrava em float32 os vetores ainda armazenados como texto JSON.
+
+        Retorna a quantidade de linhas convertidas.
+        """
+        vector_type = Contract.__table__.c.vetor_embedding.type
+        select_sql = text(
+            "SELECT id, vetor_embedding FROM contracts "
+            "WHERE typeof(vetor_embedding) = 'text' LIMIT :n"
+        )
+        update_sql = text("UPDATE contracts SET vetor_embedding = :v WHERE id = :id")
+        converted = 0
+        with self._engine.begin() as conn:
+            while True:
+                rows = conn.execute(select_sql, {"n": batch_size}).fetchall()
+                if not rows:
+                    break
+                params = [
+                    {
+                        "id": r.id,
+                        "v": vector_type.process_bind_param(r.vetor_embedding, None),
+                    }
+                    for r in rows
+                ]
+                conn.execute(update_sql, params)
+                converted += len(rows)
+        return converted
 
     # Insere um contrato simples na tabela
     def add_contract(
@@ -120,6 +894,7 @@ class RelationalDBAdapter:
         session.add(contract)
         session.commit()
         session.close()
+        self.contract_cache.bump()
 
     # Retorna contrato a partir do caminho do arquivo
     def get_contract_by_path(self, path: str) -> Contract | None:
@@ -139,37 +914,428 @@ class RelationalDBAdapter:
         if contract:
             contract.last_processed = processing_date or datetime.utcnow()
             session.commit()
+            self.contract_cache.bump()
         session.close()
 
     # Insere contrato com metadados mais completos
     def add_contract_structured(self, **fields) -> None:
         """Insere contrato com metadados estruturados."""
+        self.add_contracts_structured([fields])
+
+    # Insere vários contratos estruturados em uma única transação
+    def add_contracts_structured(self, rows: Iterable[dict]) -> int:
+        """Insere contratos e suas linhas de serviço em lote.
+
+        ``linhasServico`` pode ser informado como lista de dicionários ou como
+        JSON; a coluna guarda o JSON e cada item também é gravado em
+        ``contract_service_lines``. Retorna a quantidade de contratos inseridos.
+        """
         session = self._Session()
-        fields.setdefault("name", fields.get("contrato"))
-        fields.setdefault("path", fields.get("contrato"))
-        fields.setdefault("ingestion_date", datetime.utcnow())
-        fields.setdefault("last_processed", datetime.utcnow())
-        contract = Contract(**fields)
-        session.add(contract)
+        now = datetime.utcnow()
+        pending: list[tuple[Contract, list | None]] = []
+        for fields in rows:
+            fields = dict(fields)
+            fields.setdefault("name", fields.get("contrato"))
+            fields.setdefault("path", fields.get("contrato"))
+            fields.setdefault("ingestion_date", now)
+            fields.setdefault("last_processed", now)
+            linhas = fields.get("linhasServico")
+            if isinstance(linhas, str):
+                linhas = json.loads(linhas)
+            elif linhas is not None:
+                fields["linhasServico"] = json.dumps(linhas, ensure_ascii=False)
+            pending.append((Contract(**fields), linhas))
+
+        session.add_all(contract for contract, _ in pending)
+        # O flush atribui os ids usados como chave estrangeira das linhas
+        session.flush()
+        line_rows = [
+            row
+            for contract, linhas in pending
+            for row in self._service_line_rows(contract.id, linhas)
+        ]
+        if line_rows:
+            session.execute(insert(ContractServiceLine), line_rows)
         session.commit()
         session.close()
+        self.contract_cache.bump()
+        return len(pending)
+
+    # Verifica quais números de contrato já estão cadastrados
+    def existing_contratos(self, contratos: Iterable[str], chunk: int = 500) -> set[str]:
+        """Retorna o subconjunto de ``contratos`` presente no banco."""
+        contratos = list(contratos)
+        found: set[str] = set()
+        session = self._Session()
+        for start in range(0, len(contratos), chunk):
+            part = contratos[start : start + chunk]
+            found.update(
+                c for (c,) in session.query(Contract.contrato).filter(
+                    Contract.contrato.in_(part)
+                )
+            )
+        session.close()
+        return found
+
+    # Monta as opções de carregamento para uma projeção de colunas
+    def _contract_load_options(self, fields: Sequence[str] | None) -> list:
+        """Traduz nomes de campos em opções ``load_only``.
+
+        Quando ``fields`` é ``None`` todas as colunas, inclusive as volumosas
+        (texto completo, embedding e linhas de serviço), são carregadas. Caso
+        contrário apenas as colunas indicadas (e a chave primária) são lidas;
+        as demais ficam adiadas e não são materializadas.
+        """
+        if fields is None:
+            return []
+        columns = []
+        for name in fields:
+            column = Contract.__table__.columns.get(name)
+            if column is None:
+                raise ValueError(f"Campo de contrato desconhecido: {name}")
+            columns.append(getattr(Contract, name))
+        return [load_only(*columns)] if columns else []
 
     # Obtém contrato pelo identificador "contrato"
-    def get_contract_by_contrato(self, contrato: str) -> Contract | None:
-        """Busca contrato pelo identificador do campo contrato."""
+    def get_contract_by_contrato(
+        self, contrato: str, fields: Sequence[str] | None = None
+    ) -> Contract | None:
+        """Busca contrato pelo identificador do campo contrato.
+
+        ``fields`` limita as colunas lidas do banco; por padrão o registro é
+        carregado por completo.
+        """
         session = self._Session()
-        contract = session.query(Contract).filter_by(contrato=contrato).first()
+        contract = (
+            session.query(Contract)
+            .options(*self._contract_load_options(fields))
+            .filter_by(contrato=contrato)
+            .first()
+        )
         session.close()
         return contract
 
+    # Obtém contrato pela chave primária
+    def get_contract(
+        self, contract_id: int, fields: Sequence[str] | None = None
+    ) -> Contract | None:
+        """Busca contrato pelo id, carregando apenas ``fields`` se informado."""
+        session = self._Session()
+        contract = (
+            session.query(Contract)
+            .options(*self._contract_load_options(fields))
+            .filter_by(id=contract_id)
+            .first()
+        )
+        session.close()
+        return contract
+
+    # Lista contratos com projeção de colunas e paginação opcional
+    def list_contracts(
+        self,
+        *,
+        fields: Sequence[str] | None = None,
+        offset: int = 0,
+        limit: int | None = None,
+        order_by: str = "id",
+    ) -> list[Contract]:
+        """Retorna contratos ordenados lendo apenas as colunas pedidas.
+
+        ``order_by`` aceita o nome de uma coluna, com prefixo ``-`` para ordem
+        decrescente; nomes desconhecidos geram ``ValueError``.
+        """
+        order = self._order_columns([order_by])
+        session = self._Session()
+        query = (
+            session.query(Contract)
+            .options(*self._contract_load_options(fields))
+            .order_by(*order, Contract.id)
+        )
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        rows = query.all()
+        session.close()
+        return rows
+
+    # Consulta estruturada sobre os metadados dos contratos
+    def query_contracts(
+        self,
+        *,
+        moeda: str | None = None,
+        empresa: str | None = None,
+        fornecedor: str | None = None,
+        gerenteContrato: str | None = None,
+        lotacaoGerenteContrato: str | None = None,
+        fimPrazoDe: date | None = None,
+        fimPrazoAte: date | None = None,
+        inicioPrazoDe: date | None = None,
+        inicioPrazoAte: date | None = None,
+        valorMin: float | None = None,
+        valorMax: float | None = None,
+        itemPedido: str | None = None,
+        descricaoItem: str | None = None,
+        sort: Sequence[str] = ("fimPrazo",),
+        fields: Sequence[str] | None = None,
+        limit: int | None = None,
+        batch_size: int = 500,
+    ) -> Iterator[Contract]:
+        """Filtra contratos em SQL e devolve um iterador em lotes.
+
+        Igualdades e intervalos são combinados com AND. ``sort`` recebe nomes
+        de colunas, com prefixo ``-`` para ordem decrescente. Campos ou chaves
+        de ordenação inválidos geram ``ValueError`` antes de qualquer leitura.
+        ``itemPedido`` (igualdade) e ``descricaoItem`` (prefixo, sem diferenciar
+        maiúsculas) filtram pelas linhas de serviço via índice da tabela filha.
+        """
+        stmt = select(Contract).options(*self._contract_load_options(fields))
+        equals = {
+            "moeda": moeda,
+            "empresa": empresa,
+            "fornecedor": fornecedor,
+            "gerenteContrato": gerenteContrato,
+            "lotacaoGerenteContrato": lotacaoGerenteContrato,
+        }
+        for name, value in equals.items():
+            if value is not None:
+                stmt = stmt.where(getattr(Contract, name) == value)
+        ranges = (
+            (Contract.fimPrazo, fimPrazoDe, fimPrazoAte),
+            (Contract.inicioPrazo, inicioPrazoDe, inicioPrazoAte),
+            (Contract.valorContratoOriginal, valorMin, valorMax),
+        )
+        for column, low, high in ranges:
+            if low is not None:
+                stmt = stmt.where(column >= low)
+            if high is not None:
+                stmt = stmt.where(column <= high)
+        if itemPedido is not None or descricaoItem is not None:
+            lines = select(ContractServiceLine.contract_id)
+            if itemPedido is not None:
+                lines = lines.where(ContractServiceLine.itemPedido == itemPedido)
+            if descricaoItem is not None:
+                # Curingas digitados pelo usuário valem como texto literal
+                prefix = (
+                    descricaoItem.replace("\\", "\\\\")
+                    .replace("%", "\\%")
+                    .replace("_", "\\_")
+                )
+                lines = lines.where(
+                    ContractServiceLine.descricaoItem.like(f"{prefix}%", escape="\\")
+                )
+            stmt = stmt.where(Contract.id.in_(lines))
+
+        stmt = stmt.order_by(*self._order_columns(sort), Contract.id)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return self._stream(stmt, batch_size)
+
+    # Valida chaves de ordenação contra as colunas de ``contracts``
+    @staticmethod
+    def _order_columns(sort: Sequence[str]) -> list:
+        """Traduz ``["fimPrazo", "-valorContratoOriginal"]`` em expressões.
+
+        Apenas colunas da tabela são aceitas; as demais geram ``ValueError``.
+        """
+        order = []
+        for key in sort:
+            name = key.lstrip("-")
+            if name not in Contract.__table__.columns:
+                raise ValueError(f"Chave de ordenação desconhecida: {key}")
+            column = getattr(Contract, name)
+            order.append(column.desc() if key.startswith("-") else column.asc())
+        return order
+
+    # Percorre o resultado de uma consulta em lotes de ``batch_size`` linhas
+    def _stream(self, stmt, batch_size: int) -> Iterator:
+        """Gera os registros mantendo a sessão aberta apenas durante a leitura."""
+        session = self._Session()
+        try:
+            yield from session.scalars(
+                stmt.execution_options(yield_per=batch_size)
+            )
+        finally:
+            session.close()
+
+    # Lê os agregados pré-calculados da carteira
+    def get_contract_stats(self) -> dict[str, list[dict]]:
+        """Retorna os totais por dimensão, do maior para o menor valor em BRL."""
+        session = self._Session()
+        rows = (
+            session.query(ContractStat)
+            .order_by(ContractStat.dimensao, ContractStat.valorBRL.desc())
+            .all()
+        )
+        session.close()
+        stats: dict[str, list[dict]] = {name: [] for name in STATS_DIMENSIONS}
+        for r in rows:
+            stats.setdefault(r.dimensao, []).append(
+                {
+                    "chave": r.chave or None,
+                    "quantidade": r.quantidade,
+                    "valorOriginal": r.valorOriginal,
+                    "valorBRL": r.valorBRL,
+                }
+            )
+        return stats
+
+    # Reúne os embeddings dos contratos em uma única matriz
+    def get_embedding_matrix(self) -> tuple[list[int], np.ndarray]:
+        """Retorna ids e matriz ``(n, dim)`` com os embeddings cadastrados.
+
+        Útil para cálculos de similaridade em lote diretamente com NumPy.
+        """
+        session = self._Session()
+        rows = (
+            session.query(Contract.id, Contract.vetor_embedding)
+            .filter(Contract.vetor_embedding.isnot(None))
+            .order_by(Contract.id)
+            .all()
+        )
+        session.close()
+        if not rows:
+            return [], np.empty((0, 0), dtype=np.float32)
+        return [r.id for r in rows], np.vstack([r.vetor_embedding for r in rows])
+
+    # Conta os contratos cadastrados
+    def count_contracts(self) -> int:
+        """Retorna o total de contratos na tabela."""
+        session = self._Session()
+        total = session.query(Contract).count()
+        session.close()
+        return total
+
+
+    # Converte texto livre em expressão MATCH segura para o FTS5
+    @staticmethod
+    def _fulltext_query(query: str, *, any_term: bool = False) -> str:
+        """Transforma cada termo em frase entre aspas.
+
+        Por padrão as frases são combinadas com AND (todas devem ocorrer).
+        Com ``any_term`` a combinação é OR e as palavras de
+        :data:`FULLTEXT_STOPWORDS` são descartadas, o que serve a perguntas
+        em linguagem natural: o BM25 ordena pelos termos que casaram.
+        Pontuação dentro de um termo (CNPJ, número de cláusula) é tratada
+        como separador, da mesma forma que o tokenizador do índice.
+        """
+        phrases = []
+        for term in query.split():
+            parts = re.findall(r"\w+", term)
+            if any_term:
+                parts = [p for p in parts if p.lower() not in FULLTEXT_STOPWORDS]
+            if parts:
+                phrase = '"' + " ".join(parts) + '"'
+                if phrase not in phrases:
+                    phrases.append(phrase)
+        return (" OR " if any_term else " ").join(phrases)
+
+    # Busca textual ranqueada por BM25
+    def search_contracts(
+        self,
+        query: str,
+        *,
+        limit: int = 20,
+        offset: int = 0,
+        any_term: bool = False,
+    ) -> tuple[list[dict], int]:
+        """Busca contratos pelo índice FTS5.
+
+        Retorna a página de resultados, ordenada por relevância BM25 e com um
+        trecho destacado, e o total de contratos encontrados. ``any_term``
+        aceita contratos com qualquer um dos termos (ver
+        :meth:`_fulltext_query`).
+        """
+        match = self._fulltext_query(query, any_term=any_term)
+        if not match:
+            return [], 0
+        with self._engine.connect() as conn:
+            total = conn.execute(
+                text("SELECT count(*) FROM contracts_fts WHERE contracts_fts MATCH :q"),
+                {"q": match},
+            ).scalar()
+            rows = conn.execute(
+                text(
+                    "SELECT c.id, c.contrato, c.name, c.path, "
+                    "bm25(contracts_fts) AS rank, "
+                    "snippet(contracts_fts, -1, '[', ']', '…', 12) AS trecho "
+                    "FROM contracts_fts JOIN contracts c ON c.id = contracts_fts.rowid "
+                    "WHERE contracts_fts MATCH :q "
+                    "ORDER BY rank LIMIT :limit OFFSET :offset"
+                ),
+                {"q": match, "limit": limit, "offset": offset},
+            ).fetchall()
+        results = [
+            {
+                "id": r.id,
+                "contrato": r.contrato,
+                "name": r.name,
+                "path": r.path,
+                # BM25 do SQLite é negativo; invertemos para "maior é melhor"
+                "score": -r.rank,
+                "snippet": r.trecho,
+            }
+            for r in rows
+        ]
+        return results, total
+
+    # Alterações de contratos posteriores a uma sequência
+    def changes_since(
+        self, seq: int = 0, *, limit: int | None = None
+    ) -> list[ContractChange]:
+        """Retorna os registros de ``contract_changes`` com ``seq`` maior.
+
+        A lista vem em ordem crescente de sequência; o consumidor deve
+        guardar o ``seq`` do último item processado (ver
+        :meth:`set_consumer_offset`) e usá-lo na próxima chamada.
+        """
+        session = self._Session()
+        query = (
+            session.query(ContractChange)
+            .filter(ContractChange.seq > seq)
+            .order_by(ContractChange.seq)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        rows = query.all()
+        session.close()
+        return rows
+
+    # Última sequência registrada no log de alterações
+    def last_change_seq(self) -> int:
+        """Retorna a maior sequência de ``contract_changes`` (0 se vazio)."""
+        session = self._Session()
+        seq = session.query(func.max(ContractChange.seq)).scalar()
+        session.close()
+        return seq or 0
+
+    # Sequência já processada por um consumidor do log de alterações
+    def get_consumer_offset(self, consumer: str) -> int:
+        """Retorna a última sequência confirmada por ``consumer``."""
+        session = self._Session()
+        row = session.get(ChangeConsumerOffset, consumer)
+        session.close()
+        return row.seq if row else 0
+
+    # Confirma o processamento das alterações até ``seq``
+    def set_consumer_offset(self, consumer: str, seq: int) -> None:
+        """Grava a posição de ``consumer`` no log de alterações."""
+        session = self._Session()
+        session.merge(
+            ChangeConsumerOffset(consumer=consumer, seq=seq, updated_at=datetime.utcnow())
+        )
+        session.commit()
+        session.close()
 
     # Remove todos os contratos cadastrados
     def clear_contracts(self) -> None:
         """Remove todos os registros da tabela."""
         session = self._Session()
+        session.query(ContractServiceLine).delete()
         session.query(Contract).delete()
         session.commit()
         session.close()
+        self.contract_cache.bump()
 
     # ------------------------------------------------------------------
     # Operações para tabela de prompts
@@ -233,12 +1399,21 @@ class RelationalDBAdapter:
         resposta_simples: str | None,
         confianca: float | None = None,
     ) -> int:
-        """Registra resultado produzido por uma execução."""
+        """Registra resultado produzido por uma execução.
+
+        O texto completo é gravado em ``answers`` apenas se ainda não existir
+        uma resposta idêntica. ``changed`` é calculado comparando o hash com o
+        da execução anterior do mesmo prompt para o mesmo contrato (resultados
+        sem anterior no banco contam como alterados).
+        """
         session = self._Session()
+        answer_hash = self._store_answer(session, resposta_completa)
+        previous = self._previous_answer(session, execution_id, contract_id)
         row = ExecutionResult(
             execution_id=execution_id,
             contract_id=contract_id,
-            resposta_completa=resposta_completa,
+            answer_hash=answer_hash,
+            changed=previous is None or previous[0] != answer_hash,
             resposta_simples=resposta_simples,
             confianca=confianca,
         )
@@ -248,6 +1423,102 @@ class RelationalDBAdapter:
         session.close()
         return rid
 
+    # Grava o texto em ``answers`` caso ainda não exista e devolve o hash
+    @staticmethod
+    def _store_answer(session, texto: str | None) -> str | None:
+        """Calcula o SHA-256 do texto e insere a resposta se for nova."""
+        if texto is None:
+            return None
+        digest = hashlib.sha256(texto.encode("utf-8")).hexdigest()
+        if session.get(Answer, digest) is None:
+            session.add(Answer(hash=digest, texto=texto))
+            session.flush()
+        return digest
+
+    # Localiza a resposta anterior do mesmo prompt para o contrato
+    @staticmethod
+    def _previous_answer(
+        session, execution_id: int, contract_id: int | None
+    ) -> tuple[str | None] | None:
+        """Retorna ``(answer_hash,)`` do último resultado anterior ou ``None``.
+
+        Execuções de prompts cadastrados são comparadas pelo ``prompt_id``; as
+        ad-hoc, pelo texto do prompt.
+        """
+        execution = session.get(Execution, execution_id)
+        if execution is None:
+            return None
+        query = (
+            session.query(ExecutionResult.answer_hash)
+            .join(Execution, Execution.id == ExecutionResult.execution_id)
+            .filter(
+                ExecutionResult.contract_id == contract_id,
+                ExecutionResult.execution_id < execution_id,
+            )
+        )
+        if execution.prompt_id is not None:
+            query = query.filter(Execution.prompt_id == execution.prompt_id)
+        else:
+            query = query.filter(
+                Execution.prompt_id.is_(None),
+                Execution.prompt_text == execution.prompt_text,
+            )
+        return query.order_by(ExecutionResult.execution_id.desc()).first()
+
+    # Resultados cuja resposta mudou em relação à execução anterior
+    def get_execution_changes(self, exec_id: int) -> list[ExecutionResult]:
+        """Lista os resultados de ``exec_id`` marcados como alterados."""
+        session = self._Session()
+        rows = (
+            session.query(ExecutionResult)
+            .filter_by(execution_id=exec_id, changed=True)
+            .order_by(ExecutionResult.contract_id)
+            .all()
+        )
+        session.close()
+        return rows
+
+    # Move respostas gravadas na própria linha para a tabela ``answers``
+    def _migrate_legacy_answers(self, batch_size: int = 500) -> int:
+        """Converte ``resposta_completa`` antigo em referências por hash."""
+        converted = 0
+        session = self._Session()
+        while True:
+            rows = (
+                session.query(ExecutionResult)
+                .filter(
+                    ExecutionResult.resposta_legada.isnot(None),
+                    ExecutionResult.answer_hash.is_(None),
+                )
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            for row in rows:
+                row.answer_hash = self._store_answer(session, row.resposta_legada)
+                row.resposta_legada = None
+            session.commit()
+            converted += len(rows)
+        session.close()
+        return converted
+
+    # Remove respostas que não são mais referenciadas por nenhum resultado
+    def prune_answers(self) -> int:
+        """Apaga de ``answers`` os textos órfãos e retorna a quantidade."""
+        session = self._Session()
+        referenced = select(ExecutionResult.answer_hash).where(
+            ExecutionResult.answer_hash.isnot(None)
+        )
+        removed = (
+            session.query(Answer)
+            .filter(Answer.hash.not_in(referenced))
+            .delete(synchronize_session=False)
+        )
+        session.commit()
+        session.close()
+        return removed
+
     # ------------------------------------------------------------------
     # Operações relacionadas à tabela de execuções de tarefas
 
@@ -337,3 +1608,139 @@ class RelationalDBAdapter:
         rows = query.order_by(Execution.start_time).all()
         session.close()
         return rows
+
+    # ------------------------------------------------------------------
+    # Retenção, arquivamento e compactação dos resultados de execução
+
+    # Seleciona execuções de prompts que excedem a retenção configurada
+    def executions_beyond_retention(self, keep_last: int) -> list[int]:
+        """Retorna ids das execuções de prompt além das ``keep_last`` mais novas.
+
+        As execuções são agrupadas pelo prompt cadastrado (ou pelo texto, no
+        caso de prompts ad-hoc). Execuções em andamento e já arquivadas são
+        ignoradas.
+        """
+        session = self._Session()
+        rows = (
+            session.query(Execution.id, Execution.prompt_id, Execution.prompt_text)
+            .filter(
+                Execution.task_name == "prompt_execution",
+                Execution.status != "running",
+                Execution.archive_path.is_(None),
+            )
+            .order_by(Execution.start_time.desc(), Execution.id.desc())
+            .all()
+        )
+        session.close()
+        seen: dict[tuple, int] = {}
+        old: list[int] = []
+        for exec_id, prompt_id, prompt_text in rows:
+            key = (prompt_id, None if prompt_id is not None else prompt_text)
+            seen[key] = seen.get(key, 0) + 1
+            if seen[key] > keep_last:
+                old.append(exec_id)
+        return sorted(old)
+
+    # Move os resultados de uma execução para um arquivo gzip
+    def archive_execution(self, exec_id: int, archive_dir: str) -> str | None:
+        """Grava os resultados em ``archive_dir`` e os remove do banco.
+
+        O arquivo é um JSON comprimido com gzip contendo os campos de cada
+        resultado. Retorna o caminho gerado ou ``None`` se a execução não
+        existir ou já estiver arquivada.
+        """
+        session = self._Session()
+        row = session.query(Execution).filter_by(id=exec_id).first()
+        if row is None or row.archive_path:
+            session.close()
+            return None
+        results = (
+            session.query(ExecutionResult)
+            .filter_by(execution_id=exec_id)
+            .order_by(ExecutionResult.id)
+            .all()
+        )
+        payload = {
+            "execution_id": exec_id,
+            "results": [
+                {
+                    "contract_id": r.contract_id,
+                    "resposta_completa": r.resposta_completa,
+                    "resposta_simples": r.resposta_simples,
+                    "confianca": r.confianca,
+                    "changed": r.changed,
+                }
+                for r in results
+            ],
+        }
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"execution_{exec_id}.json.gz")
+        # O arquivo é escrito antes de apagar as linhas para não perder dados
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        session.query(ExecutionResult).filter_by(execution_id=exec_id).delete()
+        row.archive_path = path
+        session.commit()
+        session.close()
+        return path
+
+    # Recoloca no banco os resultados de uma execução arquivada
+    def restore_execution(self, exec_id: int) -> int:
+        """Lê o arquivo da execução, reinsere os resultados e o remove.
+
+        Retorna a quantidade de resultados restaurados. Lança ``LookupError``
+        se a execução não existir ou não estiver arquivada.
+        """
+        session = self._Session()
+        row = session.query(Execution).filter_by(id=exec_id).first()
+        if row is None or not row.archive_path:
+            session.close()
+            raise LookupError(f"Execução {exec_id} não está arquivada")
+        path = row.archive_path
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+        for result in payload["results"]:
+            session.add(
+                ExecutionResult(
+                    execution_id=exec_id,
+                    contract_id=result["contract_id"],
+                    answer_hash=self._store_answer(
+                        session, result["resposta_completa"]
+                    ),
+                    changed=result.get("changed"),
+                    resposta_simples=result["resposta_simples"],
+                    confianca=result["confianca"],
+                )
+            )
+        row.archive_path = None
+        session.commit()
+        session.close()
+        os.remove(path)
+        return len(payload["results"])
+
+    # Libera o espaço deixado por linhas removidas
+    def compact(self) -> int:
+        """Devolve páginas livres ao sistema de arquivos.
+
+        Em bancos com ``auto_vacuum = INCREMENTAL`` executa
+        ``PRAGMA incremental_vacuum``. Bancos antigos recebem um ``VACUUM``
+        completo, que também os converte para o modo incremental. Retorna a
+        quantidade de bytes liberados.
+        """
+        if self._engine.dialect.name != "sqlite":
+            return 0
+        with self._engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as conn:
+            page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+            before = conn.exec_driver_sql("PRAGMA page_count").scalar()
+            mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if mode == 2:
+                # ``execute`` do sqlite3 avança o pragma um único passo (uma
+                # página); ``executescript`` o executa até o fim
+                conn.connection.executescript("PRAGMA incremental_vacuum;")
+            else:
+                conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.exec_driver_sql("VACUUM")
+            after = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        return max(before - after, 0) * page_size
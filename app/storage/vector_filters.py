@@ -0,0 +1,88 @@
+"""Filtros por metadados de contrato aplicados à busca vetorial.
+
+Cada documento de contrato no Chroma carrega ``contrato``, ``moeda``,
+``fornecedor``, ``empresa`` e ``fimPrazo`` (inteiro ``AAAAMMDD``). Os filtros
+recebidos pela API são traduzidos para a cláusula ``where`` do Chroma, de
+modo que a busca aconteça apenas sobre o subconjunto relevante.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+
+
+# Campos de igualdade aceitos nos filtros da busca vetorial; o prazo final
+# é filtrado por intervalo com ``fimPrazoDe`` e ``fimPrazoAte``
+FILTER_FIELDS = ("contrato", "moeda", "fornecedor", "empresa")
+
+
+def date_key(value) -> int:
+    """Converte data (ou texto ISO) no inteiro ``AAAAMMDD`` gravado no vetor."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+# Traduz os filtros da aplicação para a cláusula ``where`` do Chroma
+def chroma_where(filters: dict | None) -> dict | None:
+    """Monta o ``where`` a partir de ``{"moeda": "USD", "fimPrazoDe": ...}``.
+
+    Valores em lista viram ``$in``. Campos desconhecidos levantam
+    ``ValueError``. Sem filtros devolve ``None``.
+    """
+    clauses = []
+    for name, value in (filters or {}).items():
+        if value is None or value == "" or value == []:
+            continue
+        if name in FILTER_FIELDS:
+            if isinstance(value, (list, tuple)):
+                clauses.append({name: {"$in": [str(v) for v in value]}})
+            else:
+                clauses.append({name: str(value)})
+        elif name == "fimPrazoDe":
+            clauses.append({"fimPrazo": {"$gte": date_key(value)}})
+        elif name == "fimPrazoAte":
+            clauses.append({"fimPrazo": {"$lte": date_key(value)}})
+        else:
+            raise ValueError(f"Filtro desconhecido: {name}")
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+# Decompõe uma cláusula ``where`` em condições simples
+def where_clauses(where: dict | None) -> list[tuple[str, str, object]]:
+    """Lista ``(campo, operador, valor)`` das condições de ``where``.
+
+    Aceita o formato produzido por :func:`chroma_where`: uma condição ou
+    ``{"$and": [...]}``; igualdade simples vira ``$eq``.
+    """
+    clauses = [] if not where else where.get("$and", [where])
+    result = []
+    for clause in clauses:
+        ((name, cond),) = clause.items()
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        ((op, expected),) = cond.items()
+        if op not in ("$eq", "$in", "$gte", "$lte"):
+            raise ValueError(f"Operador não suportado: {op}")
+        result.append((name, op, expected))
+    return result
+
+
+# Avalia os filtros sobre metadados já carregados (buscas fora do Chroma)
+def matches_filters(metadata: dict, filters: dict | None) -> bool:
+    """Indica se ``metadata`` satisfaz os mesmos filtros de :func:`chroma_where`."""
+    for name, op, expected in where_clauses(chroma_where(filters)):
+        value = metadata.get(name)
+        if value is None:
+            return False
+        if op == "$eq" and value != expected:
+            return False
+        if op == "$in" and value not in expected:
+            return False
+        if op == "$gte" and value < expected:
+            return False
+        if op == "$lte" and value > expected:
+            return False
+    return True
@@ -1,37 +1,246 @@
 # A classe Chroma mudou de local. Agora ela é fornecida
 # pelo pacote `langchain-chroma`.
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from app.config.settings import (
+    EMBEDDING_CACHE_SIZE,
+    VECTOR_BACKEND,
+    VECTOR_INDEX_DTYPE,
+)
+from app.integrations.embedding_cache import CachedEmbeddings
 from app.integrations.openai_provider import get_embeddings
+from app.storage.numpy_index import NumpyVectorIndex
 from pathlib import Path
+import asyncio
 import shutil
 
+import numpy as np
+
+# Diretório de persistência padrão de cada backend vetorial
+_DEFAULT_DIRECTORIES = {"chroma": "chroma_db", "numpy": "vector_index"}
+
+
+# Seleciona índices por Maximal Marginal Relevance
+def maximal_marginal_relevance(
+    scores: np.ndarray, matrix: np.ndarray, k: int, lambda_mult: float = 0.5
+) -> list[int]:
+    """Escolhe ``k`` linhas equilibrando relevância e diversidade.
+
+    ``scores`` é a similaridade de cada linha com a pergunta e ``matrix``
+    contém os vetores já normalizados. A cada passo é escolhida a linha que
+    maximiza ``lambda_mult * relevância - (1 - lambda_mult) * redundância``,
+    onde a redundância é a maior similaridade com as linhas já escolhidas.
+    """
+    if len(scores) == 0 or k <= 0:
+        return []
+    selected = [int(np.argmax(scores))]
+    redundancy = matrix @ matrix[selected[0]]
+    while len(selected) < min(k, len(scores)):
+        mmr = lambda_mult * scores - (1 - lambda_mult) * redundancy
+        mmr[selected] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, matrix @ matrix[best])
+    return selected
+
 
 # Envolve o Chroma para facilitar o uso pela aplicação
 # Classe adaptadora para interagir com o Chroma usando embeddings OpenAI
 class VectorStoreAdapter:
-    """Wrapper em Português para o vector store Chroma usando embeddings OpenAI."""
+    """Wrapper em Português para o vector store Chroma usando embeddings OpenAI.
+
+    ``generation`` é incrementado a cada escrita no vetor e permite que
+    caches derivados do conteúdo (como o de respostas do chatbot) detectem
+    que ficaram obsoletos.
+
+    ``backend`` (padrão ``VECTOR_BACKEND``) escolhe entre o Chroma e o
+    índice exato em NumPy (:class:`~app.storage.numpy_index.NumpyVectorIndex`),
+    que expõe as mesmas operações usadas aqui.
+    """
 
     # Cria o objeto definindo diretório de persistência
-    def __init__(self, persist_directory: str = "chroma_db") -> None:
+    def __init__(
+        self, persist_directory: str | None = None, backend: str | None = None
+    ) -> None:
         """Inicializa o adaptador com o caminho de persistência."""
-        # Diretório onde o Chroma irá manter seus arquivos
-        self._persist_directory = persist_directory
-        # Embeddings específicos de acordo com o modo de execução
-        self._embedding = get_embeddings()
+        self.backend = backend or VECTOR_BACKEND
+        if self.backend not in _DEFAULT_DIRECTORIES:
+            raise ValueError(f"Backend vetorial desconhecido: {self.backend}")
+        # Diretório onde o backend irá manter seus arquivos
+        self._persist_directory = (
+            persist_directory or _DEFAULT_DIRECTORIES[self.backend]
+        )
+        # Embeddings específicos de acordo com o modo de execução, com cache
+        # em memória para textos repetidos
+        self._embedding = CachedEmbeddings(
+            get_embeddings(), max_size=EMBEDDING_CACHE_SIZE
+        )
         # Cria ou carrega o banco vetorial
-        self._store = Chroma(
-            persist_directory=persist_directory,
+        self._store = self._open_store()
+        self.generation = 0
+
+    # Abre o armazenamento do backend escolhido
+    def _open_store(self):
+        """Cria ou carrega o Chroma ou o índice NumPy no diretório configurado."""
+        if self.backend == "numpy":
+            return NumpyVectorIndex(
+                self._persist_directory, self._embedding, dtype=VECTOR_INDEX_DTYPE
+            )
+        return Chroma(
+            persist_directory=self._persist_directory,
             embedding_function=self._embedding,
         )
 
+    # Converte a pergunta em embedding reaproveitando consultas recentes
+    def embed_query(self, query: str) -> list[float]:
+        """Retorna o embedding de ``query``, chamando o provedor só uma vez.
+
+        O mesmo texto consultado em sequência (por exemplo, pelo cache de
+        respostas e depois pela busca) não gera uma segunda chamada; ver
+        :class:`CachedEmbeddings`.
+        """
+        return self._embedding.embed_query(query)
+
+    # Versão assíncrona de ``embed_query``
+    async def aembed_query(self, query: str) -> list[float]:
+        """Igual a :meth:`embed_query`, usando a chamada assíncrona."""
+        return await self._embedding.aembed_query(query)
+
     # Insere um documento de texto no vetor
     def add_document(self, text: str, metadata: dict | None = None) -> None:
         """Adiciona um texto ao vetor, registrando metadados opcionais."""
         self._store.add_texts([text], metadatas=[metadata or {}])
+        self.generation += 1
+
+    # Insere ou substitui documentos identificados por ``ids``
+    def upsert_documents(
+        self, ids: list[str], texts: list[str], metadatas: list[dict] | None = None
+    ) -> None:
+        """Grava os textos sob os ids informados, substituindo versões antigas."""
+        if ids:
+            self._store.add_texts(texts, metadatas=metadatas, ids=ids)
+            self.generation += 1
+
+    # Remove documentos pelos ids
+    def delete_documents(self, ids: list[str]) -> None:
+        """Exclui do vetor os documentos com os ids informados."""
+        if ids:
+            self._store.delete(ids=ids)
+            self.generation += 1
+
+    # Coleção de baixo nível com ``get``, ``update``, ``delete`` e ``query``
+    def _collection(self):
+        """Devolve a coleção do Chroma ou o próprio índice NumPy."""
+        return self._store if self.backend == "numpy" else self._store._collection
+
+    # Atualiza metadados sem recalcular embeddings
+    def update_metadata(self, where: dict, metadata: dict) -> int:
+        """Grava ``metadata`` nos documentos que satisfazem ``where``.
+
+        As chaves informadas substituem as existentes e as demais são
+        mantidas; texto e embedding não são alterados. Retorna a quantidade
+        de documentos atualizados.
+        """
+        collection = self._collection()
+        found = collection.get(where=where, include=["metadatas"])
+        if not found["ids"]:
+            return 0
+        collection.update(
+            ids=found["ids"],
+            metadatas=[{**(m or {}), **metadata} for m in found["metadatas"]],
+        )
+        self.generation += 1
+        return len(found["ids"])
+
+    # Remove os documentos cujos metadados satisfazem ``where``
+    def delete_where(self, where: dict) -> int:
+        """Exclui os documentos encontrados e retorna a quantidade removida."""
+        collection = self._collection()
+        ids = collection.get(where=where, include=["metadatas"])["ids"]
+        if ids:
+            collection.delete(ids=ids)
+            self.generation += 1
+        return len(ids)
+
+    # Busca vetorial única que devolve documentos e similaridades
+    def similarity_search(
+        self,
+        query: str,
+        *,
+        k: int = 4,
+        score_threshold: float | None = None,
+        mmr: bool = False,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        embedding: list[float] | None = None,
+        where: dict | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Retorna até ``k`` pares ``(documento, similaridade cosseno)``.
+
+        A pergunta é convertida em embedding uma única vez (ou ``embedding``
+        é usado diretamente) e o backend é consultado uma única vez, já
+        devolvendo os vetores dos candidatos. Candidatos abaixo de
+        ``score_threshold`` são descartados; com ``mmr`` os ``fetch_k``
+        melhores são reordenados por diversidade antes do corte em ``k``.
+        ``where`` (ver :func:`app.storage.vector_filters.chroma_where`)
+        restringe a busca, dentro do próprio backend, aos documentos cujos
+        metadados o satisfazem.
+        """
+        if embedding is None:
+            embedding = self.embed_query(query)
+        params = {}
+        if where:
+            params["where"] = where
+        result = self._collection().query(
+            query_embeddings=[embedding],
+            n_results=max(fetch_k, k) if mmr else k,
+            include=["documents", "metadatas", "embeddings"],
+            **params,
+        )
+        texts = result["documents"][0] if result["documents"] else []
+        if not texts:
+            return []
+        metadatas = result["metadatas"][0]
+        matrix = np.asarray(result["embeddings"][0], dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) + 1e-12
+        scores = matrix @ vector
+
+        candidates = np.arange(len(texts))
+        if score_threshold is not None:
+            candidates = candidates[scores >= score_threshold]
+        if mmr:
+            chosen = maximal_marginal_relevance(
+                scores[candidates], matrix[candidates], k, lambda_mult
+            )
+            order = candidates[chosen]
+        else:
+            order = candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+        return [
+            (
+                Document(page_content=texts[i], metadata=dict(metadatas[i] or {})),
+                float(scores[i]),
+            )
+            for i in order
+        ]
+
+    # Versão assíncrona da busca vetorial
+    async def asimilarity_search(
+        self, query: str, **kwargs
+    ) -> list[tuple[Document, float]]:
+        """Igual a :meth:`similarity_search`, sem bloquear o event loop.
+
+        O embedding da pergunta usa a chamada assíncrona do provedor; a
+        consulta ao backend vetorial, local e bloqueante, roda em uma thread.
+        """
+        if kwargs.get("embedding") is None:
+            kwargs["embedding"] = await self.aembed_query(query)
+        return await asyncio.to_thread(self.similarity_search, query, **kwargs)
 
     # Persiste as alterações realizadas
     def persist(self) -> None:
-        """Grava em disco o estado atual do Chroma."""
+        """Grava em disco o estado atual do backend vetorial."""
         self._store.persist()
 
     # Remove todos os dados e recria o armazenamento
@@ -39,7 +248,5 @@ class VectorStoreAdapter:
         """Remove todos os documentos e recria o armazenamento."""
         if Path(self._persist_directory).exists():
             shutil.rmtree(self._persist_directory)
-        self._store = Chroma(
-            persist_directory=self._persist_directory,
-            embedding_function=self._embedding,
-        )
+        self._store = self._open_store()
+        self.generation += 1
@@ -1,4 +1,6 @@
 # Interface de usuário baseada em Streamlit
+import json
+
 import streamlit as st
 import httpx
 
@@ -9,8 +11,80 @@ from .executions import render as render_executions_tab
 # Nova aba para listar contratos
 from .contracts import render as render_contracts_tab
 
-# Endpoint da API de chat
-_CHAT_ENDPOINT = f"{API_BASE_URL.rstrip('/')}/chat"
+# Endpoint da API de chat (resposta transmitida por Server-Sent Events)
+_CHAT_ENDPOINT = f"{API_BASE_URL.rstrip('/')}/chat/stream"
+# Endpoint que abre conversas com histórico mantido no servidor
+_SESSIONS_ENDPOINT = f"{API_BASE_URL.rstrip('/')}/chat/sessions"
+# Conexão com limite curto, mas leitura sem limite enquanto houver tokens
+_STREAM_TIMEOUT = httpx.Timeout(30.0, read=None)
+
+
+def _sse_events(lines):
+    """Converte linhas de um stream SSE em pares ``(evento, dados)``."""
+    event, data = "message", []
+    for line in lines:
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+        elif not line and data:
+            yield event, json.loads("\n".join(data))
+            event, data = "message", []
+
+
+# Sessão recusada pelo servidor (expirada ou desconhecida)
+class _SessaoExpirada(Exception):
+    """Indica que a API respondeu 404 para o ``session_id`` enviado."""
+
+
+# Abre uma conversa nova na API
+def _abrir_sessao() -> str:
+    """Retorna o ``session_id`` emitido por ``POST /chat/sessions``."""
+    resp = httpx.post(_SESSIONS_ENDPOINT, timeout=10.0)
+    resp.raise_for_status()
+    return resp.json()["session_id"]
+
+
+# Envia a pergunta e devolve os eventos SSE da resposta
+def _transmitir(pergunta: str, session_id: str):
+    """Gera pares ``(evento, dados)`` da resposta de ``/chat/stream``."""
+    with httpx.stream(
+        "POST",
+        _CHAT_ENDPOINT,
+        json={"question": pergunta, "session_id": session_id},
+        timeout=_STREAM_TIMEOUT,
+    ) as resp:
+        if resp.status_code == 404:
+            raise _SessaoExpirada(session_id)
+        resp.raise_for_status()
+        yield from _sse_events(resp.iter_lines())
+
+
+# Pergunta dentro da conversa guardada em ``estado``
+def _perguntar(pergunta: str, estado):
+    """Gera os eventos da resposta, abrindo a sessão quando necessário.
+
+    O id da conversa fica em ``estado["chat_session"]``. Se a API não
+    reconhecer mais a sessão (por exemplo, após expirar), uma nova é aberta
+    e a pergunta é reenviada uma única vez.
+    """
+    if not estado.get("chat_session"):
+        estado["chat_session"] = _abrir_sessao()
+    try:
+        yield from _transmitir(pergunta, estado["chat_session"])
+    except _SessaoExpirada:
+        estado["chat_session"] = _abrir_sessao()
+        yield from _transmitir(pergunta, estado["chat_session"])
+
+
+def _descrever_fonte(fonte: dict | str) -> str:
+    """Formata a origem do trecho e sua similaridade, quando informada."""
+    if isinstance(fonte, str):
+        return fonte
+    texto = fonte.get("source", "")
+    if fonte.get("score") is not None:
+        texto += f" (pontuação {fonte['score']:.2f})"
+    return texto
 
 
 def _chat_tab() -> None:
@@ -18,25 +92,39 @@ def _chat_tab() -> None:
 
     st.markdown("## Chat sobre contratos")
 
-    pergunta = st.text_input("Faça sua pergunta sobre os contratos:")
-    if pergunta:
+    # A conversa é mantida no servidor; o navegador guarda apenas o id
+    if st.button("Nova conversa"):
         try:
-            resp = httpx.post(_CHAT_ENDPOINT, json={"question": pergunta}, timeout=30.0)
-            resp.raise_for_status()
-            dados = resp.json()
-            resposta = dados.get("answer", "")
-            fontes = dados.get("sources", [])
+            st.session_state["chat_session"] = _abrir_sessao()
         except Exception as exc:  # Trata falhas ao chamar a API
             st.error(f"Erro ao consultar a API: {exc}")
             return
 
+    pergunta = st.text_input("Faça sua pergunta sobre os contratos:")
+    if pergunta:
         st.markdown("### Resposta")
-        st.write(resposta)
+        area_resposta = st.empty()
+        resposta = ""
+        fontes = []
+        try:
+            for evento, dados in _perguntar(pergunta, st.session_state):
+                if evento == "sources":
+                    fontes = dados
+                elif evento == "token":
+                    # Redesenha a resposta a cada fragmento recebido
+                    resposta += dados
+                    area_resposta.markdown(resposta + "▌")
+                elif evento == "error":
+                    raise RuntimeError(dados.get("detail", "erro desconhecido"))
+        except Exception as exc:  # Trata falhas ao chamar a API
+            st.error(f"Erro ao consultar a API: {exc}")
+            return
+        area_resposta.markdown(resposta)
 
         if fontes:
             st.markdown("### Contratos relevantes")
             for src in fontes:
-                st.write(src)
+                st.write(_descrever_fonte(src))
 
 
 def main() -> None:
@@ -0,0 +1,139 @@
+"""Teste de carga do endpoint de chat: caminho síncrono x assíncrono.
+
+Monta uma aplicação FastAPI com dois endpoints equivalentes sobre o mesmo
+``ContractChatbot``: ``/sync`` reproduz a rota antiga (``def`` executada no
+pool de threads com ``ask``) e ``/async`` a rota atual (``async def`` com
+``aask``). Modelo e embeddings são simulados com latência fixa, para medir
+apenas o efeito da concorrência.
+
+Uso::
+
+    python benchmarks/chat_load.py --requests 200 --latency 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+import types
+from pathlib import Path
+
+import httpx
+from fastapi import Body, FastAPI
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import app.chat.chatbot as chatbot_mod  # noqa: E402
+from app.chat.answer_cache import SemanticAnswerCache  # noqa: E402
+from app.integrations.embedding_cache import CachedEmbeddings  # noqa: E402
+from app.storage.vector_store_adapter import VectorStoreAdapter  # noqa: E402
+
+
+# Modelo de linguagem com latência fixa nas versões síncrona e assíncrona
+class FakeLLM:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+
+    def invoke(self, prompt: str):
+        time.sleep(self.latency)
+        return types.SimpleNamespace(content="ok")
+
+    async def ainvoke(self, prompt: str):
+        await asyncio.sleep(self.latency)
+        return types.SimpleNamespace(content="ok")
+
+
+# Embeddings com latência de rede simulada
+class FakeEmbeddings:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+
+    def embed_query(self, text: str) -> list[float]:
+        time.sleep(self.latency)
+        return [1.0, 0.0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        await asyncio.sleep(self.latency)
+        return [1.0, 0.0]
+
+
+# Coleção com um único documento, consultada como o Chroma
+class FakeCollection:
+    def query(self, query_embeddings, n_results, include):
+        return {
+            "documents": [["contrato de exemplo"]],
+            "metadatas": [[{"source": "exemplo.pdf"}]],
+            "embeddings": [[[1.0, 0.0]]],
+        }
+
+
+# Cria o chatbot real sobre as dependências simuladas
+def _chatbot(llm_latency: float, embed_latency: float) -> chatbot_mod.ContractChatbot:
+    """Instancia ``ContractChatbot`` sem acessar serviços externos."""
+    store = VectorStoreAdapter.__new__(VectorStoreAdapter)
+    store._embedding = CachedEmbeddings(FakeEmbeddings(embed_latency), model="fake")
+    store._store = types.SimpleNamespace(_collection=FakeCollection())
+    store.generation = 0
+    chatbot_mod.get_chat_model = lambda model="x": FakeLLM(llm_latency)
+    # Sem cache de respostas: cada requisição percorre o caminho completo
+    return chatbot_mod.ContractChatbot(
+        store, top_k=1, answer_cache=SemanticAnswerCache(max_size=0)
+    )
+
+
+# Aplicação com as duas variantes do endpoint
+def _app(bot: chatbot_mod.ContractChatbot) -> FastAPI:
+    api = FastAPI()
+
+    @api.post("/sync")
+    def chat_sync(question: str = Body(..., embed=True)) -> dict:
+        answer, sources = bot.ask(question)
+        return {"answer": answer, "sources": sources}
+
+    @api.post("/async")
+    async def chat_async(question: str = Body(..., embed=True)) -> dict:
+        answer, sources = await bot.aask(question)
+        return {"answer": answer, "sources": sources}
+
+    return api
+
+
+# Dispara ``total`` requisições simultâneas e mede o tempo total
+async def _carga(api: FastAPI, path: str, total: int) -> float:
+    transport = httpx.ASGITransport(app=api)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        started = time.perf_counter()
+        respostas = await asyncio.gather(
+            *(client.post(path, json={"question": f"p{i}"}) for i in range(total))
+        )
+        elapsed = time.perf_counter() - started
+    assert all(r.status_code == 200 for r in respostas)
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--latency", type=float, default=0.5, help="latência do LLM (s)"
+    )
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    api = _app(_chatbot(args.latency, args.embed_latency))
+    for path in ("/sync", "/async"):
+        elapsed = asyncio.run(_carga(api, path, args.requests))
+        print(
+            f"{path:7s} {args.requests} requisições em {elapsed:6.2f} s "
+            f"({args.requests / elapsed:7.1f} req/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
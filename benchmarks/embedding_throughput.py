@@ -0,0 +1,103 @@
+"""Mede ingestão e busca vetorial com embeddings locais, sem acesso à rede.
+
+Usa o backend ``hashing`` (ver ``app/integrations/local_embeddings.py``) para:
+
+* medir a vazão de ``embed_documents`` (textos por segundo);
+* indexar um corpus sintético no Chroma via ``VectorStoreAdapter``;
+* medir a latência das buscas por similaridade.
+
+Uso::
+
+    python benchmarks/embedding_throughput.py --docs 5000 --queries 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# O backend precisa estar definido antes de o adaptador criar os embeddings
+os.environ["EMBEDDING_BACKEND"] = "hashing"
+
+from app.integrations.local_embeddings import HashingEmbeddings  # noqa: E402
+
+# Vocabulário usado para compor os trechos sintéticos
+_TERMOS = (
+    "contrato reajuste IPCA vigência prazo multa fornecedor medição boletim "
+    "afretamento embarcação manutenção engenharia seguro garantia rescisão "
+    "pagamento fatura moeda câmbio dólar gerente fiscalização aditivo escopo "
+    "serviço equipamento plataforma sonda transporte logística penalidade"
+).split()
+
+
+# Gera um trecho com ``size`` palavras sorteadas do vocabulário
+def _trecho(rng: random.Random, size: int) -> str:
+    """Sorteia palavras formando um texto de tamanho aproximado."""
+    return " ".join(rng.choice(_TERMOS) for _ in range(size))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=200, help="palavras por trecho")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    os.environ["EMBEDDING_DIM"] = str(args.dim)
+
+    rng = random.Random(args.seed)
+    textos = [_trecho(rng, args.words) for _ in range(args.docs)]
+    perguntas = [_trecho(rng, 8) for _ in range(args.queries)]
+
+    emb = HashingEmbeddings(dim=args.dim)
+    started = time.perf_counter()
+    for i in range(0, len(textos), args.batch):
+        emb.embed_documents(textos[i : i + args.batch])
+    t_embed = time.perf_counter() - started
+    print(f"embeddings: {args.docs / t_embed:10.0f} textos/s (dim {args.dim})")
+
+    # Importado aqui: o adaptador depende do Chroma e do LangChain
+    from app.storage.vector_store_adapter import VectorStoreAdapter
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStoreAdapter(persist_directory=tmp)
+        ids = [f"doc:{i}" for i in range(len(textos))]
+        metadatas = [{"source": f"doc{i}.pdf"} for i in range(len(textos))]
+        started = time.perf_counter()
+        for i in range(0, len(textos), args.batch):
+            store.upsert_documents(
+                ids[i : i + args.batch],
+                textos[i : i + args.batch],
+                metadatas[i : i + args.batch],
+            )
+        t_ingest = time.perf_counter() - started
+
+        latencias = []
+        for pergunta in perguntas:
+            started = time.perf_counter()
+            store.similarity_search(pergunta, k=4)
+            latencias.append(time.perf_counter() - started)
+
+    latencias.sort()
+    p95 = latencias[int(len(latencias) * 0.95) - 1] if latencias else 0.0
+    print(f"ingestão:   {args.docs / t_ingest:10.0f} textos/s no Chroma")
+    print(
+        f"busca:      mediana {statistics.median(latencias) * 1000:6.2f} ms  "
+        f"p95 {p95 * 1000:6.2f} ms ({args.queries} perguntas)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Compara o armazenamento de ``texto_completo`` puro e comprimido.
+
+Gera um corpus sintético de contratos, grava-o em dois bancos SQLite (texto
+puro e comprimido com dicionário zstd) e mede:
+
+* tamanho do arquivo do banco;
+* tempo de uma varredura "fria" (nova conexão) que lê todos os textos;
+* custo de descompressão por texto.
+
+Uso::
+
+    python benchmarks/text_compression.py --contracts 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.storage.column_types import decompress_text  # noqa: E402
+from app.storage.relational_db_adapter import RelationalDBAdapter  # noqa: E402
+
+# Cláusulas típicas usadas para compor os textos sintéticos
+_CLAUSULAS = [
+    "O presente contrato tem por objeto a prestação de serviços de {s}.",
+    "O valor global estimado é de R$ {v},00, reajustado anualmente pelo IPCA.",
+    "A CONTRATADA deverá manter seguro de responsabilidade civil durante a vigência.",
+    "O prazo de vigência é de {m} meses contados da assinatura.",
+    "Fica eleito o foro da comarca do Rio de Janeiro para dirimir quaisquer dúvidas.",
+    "A fiscalização será exercida pelo gerente do contrato da unidade {u}.",
+    "As medições serão realizadas mensalmente conforme o boletim de medição.",
+    "Aplicam-se as penalidades previstas no regulamento de licitações e contratos.",
+]
+_SERVICOS = ["manutenção", "afretamento", "engenharia", "limpeza", "transporte"]
+
+
+# Monta um texto de contrato com tamanho aproximado de ``size`` caracteres
+def _texto(rng: random.Random, size: int) -> str:
+    """Sorteia cláusulas até atingir o tamanho desejado."""
+    partes = []
+    total = 0
+    while total < size:
+        clausula = rng.choice(_CLAUSULAS).format(
+            s=rng.choice(_SERVICOS),
+            v=rng.randint(10_000, 9_000_000),
+            m=rng.randint(6, 60),
+            u=rng.randint(1, 500),
+        )
+        partes.append(clausula)
+        total += len(clausula) + 1
+    return "\n".join(partes)
+
+
+# Grava o corpus em texto puro, como antes da compressão
+def _popular_puro(path: str, textos: list[str]) -> None:
+    """Usa uma tabela equivalente com ``texto_completo`` do tipo TEXT."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE contracts (id INTEGER PRIMARY KEY, contrato TEXT, "
+        "texto_completo TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO contracts (contrato, texto_completo) VALUES (?, ?)",
+        [(f"C{i}", t) for i, t in enumerate(textos)],
+    )
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+# Grava o corpus pelo adaptador, treinando o dicionário compartilhado
+def _popular_comprimido(path: str, textos: list[str]) -> None:
+    """Insere, treina o dicionário e recomprime todas as linhas."""
+    db = RelationalDBAdapter(db_url=f"sqlite:///{path}")
+    db.add_contracts_structured(
+        {"contrato": f"C{i}", "texto_completo": t} for i, t in enumerate(textos)
+    )
+    db.train_text_dictionary()
+    db.compress_texts(recompress=True)
+    db._engine.dispose()
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    conn.close()
+
+
+# Lê todos os textos numa conexão nova e devolve (segundos, valores)
+def _varredura(path: str) -> tuple[float, list]:
+    """Mede a leitura sequencial da coluna ``texto_completo``."""
+    started = time.perf_counter()
+    conn = sqlite3.connect(path)
+    valores = [r[0] for r in conn.execute("SELECT texto_completo FROM contracts")]
+    conn.close()
+    return time.perf_counter() - started, valores
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contracts", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=8000, help="caracteres por texto")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    textos = [_texto(rng, args.size) for _ in range(args.contracts)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        puro = os.path.join(tmp, "puro.db")
+        comprimido = os.path.join(tmp, "comprimido.db")
+        _popular_puro(puro, textos)
+        _popular_comprimido(comprimido, textos)
+
+        t_puro, _ = _varredura(puro)
+        t_comp, blobs = _varredura(comprimido)
+
+        started = time.perf_counter()
+        for blob in blobs:
+            decompress_text(blob)
+        t_desc = time.perf_counter() - started
+
+        tam_puro = os.path.getsize(puro)
+        tam_comp = os.path.getsize(comprimido)
+
+    print(f"contratos: {args.contracts}  tamanho médio: {args.size} caracteres")
+    print(f"tamanho do banco   puro: {tam_puro / 1e6:8.2f} MB")
+    print(
+        f"tamanho do banco   comp: {tam_comp / 1e6:8.2f} MB "
+        "(inclui índice FTS e demais tabelas)"
+    )
+    print(f"varredura fria     puro: {t_puro * 1000:8.1f} ms")
+    print(f"varredura fria     comp: {t_comp * 1000:8.1f} ms")
+    print(
+        f"descompressão          : {t_desc * 1000:8.1f} ms "
+        f"({t_desc / max(len(blobs), 1) * 1e6:.1f} µs por texto)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Compara o Chroma com o índice NumPy mapeado em memória.
+
+Os mesmos vetores (embeddings locais ``hashing``, sem acesso à rede) são
+gravados no Chroma e em ``NumpyVectorIndex`` (``float32`` e ``float16``).
+Para cada backend são medidos:
+
+* tempo de ingestão e de reabertura do índice persistido;
+* latência por pergunta (mediana e p95), com e sem filtro de metadados;
+* revocação dos ``k`` primeiros em relação à busca exata em ``float32``.
+
+Uso::
+
+    python benchmarks/vector_backends.py --docs 20000 --queries 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+from app.integrations.local_embeddings import HashingEmbeddings  # noqa: E402
+from app.storage.numpy_index import NumpyVectorIndex  # noqa: E402
+from app.storage.vector_filters import chroma_where  # noqa: E402
+
+# Vocabulário usado para compor os trechos sintéticos
+_TERMOS = (
+    "contrato reajuste IPCA vigência prazo multa fornecedor medição boletim "
+    "afretamento embarcação manutenção engenharia seguro garantia rescisão "
+    "pagamento fatura moeda câmbio dólar gerente fiscalização aditivo escopo "
+    "serviço equipamento plataforma sonda transporte logística penalidade"
+).split()
+_MOEDAS = ("BRL", "USD", "EUR")
+
+
+# Gera um trecho com ``size`` palavras sorteadas do vocabulário
+def _trecho(rng: random.Random, size: int) -> str:
+    """Sorteia palavras formando um texto de tamanho aproximado."""
+    return " ".join(rng.choice(_TERMOS) for _ in range(size))
+
+
+# Mede a latência de cada pergunta
+def _latencias(search, vectors: np.ndarray) -> list[float]:
+    """Executa ``search`` para cada vetor e devolve os tempos em segundos."""
+    tempos = []
+    for vector in vectors:
+        started = time.perf_counter()
+        search(vector)
+        tempos.append(time.perf_counter() - started)
+    return tempos
+
+
+# Resume latências em mediana e p95 (milissegundos)
+def _resumo(tempos: list[float]) -> str:
+    tempos = sorted(tempos)
+    p95 = tempos[max(int(len(tempos) * 0.95) - 1, 0)]
+    return f"mediana {statistics.median(tempos) * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms"
+
+
+# Fração dos ids exatos encontrados pelo backend
+def _revocacao(esperado: list[list[str]], obtido: list[list[str]]) -> float:
+    acertos = sum(len(set(e) & set(o)) for e, o in zip(esperado, obtido))
+    total = sum(len(e) for e in esperado)
+    return acertos / total if total else 1.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--words", type=int, default=60, help="palavras por trecho")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    emb = HashingEmbeddings(dim=args.dim)
+    ids = [f"doc:{i}" for i in range(args.docs)]
+    textos = [_trecho(rng, args.words) for _ in range(args.docs)]
+    metadatas = [
+        {"moeda": rng.choice(_MOEDAS), "fimPrazo": 20200101 + rng.randrange(80000)}
+        for _ in range(args.docs)
+    ]
+    vectors = emb.embed_matrix(textos)
+    perguntas = emb.embed_matrix([_trecho(rng, 8) for _ in range(args.queries)])
+    where = chroma_where({"moeda": "USD", "fimPrazoDe": "2024-01-01"})
+    print(f"{args.docs} trechos, {args.queries} perguntas, dim {args.dim}, k {args.k}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exato: dict[str, list[list[str]]] = {}
+        for dtype in ("float32", "float16"):
+            directory = f"{tmp}/numpy-{dtype}"
+            started = time.perf_counter()
+            index = NumpyVectorIndex(directory, dtype=dtype, flush_rows=args.batch)
+            for i in range(0, args.docs, args.batch):
+                part = slice(i, i + args.batch)
+                index.add_vectors(ids[part], vectors[part], textos[part], metadatas[part])
+            index.persist()
+            t_ingest = time.perf_counter() - started
+            started = time.perf_counter()
+            index = NumpyVectorIndex(directory)
+            t_load = time.perf_counter() - started
+
+            resultados = {}
+            for nome, filtro in (("sem filtro", None), ("com filtro", where)):
+                resultados[nome] = [
+                    [h[1] for h in hits]
+                    for hits in index.search(perguntas, args.k, filtro)
+                ]
+                exato.setdefault(nome, resultados[nome])
+            started = time.perf_counter()
+            index.search(perguntas, args.k)
+            t_lote = time.perf_counter() - started
+
+            print(f"\nnumpy {dtype}")
+            print(f"  ingestão   {t_ingest:7.2f} s   reabertura {t_load * 1000:7.1f} ms")
+            for nome, filtro in (("sem filtro", None), ("com filtro", where)):
+                tempos = _latencias(lambda v: index.search(v, args.k, filtro), perguntas)
+                print(
+                    f"  {nome}  {_resumo(tempos)}  "
+                    f"revocação {_revocacao(exato[nome], resultados[nome]):.3f}"
+                )
+            print(f"  lote       {args.queries / t_lote:7.0f} perguntas/s em uma multiplicação")
+
+        # Importado aqui: o Chroma é opcional para o restante do benchmark
+        import chromadb
+
+        directory = f"{tmp}/chroma"
+        started = time.perf_counter()
+        collection = chromadb.PersistentClient(path=directory).get_or_create_collection(
+            "bench", metadata={"hnsw:space": "cosine"}
+        )
+        for i in range(0, args.docs, args.batch):
+            part = slice(i, i + args.batch)
+            collection.add(
+                ids=ids[part],
+                embeddings=vectors[part].tolist(),
+                documents=textos[part],
+                metadatas=metadatas[part],
+            )
+        t_ingest = time.perf_counter() - started
+        started = time.perf_counter()
+        collection = chromadb.PersistentClient(path=directory).get_collection("bench")
+        collection.query(query_embeddings=[perguntas[0].tolist()], n_results=1)
+        t_load = time.perf_counter() - started
+
+        print("\nchroma")
+        print(f"  ingestão   {t_ingest:7.2f} s   reabertura {t_load * 1000:7.1f} ms")
+        for nome, filtro in (("sem filtro", None), ("com filtro", where)):
+            params = {"where": filtro} if filtro else {}
+            obtido = []
+
+            def buscar(vector):
+                result = collection.query(
+                    query_embeddings=[vector.tolist()],
+                    n_results=args.k,
+                    include=["documents", "metadatas"],
+                    **params,
+                )
+                obtido.append(result["ids"][0])
+
+            tempos = _latencias(buscar, perguntas)
+            print(
+                f"  {nome}  {_resumo(tempos)}  "
+                f"revocação {_revocacao(exato[nome], obtido):.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import asyncio
 import sys
 import types
 from pathlib import Path
@@ -52,15 +53,33 @@ sys.modules.setdefault("langchain.chains", langchain_stub.chains)
 from fastapi.testclient import TestClient
 from app.api import app
 import app.api.routes as routes
+from app.storage.contract_cache import ContractCache
+from app.chat.pool import ChatbotPool
 
 
 class DummyChatbot:
     def __init__(self):
         self.questions = []
-    def ask(self, question):
+        self.filters = []
+    def ask(self, question, filters=None):
         self.questions.append(question)
+        self.filters.append(filters)
         return "dummy answer", ["src1", "src2"]
 
+    async def aask(self, question, filters=None, session=None):
+        if session is not None:
+            session.add_turn(question, "dummy answer")
+        return self.ask(question, filters)
+
+    async def astream(self, question, filters=None, session=None):
+        self.questions.append(question)
+        self.filters.append(filters)
+        yield "sources", [{"source": "src1", "score": 0.9}]
+        for token in ("dummy", " answer"):
+            yield "token", token
+        if session is not None:
+            session.add_turn(question, "dummy answer")
+
 
 class DummyIngestor:
     def __init__(self):
@@ -80,6 +99,126 @@ def test_chat_endpoint_returns_structure(monkeypatch):
     assert chatbot.questions == ["hello"]
 
 
+# Filtros de metadados chegam ao chatbot e filtros inválidos retornam 400
+def test_chat_endpoint_forwards_filters(monkeypatch):
+    chatbot = DummyChatbot()
+    monkeypatch.setattr(routes, "_chatbot", chatbot)
+    client = TestClient(app)
+    filters = {"moeda": "USD", "fimPrazoDe": "2025-01-01"}
+    resp = client.post("/chat", json={"question": "reajuste", "filters": filters})
+    assert resp.status_code == 200
+    assert chatbot.filters == [filters]
+
+    resp = client.post("/chat", json={"question": "x", "filters": {"cor": "azul"}})
+    assert resp.status_code == 400
+    resp = client.post("/chat/stream", json={"question": "x", "filters": {"cor": 1}})
+    assert resp.status_code == 400
+    assert chatbot.questions == ["reajuste"]
+
+
+# Perguntas idênticas simultâneas geram uma única consulta ao chatbot
+def test_chat_coalesces_identical_requests(monkeypatch):
+    class SlowChatbot(DummyChatbot):
+        async def aask(self, question, filters=None, session=None):
+            await asyncio.sleep(0.05)
+            return self.ask(question, filters)
+
+    chatbot = SlowChatbot()
+    monkeypatch.setattr(routes, "_chatbot", chatbot)
+    monkeypatch.setattr(routes, "_inflight", routes.SingleFlight())
+
+    def chat(question, filters=None):
+        return routes.chat(
+            question=question, model=None, filters=filters, session_id=None
+        )
+
+    async def main():
+        return await asyncio.gather(
+            chat("Qual o prazo?"),
+            chat("qual o  prazo?"),
+            chat("qual o prazo?", filters={"moeda": "USD"}),
+        )
+
+    results = asyncio.run(main())
+    assert results[0] == results[1] == results[2]
+    assert len(chatbot.questions) == 2
+    assert routes._inflight.stats()["shared"] == 1
+
+
+# Perguntas com session_id compartilham o histórico mantido no servidor
+def test_chat_sessions(monkeypatch):
+    chatbot = DummyChatbot()
+    monkeypatch.setattr(routes, "_chatbot", chatbot)
+    monkeypatch.setattr(routes, "_sessions", routes.SessionStore())
+    client = TestClient(app)
+
+    session_id = client.post("/chat/sessions").json()["session_id"]
+    for pergunta in ("qual o prazo?", "e o valor?"):
+        resp = client.post(
+            "/chat", json={"question": pergunta, "session_id": session_id}
+        )
+        assert resp.json()["session_id"] == session_id
+    assert [p for p, _ in routes._sessions.get(session_id).turns] == [
+        "qual o prazo?",
+        "e o valor?",
+    ]
+    assert client.delete(f"/chat/sessions/{session_id}").status_code == 200
+    assert client.delete(f"/chat/sessions/{session_id}").status_code == 404
+
+    # Sessões desconhecidas ou encerradas não são recriadas silenciosamente
+    resp = client.post("/chat", json={"question": "oi", "session_id": session_id})
+    assert resp.status_code == 404
+    resp = client.post(
+        "/chat/stream", json={"question": "oi", "session_id": "inventada"}
+    )
+    assert resp.status_code == 404
+    assert routes._sessions.get(session_id) is None
+
+
+# A aba de chat abre a sessão na API e reabre quando ela expira
+def test_ui_chat_creates_session_then_streams(monkeypatch):
+    from app.ui import chat as ui_chat
+
+    chatbot = DummyChatbot()
+    monkeypatch.setattr(routes, "_chatbot", chatbot)
+    monkeypatch.setattr(routes, "_sessions", routes.SessionStore())
+    client = TestClient(app)
+    monkeypatch.setattr(ui_chat.httpx, "post", client.post)
+    monkeypatch.setattr(ui_chat.httpx, "stream", client.stream)
+
+    estado = {}
+    eventos = list(ui_chat._perguntar("qual o prazo?", estado))
+    assert ("token", "dummy") in eventos
+    session_id = estado["chat_session"]
+    assert [p for p, _ in routes._sessions.get(session_id).turns] == ["qual o prazo?"]
+
+    # Sessão expirada no servidor: a UI abre outra e reenvia a pergunta
+    routes._sessions.delete(session_id)
+    eventos = list(ui_chat._perguntar("e o valor?", estado))
+    assert ("token", " answer") in eventos
+    assert estado["chat_session"] != session_id
+    novo = routes._sessions.get(estado["chat_session"])
+    assert [p for p, _ in novo.turns] == ["e o valor?"]
+
+
+# Verifica a sequência de eventos SSE de /chat/stream
+def test_chat_stream_emits_sources_then_tokens(monkeypatch):
+    chatbot = DummyChatbot()
+    monkeypatch.setattr(routes, "_chatbot", chatbot)
+    client = TestClient(app)
+    resp = client.post("/chat/stream", json={"question": "hello"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    blocos = [b for b in resp.text.split("\n\n") if b]
+    assert blocos == [
+        'event: sources\ndata: [{"source": "src1", "score": 0.9}]',
+        'event: token\ndata: "dummy"',
+        'event: token\ndata: " answer"',
+        "event: done\ndata: {}",
+    ]
+    assert chatbot.questions == ["hello"]
+
+
 # Garante que /ingest aciona o ingestor
 def test_ingest_endpoint_calls_ingestor(monkeypatch):
     ing = DummyIngestor()
@@ -165,6 +304,7 @@ def test_get_contract_by_contrato(monkeypatch):
                 valorContratoOriginal=None,
                 moeda=None,
                 taxaCambio=None,
+                valorBRL=None,
                 gerenteContrato=None,
                 nomeGerenteContrato=None,
                 lotacaoGerenteContrato=None,
@@ -180,8 +320,9 @@ def test_get_contract_by_contrato(monkeypatch):
                 vetor_embedding=None,
                 texto_completo=None,
             )
+            self.contract_cache = ContractCache()
 
-        def get_contract_by_contrato(self, contrato):
+        def get_contract_by_contrato(self, contrato, fields=None):
             return self.row if contrato == "C1" else None
 
     db = DummyDB()
@@ -217,6 +358,103 @@ def test_contracts_pagination(monkeypatch, tmp_path):
     assert len(data["contracts"]) == 2
 
 
+# Confere projeção de colunas via parâmetro fields
+def test_contracts_fields_projection(monkeypatch, tmp_path):
+    db_path = tmp_path / "db.sqlite"
+    db = routes.RelationalDBAdapter(db_url=f"sqlite:///{db_path}")
+    db.add_contract_structured(
+        contrato="C1",
+        moeda="USD",
+        texto_completo="texto longo",
+        linhasServico="[]",
+    )
+
+    monkeypatch.setattr(routes, "_relational_db", db)
+    client = TestClient(app)
+
+    resp = client.get("/contracts", params={"fields": "contrato,moeda"})
+    assert resp.status_code == 200
+    assert resp.json()["contracts"] == [{"contrato": "C1", "moeda": "USD"}]
+
+    resp = client.get("/contract/C1")
+    assert "texto_completo" not in resp.json()
+    assert resp.json()["linhasServico"] == "[]"
+
+    resp = client.get("/contract/C1", params={"fields": "contrato,texto_completo"})
+    assert resp.json() == {"contrato": "C1", "texto_completo": "texto longo"}
+
+    resp = client.get("/contracts", params={"fields": "inexistente"})
+    assert resp.status_code == 400
+
+
+# Consulta estruturada devolvida em NDJSON
+def test_contracts_query_streams_ndjson(monkeypatch, tmp_path):
+    import json
+    from datetime import date
+
+    db_path = tmp_path / "db.sqlite"
+    db = routes.RelationalDBAdapter(db_url=f"sqlite:///{db_path}")
+    db.add_contract_structured(
+        contrato="C1",
+        moeda="USD",
+        lotacaoGerenteContrato="TI",
+        fimPrazo=date(2025, 5, 1),
+    )
+    db.add_contract_structured(
+        contrato="C2",
+        moeda="USD",
+        lotacaoGerenteContrato="RH",
+        fimPrazo=date(2025, 6, 1),
+    )
+    db.add_contract_structured(
+        contrato="C3",
+        moeda="BRL",
+        lotacaoGerenteContrato="TI",
+        fimPrazo=date(2025, 4, 1),
+    )
+
+    monkeypatch.setattr(routes, "_relational_db", db)
+    client = TestClient(app)
+    resp = client.get(
+        "/contracts/query",
+        params={
+            "lotacaoGerenteContrato": "TI",
+            "sort": "-fimPrazo",
+            "fields": "contrato,fimPrazo",
+        },
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    linhas = [json.loads(l) for l in resp.text.splitlines()]
+    assert linhas == [
+        {"contrato": "C1", "fimPrazo": "2025-05-01"},
+        {"contrato": "C3", "fimPrazo": "2025-04-01"},
+    ]
+
+    resp = client.get("/contracts/query", params={"sort": "xyz"})
+    assert resp.status_code == 400
+
+
+# Verifica busca textual paginada via /search
+def test_search_endpoint(monkeypatch, tmp_path):
+    db_path = tmp_path / "db.sqlite"
+    db = routes.RelationalDBAdapter(db_url=f"sqlite:///{db_path}")
+    for i in range(3):
+        db.add_contract_structured(
+            contrato=f"C{i}",
+            objetoContrato="serviço de sondagem",
+        )
+
+    monkeypatch.setattr(routes, "_relational_db", db)
+    client = TestClient(app)
+    resp = client.get("/search", params={"q": "sondagem", "page_size": 2})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["total"] == 3
+    assert len(data["results"]) == 2
+    assert {"contrato", "score", "snippet"} <= set(data["results"][0])
+
+
 # Checa geração do relatório via endpoint
 def test_contract_report_endpoint(monkeypatch, tmp_path):
     db_path = tmp_path / "db.sqlite"
@@ -230,6 +468,31 @@ def test_contract_report_endpoint(monkeypatch, tmp_path):
     assert "contrato: C1" in resp.json()["report"]
 
 
+# Leituras repetidas usam o cache e escritas o invalidam
+def test_contract_cache_hits_and_invalidation(monkeypatch, tmp_path):
+    db_path = tmp_path / "db.sqlite"
+    db = routes.RelationalDBAdapter(db_url=f"sqlite:///{db_path}")
+    db.add_contract_structured(contrato="C1", moeda="BRL")
+
+    monkeypatch.setattr(routes, "_relational_db", db)
+    client = TestClient(app)
+    client.get("/contract/C1")
+    client.get("/contract/C1")
+    resp = client.get("/contract/C1")
+    assert resp.json()["moeda"] == "BRL"
+    stats = client.get("/metrics").json()["contract_cache"]
+    assert stats["misses"] == 1
+    assert stats["hits"] == 2
+
+    # Nova ingestão incrementa a geração e força releitura do banco
+    db.clear_contracts()
+    db.add_contract_structured(contrato="C1", moeda="USD")
+    assert client.get("/contract/C1").json()["moeda"] == "USD"
+    stats = client.get("/metrics").json()["contract_cache"]
+    assert stats["misses"] == 2
+    assert stats["generation"] == 3
+
+
 # Confere uso do parâmetro model na rota /chat
 def test_chat_endpoint_accepts_model(monkeypatch):
     class DummyBot(DummyChatbot):
@@ -239,19 +502,27 @@ def test_chat_endpoint_accepts_model(monkeypatch):
 
     created = {}
 
-    def dummy_ctor(store, model="x"):
+    def dummy_ctor(store, model="x", **kwargs):
         bot = DummyBot(model=model)
         created["bot"] = bot
         return bot
 
     monkeypatch.setattr(routes, "ContractChatbot", dummy_ctor)
     monkeypatch.setattr(routes, "_chatbot", DummyChatbot())
+    monkeypatch.setattr(routes, "_chatbot_pool", ChatbotPool(routes._build_chatbot))
     client = TestClient(app)
     resp = client.post("/chat", json={"question": "oi", "model": "my-model"})
     assert resp.status_code == 200
     assert created["bot"].model == "my-model"
     assert created["bot"].questions == ["oi"]
 
+    # Segunda pergunta ao mesmo modelo reaproveita o chatbot do pool
+    first = created["bot"]
+    client.post("/chat", json={"question": "tchau", "model": "my-model"})
+    assert created["bot"] is first
+    assert first.questions == ["oi", "tchau"]
+    assert routes._chatbot_pool.stats()["created"] == 1
+
 
 # CRUD completo de prompts via API
 def test_prompts_crud_via_api(monkeypatch, tmp_path):
@@ -282,14 +553,48 @@ def test_prompts_crud_via_api(monkeypatch, tmp_path):
     resp = client.get("/prompts")
     assert resp.json()["prompts"] == []
 
+# Manutenção arquiva execuções antigas e a restauração as traz de volta
+def test_executions_maintenance_and_restore(monkeypatch, tmp_path):
+    db_path = tmp_path / "db.sqlite"
+    db = routes.RelationalDBAdapter(db_url=f"sqlite:///{db_path}")
+    pid = db.add_prompt(nome="p", texto="T")
+    ids = []
+    for _ in range(2):
+        exec_id = db.create_execution("prompt_execution", "X", prompt_id=pid)
+        db.add_execution_result(exec_id, None, "completa", "simples")
+        db.update_execution(exec_id, status="success")
+        ids.append(exec_id)
+
+    monkeypatch.setattr(routes, "_relational_db", db)
+    # O diretório padrão de arquivos é relativo; isola-o no tmp_path
+    monkeypatch.chdir(tmp_path)
+    client = TestClient(app)
+    # Reter zero execuções arquivaria todas; o valor é recusado
+    for invalido in (0, -1):
+        resp = client.post("/executions/maintenance", json={"keep_last": invalido})
+        assert resp.status_code == 400
+    assert db.executions_beyond_retention(1) == [ids[0]]
+    resp = client.post("/executions/maintenance", json={"keep_last": 1})
+    assert resp.status_code == 200
+    assert client.get(f"/executions/{resp.json()['id']}").json()["status"] == "success"
+    assert client.get(f"/executions/{ids[0]}").json()["archived"] is True
+
+    resp = client.post(f"/executions/{ids[0]}/restore")
+    assert resp.json() == {"status": "ok", "restored": 1}
+    assert client.get(f"/executions/{ids[0]}").json()["archived"] is False
+    resp = client.post(f"/executions/{ids[0]}/restore")
+    assert resp.status_code == 404
+
 # Verifica acionamento do ExhaustiveProcessor via API
 
 def test_execute_endpoint_calls_processor(monkeypatch):
     class DummyProcessor:
         def __init__(self, *args, **kwargs):
             self.prompt = None
-        async def run(self, prompt=None):
+            self.since_seq = None
+        async def run(self, prompt=None, since_seq=None):
             self.prompt = prompt
+            self.since_seq = since_seq
             return [99]
 
     proc = DummyProcessor()
@@ -299,6 +604,10 @@ def test_execute_endpoint_calls_processor(monkeypatch):
     assert resp.status_code == 200
     assert resp.json() == {"ids": [99]}
     assert proc.prompt == "Perg?"
+    assert proc.since_seq is None
+
+    resp = client.post("/execute", json={"since_seq": 7})
+    assert proc.since_seq == 7
 
     resp = client.post("/execute", json={})
     assert resp.status_code == 200
@@ -0,0 +1,300 @@
+import asyncio
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Stubs leves para os módulos do langchain importados pelo pacote de chat
+langchain_stub = types.ModuleType("langchain")
+langchain_stub.embeddings = types.ModuleType("langchain.embeddings")
+langchain_stub.embeddings.OpenAIEmbeddings = object
+langchain_stub.chat_models = types.ModuleType("langchain.chat_models")
+langchain_stub.chat_models.ChatOpenAI = object
+langchain_stub.chains = types.ModuleType("langchain.chains")
+langchain_stub.chains.RetrievalQA = object
+sys.modules.setdefault("langchain", langchain_stub)
+sys.modules.setdefault("langchain.embeddings", langchain_stub.embeddings)
+sys.modules.setdefault("langchain.chat_models", langchain_stub.chat_models)
+sys.modules.setdefault("langchain.chains", langchain_stub.chains)
+
+import app.chat.chatbot as chatbot_mod
+from app.chat.answer_cache import SemanticAnswerCache
+from app.chat.chatbot import ContractChatbot
+from app.chat.pool import ChatbotPool
+from app.storage import vector_store_adapter
+from app.storage.vector_filters import chroma_where, matches_filters
+from app.storage.vector_store_adapter import maximal_marginal_relevance
+
+
+# Embeddings que contam as chamadas e devolvem um vetor fixo
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [1.0, 0.0]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+# Coleção do Chroma simulada com três documentos
+class DummyCollection:
+    def __init__(self):
+        self.queries = []
+        self.docs = ["contrato A", "contrato A (cópia)", "contrato B", "irrelevante"]
+        self.vectors = [[1.0, 0.1], [1.0, 0.12], [0.8, -0.6], [0.0, 1.0]]
+
+    def query(self, query_embeddings, n_results, include, where=None):
+        self.queries.append(n_results)
+        self.where = where
+        n = min(n_results, len(self.docs))
+        return {
+            "documents": [self.docs[:n]],
+            "metadatas": [[{"source": d} for d in self.docs[:n]]],
+            "embeddings": [self.vectors[:n]],
+        }
+
+
+# Modelo de linguagem que registra o prompt recebido
+class DummyLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return types.SimpleNamespace(content="resposta")
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(0.2)
+        return self.invoke(prompt)
+
+    async def astream(self, prompt):
+        self.prompts.append(prompt)
+        for token in ("res", "", "posta"):
+            yield types.SimpleNamespace(content=token)
+
+
+# Monta o adaptador vetorial sem o Chroma real
+def _adapter(monkeypatch):
+    store = types.SimpleNamespace(_collection=DummyCollection())
+    monkeypatch.setattr(vector_store_adapter, "Chroma", lambda *a, **k: store)
+    monkeypatch.setattr(vector_store_adapter, "get_embeddings", CountingEmbeddings)
+    return vector_store_adapter.VectorStoreAdapter(persist_directory="test_db")
+
+
+# MMR troca o quase duplicado por um documento diferente
+def test_maximal_marginal_relevance_prefers_diversity():
+    matrix = np.array([[1.0, 0.0], [0.999, 0.045], [0.8, -0.6]], dtype=np.float32)
+    scores = matrix @ np.array([1.0, 0.0], dtype=np.float32)
+    assert maximal_marginal_relevance(scores, matrix, 2, lambda_mult=1.0) == [0, 1]
+    assert maximal_marginal_relevance(scores, matrix, 2, lambda_mult=0.3) == [0, 2]
+
+
+# Limiar e MMR são aplicados sobre uma única consulta
+def test_similarity_search_threshold_and_mmr(monkeypatch):
+    adapter = _adapter(monkeypatch)
+    results = adapter.similarity_search("pergunta", k=3, score_threshold=0.5)
+    assert [d.page_content for d, _ in results] == [
+        "contrato A",
+        "contrato A (cópia)",
+        "contrato B",
+    ]
+    assert results[0][1] > results[2][1] > 0.5
+
+    results = adapter.similarity_search("pergunta", k=2, mmr=True, fetch_k=4)
+    assert [d.page_content for d, _ in results] == ["contrato A", "contrato B"]
+    assert adapter._store._collection.queries == [3, 4]
+    # A mesma pergunta reaproveita o embedding já calculado
+    assert adapter._embedding.calls == 1
+
+
+# Uma pergunta gera um único embedding e uma única consulta ao vetor
+def test_ask_retrieves_once_and_returns_scores(monkeypatch):
+    adapter = _adapter(monkeypatch)
+    llm = DummyLLM()
+    monkeypatch.setattr(chatbot_mod, "get_chat_model", lambda model="x": llm)
+
+    bot = ContractChatbot(adapter, top_k=2, score_threshold=0.5)
+    answer, sources = bot.ask("qual o prazo?")
+
+    assert answer == "resposta"
+    assert adapter._embedding.calls == 1
+    assert len(adapter._store._collection.queries) == 1
+    assert [s["source"] for s in sources] == ["contrato A", "contrato A (cópia)"]
+    assert all(s["score"] > 0.5 for s in sources)
+    assert "irrelevante" not in llm.prompts[0]
+    assert "Pergunta: qual o prazo?" in llm.prompts[0]
+
+
+# Streaming emite as fontes antes dos tokens do modelo
+def test_astream_yields_sources_then_tokens(monkeypatch):
+    adapter = _adapter(monkeypatch)
+    llm = DummyLLM()
+    monkeypatch.setattr(chatbot_mod, "get_chat_model", lambda model="x": llm)
+    bot = ContractChatbot(adapter, top_k=1)
+
+    async def collect():
+        return [event async for event in bot.astream("qual o prazo?")]
+
+    events = asyncio.run(collect())
+    assert events[0][0] == "sources"
+    assert events[0][1][0]["source"] == "contrato A"
+    assert events[1:] == [("token", "res"), ("token", "posta")]
+
+
+# Perguntas simultâneas compartilham o event loop sem serializar o modelo
+def test_aask_runs_concurrently(monkeypatch):
+    adapter = _adapter(monkeypatch)
+    llm = DummyLLM()
+    monkeypatch.setattr(chatbot_mod, "get_chat_model", lambda model="x": llm)
+    bot = ContractChatbot(adapter, top_k=1)
+
+    async def many():
+        return await asyncio.gather(*(bot.aask(f"pergunta {i}") for i in range(50)))
+
+    started = time.perf_counter()
+    results = asyncio.run(many())
+    elapsed = time.perf_counter() - started
+
+    assert [answer for answer, _ in results] == ["resposta"] * 50
+    assert adapter._embedding.calls == 50
+    # 50 respostas de 0,2 s em sequência levariam 10 s
+    assert elapsed < 2.0
+
+
+# Perguntas quase iguais reaproveitam a resposta até o vetor mudar
+def test_semantic_answer_cache(monkeypatch):
+    adapter = _adapter(monkeypatch)
+    llm = DummyLLM()
+    monkeypatch.setattr(chatbot_mod, "get_chat_model", lambda model="x": llm)
+    bot = ContractChatbot(
+        adapter, top_k=1, answer_cache=SemanticAnswerCache(threshold=0.99)
+    )
+
+    first = bot.ask("contratos com reajuste")
+    # O stub devolve o mesmo embedding para qualquer pergunta
+    assert bot.ask("Contratos com reajuste?") == first
+    assert asyncio.run(bot.aask("contratos com reajuste")) == first
+    assert len(llm.prompts) == 1
+    assert len(adapter._store._collection.queries) == 1
+    assert bot.answer_cache.stats()["hits"] == 2
+
+    adapter.generation += 1
+    bot.ask("contratos com reajuste")
+    assert len(llm.prompts) == 2
+
+    # ``top_k`` diferente do padrão não usa o cache
+    bot.ask("contratos com reajuste", top_k=3)
+    assert len(llm.prompts) == 3
+
+
+# A geração dos contratos (consulta ao SQLite) não roda no event loop
+def test_async_generation_runs_off_event_loop(monkeypatch):
+    adapter = _adapter(monkeypatch)
+    llm = DummyLLM()
+    monkeypatch.setattr(chatbot_mod, "get_chat_model", lambda model="x": llm)
+    threads = []
+
+    class Cache:
+        @property
+        def generation(self):
+            threads.append(threading.current_thread())
+            return 0
+
+    db = types.SimpleNamespace(contract_cache=Cache())
+    bot = ContractChatbot(adapter, top_k=1)
+    bot._relational_db = db
+
+    async def collect():
+        await bot.aask("qual o prazo?")
+        return [event async for event in bot.astream("qual o valor?")]
+
+    asyncio.run(collect())
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+
+# LRU descarta a resposta menos usada e o limiar separa perguntas distintas
+def test_answer_cache_lru_and_threshold():
+    cache = SemanticAnswerCache(max_size=2, threshold=0.9)
+    cache.put([1.0, 0.0], "a")
+    cache.put([0.0, 1.0], "b")
+    assert cache.get([0.99, 0.05]) == "a"
+    cache.put([0.7, 0.7], "c")
+    assert cache.get([0.0, 1.0]) is None
+    assert cache.get([1.0, 0.0]) == "a"
+    assert cache.get([1.0, -1.0]) is None
+    cache.put([1.0, -1.0], "d", generation=1)
+    assert cache.get([1.0, -1.0]) is None
+    assert cache.get([1.0, 0.0], generation=1) is None
+
+
+# Pool mantém um chatbot por modelo e descarta o menos usado
+def test_chatbot_pool_reuses_and_evicts():
+    criados = []
+
+    def factory(model):
+        criados.append(model)
+        return object()
+
+    pool = ChatbotPool(factory, max_size=2)
+    padrao = object()
+    pool.register("padrao", padrao)
+    pool.warm_up(["a", "b"])
+    assert criados == ["a", "b"]
+    assert pool.get("padrao") is padrao
+    bot_a = pool.get("a")
+    assert pool.get("a") is bot_a
+    pool.get("c")  # descarta "b", o menos usado
+    assert pool.get("a") is bot_a
+    pool.get("b")
+    assert criados == ["a", "b", "c", "b"]
+    # O chatbot registrado nunca é descartado nem conta no limite
+    assert pool.get("padrao") is padrao
+    assert pool.stats()["size"] == 3
+
+
+# Filtros da API viram a cláusula ``where`` do Chroma
+def test_chroma_where_and_matches_filters():
+    assert chroma_where(None) is None
+    assert chroma_where({"moeda": "USD"}) == {"moeda": "USD"}
+    where = chroma_where(
+        {"fornecedor": ["1", "2"], "fimPrazoDe": "2025-01-01", "empresa": ""}
+    )
+    assert where == {
+        "$and": [
+            {"fornecedor": {"$in": ["1", "2"]}},
+            {"fimPrazo": {"$gte": 20250101}},
+        ]
+    }
+    filtros = {"moeda": "USD", "fimPrazoAte": "2025-12-31"}
+    assert matches_filters({"moeda": "USD", "fimPrazo": 20250630}, filtros)
+    assert not matches_filters({"moeda": "USD", "fimPrazo": 20260101}, filtros)
+    assert not matches_filters({"moeda": "BRL"}, {"moeda": "USD"})
+    with pytest.raises(ValueError):
+        chroma_where({"cor": "azul"})
+
+
+# Os filtros chegam ao Chroma e desativam o cache de respostas
+def test_ask_pushes_filters_to_vector_search(monkeypatch):
+    adapter = _adapter(monkeypatch)
+    llm = DummyLLM()
+    monkeypatch.setattr(chatbot_mod, "get_chat_model", lambda model="x": llm)
+    bot = ContractChatbot(adapter, top_k=1)
+
+    bot.ask("cláusulas de reajuste", filters={"moeda": "USD"})
+    bot.ask("cláusulas de reajuste", filters={"moeda": "USD"})
+    assert adapter._store._collection.where == {"moeda": "USD"}
+    assert len(llm.prompts) == 2
+    bot.ask("cláusulas de reajuste")
+    assert adapter._store._collection.where is None
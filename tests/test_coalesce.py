@@ -0,0 +1,83 @@
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.api.coalesce import SingleFlight
+
+
+# Chamadas assíncronas simultâneas com a mesma chave executam uma vez
+def test_ado_shares_in_flight_result():
+    flight = SingleFlight()
+    executions = []
+
+    async def work(valor):
+        executions.append(valor)
+        await asyncio.sleep(0.05)
+        return valor * 2
+
+    async def main():
+        iguais = [flight.ado("a", lambda: work(1)) for _ in range(10)]
+        outra = flight.ado("b", lambda: work(5))
+        return await asyncio.gather(*iguais, outra)
+
+    results = asyncio.run(main())
+    assert results == [2] * 10 + [10]
+    assert executions == [1, 5]
+    assert flight.stats()["shared"] == 9
+    assert flight.stats()["in_flight"] == 0
+
+    # Terminada a execução, a chave volta a executar normalmente
+    asyncio.run(flight.ado("a", lambda: work(1)))
+    assert executions == [1, 5, 1]
+
+
+# Erros são repassados a todas as requisições agrupadas
+def test_ado_propagates_errors():
+    flight = SingleFlight()
+
+    async def falha():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provedor indisponível")
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.ado("k", falha) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.calls == 1
+
+
+# Rotas síncronas agrupam chamadas vindas de várias threads
+def test_do_shares_between_threads():
+    flight = SingleFlight()
+    executions = []
+    barrier = threading.Barrier(5)
+
+    def work():
+        executions.append(1)
+        time.sleep(0.1)
+        return "relatório"
+
+    def request():
+        barrier.wait()
+        return flight.do(("report", "C1"), work)
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda _: request(), range(5)))
+
+    assert results == ["relatório"] * 5
+    assert len(executions) == 1
+
+    with pytest.raises(ValueError):
+        flight.do("erro", lambda: int("x"))
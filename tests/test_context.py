@@ -0,0 +1,179 @@
+import hashlib
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Stubs leves para os módulos do langchain importados pelo pacote de chat
+langchain_stub = types.ModuleType("langchain")
+langchain_stub.embeddings = types.ModuleType("langchain.embeddings")
+langchain_stub.embeddings.OpenAIEmbeddings = object
+langchain_stub.chat_models = types.ModuleType("langchain.chat_models")
+langchain_stub.chat_models.ChatOpenAI = object
+sys.modules.setdefault("langchain", langchain_stub)
+sys.modules.setdefault("langchain.embeddings", langchain_stub.embeddings)
+sys.modules.setdefault("langchain.chat_models", langchain_stub.chat_models)
+
+from langchain_core.documents import Document
+
+import app.chat.chatbot as chatbot_mod
+import app.chat.context as context_mod
+from app.chat.chatbot import ContractChatbot
+from app.chat.context import ContextPacker, count_tokens
+
+
+# Contagem simples: um token por palavra
+def _palavras(text):
+    return len(text.split())
+
+
+def _doc(texto, score, source):
+    return Document(page_content=texto, metadata={"source": source, "score": score})
+
+
+TEXTO_A = "o contrato prevê reajuste anual pelo IPCA a partir do segundo ano"
+TEXTO_B = "a vigência do contrato é de sessenta meses contados da assinatura"
+TEXTO_C = "o foro eleito é o da comarca do Rio de Janeiro para dúvidas"
+
+
+# Trechos repetidos são descartados mantendo o mais relevante
+def test_pack_removes_overlapping_chunks():
+    packer = ContextPacker(1000, count_tokens=_palavras)
+    docs = [
+        _doc(TEXTO_A, 0.7, "a1"),
+        _doc(TEXTO_A + " conforme cláusula", 0.9, "a2"),
+        _doc(TEXTO_B, 0.8, "b"),
+    ]
+    packed = packer.pack(docs)
+    assert [d.metadata["source"] for d in packed.docs] == ["a2", "b"]
+    assert packed.duplicates == 1
+    assert packed.overflow == []
+
+
+# O orçamento é preenchido por relevância e o excedente fica de fora
+def test_pack_respects_budget_by_score():
+    packer = ContextPacker(25, count_tokens=_palavras)
+    docs = [_doc(TEXTO_A, 0.5, "a"), _doc(TEXTO_B, 0.9, "b"), _doc(TEXTO_C, 0.7, "c")]
+    packed = packer.pack(docs)
+    assert [d.metadata["source"] for d in packed.docs] == ["b", "c"]
+    assert [d.metadata["source"] for d in packed.overflow] == ["a"]
+    assert packed.tokens <= 25
+    assert _palavras(packer.truncate(TEXTO_A, 3)) <= 3
+
+
+# Com o orçamento quase cheio, parte dele é reservada aos resumos
+def test_pack_for_summaries_reserves_budget():
+    packer = ContextPacker(24, count_tokens=_palavras, min_summary_tokens=4)
+    docs = [_doc(TEXTO_A, 0.5, "a"), _doc(TEXTO_B, 0.9, "b"), _doc(TEXTO_C, 0.7, "c")]
+    # Sem reserva B e C ocupariam os 24 tokens e não sobraria nada a A
+    assert packer.pack(docs).tokens == 24
+
+    packed = packer.pack_for_summaries(docs)
+    assert [d.metadata["source"] for d in packed.docs] == ["b"]
+    assert [d.metadata["source"] for d in packed.summarized] == ["c", "a"]
+    assert packed.summary_tokens == 6
+    assert packed.tokens + packed.summary_tokens * 2 <= 24
+
+    # Espaço insuficiente para um resumo útil: a etapa map é pulada
+    packer.min_summary_tokens = 14
+    assert packer.pack_for_summaries(docs).summarized == []
+
+
+# Sem vocabulário disponível a contagem é estimada localmente
+def test_count_tokens_is_positive_offline():
+    assert count_tokens("") == 0
+    assert count_tokens("contrato de prestação de serviços") > 0
+
+
+# O vocabulário só é carregado se já estiver no cache em disco
+def test_encoding_never_downloaded(monkeypatch, tmp_path):
+    chamadas = []
+    fake = types.SimpleNamespace(
+        get_encoding=lambda name: chamadas.append(name) or "enc"
+    )
+    monkeypatch.setattr(context_mod, "tiktoken", fake)
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(context_mod, "_encoding", None)
+    monkeypatch.setattr(context_mod, "_encoding_loaded", False)
+    assert context_mod._get_encoding("cl100k_base") is None
+    assert chamadas == []
+
+    # Com o arquivo no cache o tiktoken é usado normalmente
+    url = context_mod._VOCAB_URLS["cl100k_base"]
+    (tmp_path / hashlib.sha1(url.encode()).hexdigest()).write_bytes(b"")
+    monkeypatch.setattr(context_mod, "_encoding_loaded", False)
+    assert context_mod._get_encoding("cl100k_base") == "enc"
+    assert chamadas == ["cl100k_base"]
+
+
+# Recuperador fixo usado no chatbot de teste
+class FixedRetriever:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def invoke(self, question):
+        return list(self.docs)
+
+
+# Modelo que registra os prompts e resume trechos pedidos na etapa map
+class RecordingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        if prompt.endswith("Informações:"):
+            return types.SimpleNamespace(content="resumo do trecho")
+        return types.SimpleNamespace(content="resposta")
+
+
+# Excedente do orçamento é resumido apenas quando necessário
+def test_chatbot_map_reduce_only_when_over_budget(monkeypatch):
+    llm = RecordingLLM()
+    monkeypatch.setattr(chatbot_mod, "get_chat_model", lambda model="x": llm)
+    store = types.SimpleNamespace(generation=0, embed_query=lambda q: [1.0])
+    docs = [_doc(TEXTO_A, 0.5, "a"), _doc(TEXTO_B, 0.9, "b")]
+    bot = ContractChatbot(
+        store,
+        top_k=2,
+        context_packer=ContextPacker(
+            15, count_tokens=_palavras, min_summary_tokens=3
+        ),
+    )
+    bot._retriever = FixedRetriever(docs)
+    bot.answer_cache.max_size = 0
+
+    answer, sources = bot.ask("qual o prazo?")
+    assert answer == "resposta"
+    assert len(llm.prompts) == 2
+    assert TEXTO_A in llm.prompts[0]
+    assert "resumo do trecho" in llm.prompts[1]
+    assert TEXTO_A not in llm.prompts[1]
+    assert [s["source"] for s in sources] == ["b", "a"]
+
+    # Trechos que ocupam quase todo o orçamento ainda deixam espaço útil
+    # para os resumos, que chegam inteiros ao prompt final
+    llm.prompts.clear()
+    bot.context_packer = ContextPacker(
+        16, count_tokens=_palavras, min_summary_tokens=3
+    )
+    bot.ask("qual o prazo?")
+    assert len(llm.prompts) == 2
+    assert "resumo do trecho" in llm.prompts[1]
+
+    # Sem espaço para um resumo útil, nenhuma chamada map é feita
+    llm.prompts.clear()
+    bot.context_packer = ContextPacker(
+        16, count_tokens=_palavras, min_summary_tokens=50
+    )
+    bot.ask("qual o prazo?")
+    assert len(llm.prompts) == 1
+
+    # Com orçamento suficiente os trechos vão inteiros numa única chamada
+    llm.prompts.clear()
+    bot.context_packer = ContextPacker(100, count_tokens=_palavras)
+    bot.ask("qual o prazo?")
+    assert len(llm.prompts) == 1
@@ -0,0 +1,85 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.storage.contract_cache import ContractCache
+
+
+# Relógio controlado manualmente para testar a expiração
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# Descarta o item usado há mais tempo ao exceder o limite
+def test_lru_eviction_and_metrics():
+    cache = ContractCache(max_size=2, ttl=None)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (3, 1, 2)
+
+
+# Entradas expiram após o TTL
+def test_ttl_expiration():
+    clock = FakeClock()
+    cache = ContractCache(ttl=10, clock=clock)
+    cache.put("a", 1)
+    clock.now = 5
+    assert cache.get("a") == 1
+    clock.now = 20
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+# Incremento da geração invalida tudo e descarta leituras concorrentes
+def test_generation_bump_invalidates():
+    cache = ContractCache()
+    cache.put("a", 1)
+    geracao = cache.generation
+    cache.bump()
+    assert cache.get("a") is None
+    cache.put("b", 2, generation=geracao)
+    assert cache.get("b") is None
+    cache.put("b", 2, generation=cache.generation)
+    assert cache.get("b") == 2
+
+
+# Mudança na marca do banco invalida o cache, verificada a cada intervalo
+def test_validator_detects_external_writes():
+    clock = FakeClock()
+    marca = {"seq": 1}
+    chamadas = []
+
+    def validator():
+        chamadas.append(clock.now)
+        return marca["seq"]
+
+    cache = ContractCache(validator=validator, check_interval=1.0, clock=clock)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    marca["seq"] = 2
+    clock.now = 0.5
+    assert cache.get("a") == 1
+    clock.now = 1.5
+    assert cache.get("a") is None
+    assert cache.generation == 1
+    assert chamadas == [0.0, 1.5]
+
+    # Após um bump local a marca é relida sem nova invalidação
+    marca["seq"] = 3
+    cache.bump()
+    cache.put("b", 2, generation=cache.generation)
+    assert cache.get("b") == 2
+    assert cache.generation == 2
@@ -2,6 +2,8 @@ import json
 from pathlib import Path
 import sys
 
+import numpy as np
+
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
@@ -28,9 +30,37 @@ def test_contrato_from_orm_and_report():
 
     contrato = Contrato.from_orm(row)
     assert contrato.contrato == "C1"
-    assert contrato.vetor_embedding == [0.1, 0.2]
+    assert contrato.vetor_embedding.dtype == np.float32
+    assert np.allclose(contrato.vetor_embedding, [0.1, 0.2])
     assert contrato.texto_completo == "Texto exemplo"
     report = contrato.relatorio()
     assert "contrato: C1" in report
     assert "Item" in report
 
+
+
+# O cache guarda contratos sem texto completo e entrega cópias independentes
+def test_carregar_returns_copies_and_sees_other_writers(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    db = RelationalDBAdapter(db_url=db_url, cache_check_interval=0)
+    db.add_contract_structured(
+        contrato="C1",
+        moeda="BRL",
+        texto_completo="Texto exemplo",
+        linhasServico=[{"ItemPedido": "10"}],
+    )
+
+    primeiro = Contrato.carregar(db, "C1")
+    assert primeiro.texto_completo is None
+    primeiro.moeda = "USD"
+    primeiro.linhasServico.append({"ItemPedido": "20"})
+    segundo = Contrato.carregar(db, "C1")
+    assert segundo.moeda == "BRL"
+    assert len(segundo.linhasServico) == 1
+    assert db.contract_cache.stats()["hits"] == 1
+
+    # Escrita feita por outro adaptador sobre o mesmo arquivo
+    outro = RelationalDBAdapter(db_url=db_url)
+    with outro._engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE contracts SET moeda = 'EUR' WHERE id = 1")
+    assert Contrato.carregar(db, "C1").moeda == "EUR"
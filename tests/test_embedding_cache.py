@@ -0,0 +1,69 @@
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.integrations.embedding_cache import CachedEmbeddings
+
+
+# Provedor que registra os textos enviados
+class RecordingEmbeddings:
+    model = "modelo-teste"
+
+    def __init__(self):
+        self.queries = []
+        self.batches = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 1.0]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(t)), 0.0] for t in texts]
+
+
+# Perguntas repetidas não voltam ao provedor e o LRU respeita o limite
+def test_embed_query_hits_and_eviction():
+    inner = RecordingEmbeddings()
+    cache = CachedEmbeddings(inner, max_size=2)
+
+    assert cache.embed_query("prazo") == [5.0, 1.0]
+    assert cache.embed_query("prazo") == [5.0, 1.0]
+    assert asyncio.run(cache.aembed_query("prazo")) == [5.0, 1.0]
+    assert inner.queries == ["prazo"]
+
+    cache.embed_query("valor")
+    cache.embed_query("prazo")
+    cache.embed_query("multa")  # descarta "valor", o menos usado
+    cache.embed_query("valor")
+    assert inner.queries == ["prazo", "valor", "multa", "valor"]
+
+    stats = cache.stats()
+    assert stats["model"] == "modelo-teste"
+    assert stats["hits"] == 3 and stats["misses"] == 4
+    assert stats["hit_rate"] == 3 / 7
+    # Atributos do provedor continuam acessíveis
+    assert cache.batches == inner.batches
+
+
+# Lotes de documentos enviam ao provedor apenas os textos novos
+def test_embed_documents_only_missing():
+    inner = RecordingEmbeddings()
+    cache = CachedEmbeddings(inner)
+
+    first = cache.embed_documents(["a", "bb"])
+    second = cache.embed_documents(["bb", "ccc", "a"])
+    assert first == [[1.0, 0.0], [2.0, 0.0]]
+    assert second == [[2.0, 0.0], [3.0, 0.0], [1.0, 0.0]]
+    assert inner.batches == [["a", "bb"], ["ccc"]]
+
+    sem_docs = CachedEmbeddings(inner, cache_documents=False)
+    sem_docs.embed_documents(["a"])
+    assert inner.batches[-1] == ["a"]
@@ -48,6 +48,8 @@ def test_run_adhoc(monkeypatch):
     assert len(results) == 2
     assert all(r.execution_id == exec_row.id for r in results)
     assert len(llm.prompts) == 2
+    # Os textos são lidos um a um e não ficam retidos no cache de contratos
+    assert db.contract_cache.stats()["size"] == 0
 
 
 def test_run_registered(monkeypatch):
@@ -73,3 +75,51 @@ def test_run_registered(monkeypatch):
     assert len(results) == 2
     assert len(llm.prompts) == 2
 
+
+
+# Com ``since_seq`` apenas contratos alterados são processados
+def test_run_since_seq(monkeypatch):
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.add_contract_structured(contrato="C1")
+    db.add_contract_structured(contrato="C2")
+    seq = db.last_change_seq()
+    db.add_contract_structured(contrato="C3")
+
+    llm = DummyLLM()
+    monkeypatch.setattr(execution_mod, "get_chat_model", lambda model="x": llm)
+
+    proc = ExhaustiveProcessor(object(), db)
+    asyncio.run(proc.run(prompt="Oi?", since_seq=seq))
+
+    assert len(llm.prompts) == 1
+    assert "contrato: C3" in llm.prompts[0]
+
+
+# Contratos excluídos durante a execução são ignorados
+def test_run_skips_contract_deleted_midway(monkeypatch):
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.add_contract_structured(contrato="C1")
+    db.add_contract_structured(contrato="C2")
+
+    class DeletingLLM(DummyLLM):
+        async def ainvoke(self, text: str) -> str:
+            session = db._Session()
+            session.query(Contract).filter_by(contrato="C2").delete()
+            session.commit()
+            session.close()
+            return self.predict(text)
+
+    llm = DeletingLLM()
+    monkeypatch.setattr(execution_mod, "get_chat_model", lambda model="x": llm)
+
+    proc = ExhaustiveProcessor(object(), db, max_concurrent=1)
+    asyncio.run(proc.run(prompt="Oi?"))
+
+    session = db._Session()
+    exec_row = session.query(Execution).first()
+    results = session.query(ExecutionResult).all()
+    session.close()
+    assert exec_row.status == "success"
+    assert exec_row.progress == 100.0
+    assert len(results) == 1
+    assert len(llm.prompts) == 1
@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.integrations.local_embeddings import HashingEmbeddings
+
+
+# Vetores são determinísticos, normalizados e refletem o vocabulário
+def test_hashing_embeddings_similarity():
+    emb = HashingEmbeddings(dim=256)
+    docs = emb.embed_documents(
+        [
+            "Cláusula de reajuste anual pelo IPCA",
+            "Prazo de vigência de sessenta meses",
+            "",
+        ]
+    )
+    assert docs == HashingEmbeddings(dim=256).embed_documents(
+        [
+            "Cláusula de reajuste anual pelo IPCA",
+            "Prazo de vigência de sessenta meses",
+            "",
+        ]
+    )
+    matrix = np.asarray(docs, dtype=np.float32)
+    assert matrix.shape == (3, 256)
+    assert np.allclose(np.linalg.norm(matrix[:2], axis=1), 1.0)
+    assert not matrix[2].any()
+
+    # Acentos e caixa não alteram os termos
+    query = np.asarray(emb.embed_query("clausula de REAJUSTE"), dtype=np.float32)
+    scores = matrix[:2] @ query
+    assert scores[0] > scores[1]
@@ -0,0 +1,95 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.storage.numpy_index import NumpyVectorIndex
+from app.storage.vector_filters import chroma_where
+
+
+# Vetores aleatórios com metadados alternando moeda e prazo crescente
+def _dados(n=60, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    ids = [f"doc:{i}" for i in range(n)]
+    texts = [f"trecho {i}" for i in range(n)]
+    metadatas = [
+        {"moeda": "USD" if i % 2 else "BRL", "fimPrazo": 20240101 + i} for i in range(n)
+    ]
+    return vectors, ids, texts, metadatas
+
+
+# A busca exata coincide com a força bruta e respeita os filtros
+def test_search_matches_brute_force_with_filters(tmp_path):
+    vectors, ids, texts, metadatas = _dados()
+    index = NumpyVectorIndex(str(tmp_path), flush_rows=16)
+    for i in range(0, len(ids), 10):
+        part = slice(i, i + 10)
+        index.add_vectors(ids[part], vectors[part], texts[part], metadatas[part])
+
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[:3] + 0.1
+    expected = np.argsort(-(queries @ normed.T), axis=1)[:, :5]
+    results = index.search(queries, k=5)
+    assert [[h[1] for h in hits] for hits in results] == [
+        [ids[i] for i in row] for row in expected
+    ]
+
+    where = chroma_where({"moeda": "USD", "fimPrazoAte": "2024-01-20"})
+    response = index.query([queries[0].tolist()], n_results=50, where=where)
+    assert response["ids"][0]
+    assert all(
+        m["moeda"] == "USD" and m["fimPrazo"] <= 20240120
+        for m in response["metadatas"][0]
+    )
+    assert len(response["ids"][0]) == 10
+    assert response["distances"][0] == sorted(response["distances"][0])
+
+
+# Substituições e exclusões sobrevivem à reabertura e à compactação
+def test_upsert_delete_reload_and_compact(tmp_path):
+    vectors, ids, texts, metadatas = _dados(n=30)
+    index = NumpyVectorIndex(str(tmp_path), dtype="float16", flush_rows=8, max_segments=100)
+    index.add_vectors(ids, vectors, texts, metadatas)
+    index.add_vectors(["doc:1"], vectors[2:3], ["novo"], [{"moeda": "EUR"}])
+    index.delete(["doc:3"])
+    index.persist()
+
+    reopened = NumpyVectorIndex(str(tmp_path))
+    assert reopened.dtype == np.float16
+    assert isinstance(reopened._segments[0].vectors, np.memmap)
+    assert len(reopened) == 29
+    hits = reopened.search(vectors[3], k=1, where=chroma_where({"moeda": "EUR"}))[0]
+    assert [h[1:3] for h in hits] == [("doc:1", "novo")]
+    assert "doc:3" not in {h[1] for h in reopened.search(vectors[3], k=30)[0]}
+
+    reopened.compact()
+    assert reopened.stats()["segments"] == 1
+    assert reopened.stats()["stored_rows"] == 29
+    assert len(list(tmp_path.glob("seg-*.npy"))) == 1
+    assert len(NumpyVectorIndex(str(tmp_path))) == 29
+
+
+# Segmentos demais disparam a compactação automática
+def test_automatic_compaction(tmp_path):
+    vectors, ids, texts, metadatas = _dados(n=20)
+    index = NumpyVectorIndex(str(tmp_path), max_segments=3)
+    for i in range(len(ids)):
+        part = slice(i, i + 1)
+        index.add_vectors(ids[part], vectors[part], texts[part], metadatas[part])
+        index.persist()
+    assert index.stats()["segments"] <= 3
+    assert len(index) == 20
+
+
+# Dimensões inconsistentes são rejeitadas
+def test_dimension_mismatch(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path))
+    index.add_vectors(["a"], [[1.0, 0.0]], ["a"])
+    with pytest.raises(ValueError):
+        index.add_vectors(["b"], [[1.0, 0.0, 0.0]], ["b"])
@@ -106,3 +106,55 @@ def test_fallback_when_vpn_disabled(monkeypatch):
 
     assert not isinstance(chat, DummyAzureChat)
     assert not isinstance(emb, DummyAzureEmb)
+
+
+def test_key_and_http_client_are_reused(monkeypatch, tmp_path):
+    """Lê a configuração uma vez e compartilha o cliente HTTP entre modelos."""
+    config = tmp_path / "config.ini"
+    config.write_text("[OPENAI]\nOPENAI_API_KEY = segredo\n")
+    monkeypatch.setenv("VPN_MODE", "1")
+    monkeypatch.setattr(openai_provider, "_CONFIG_FILE", config)
+    monkeypatch.setattr(openai_provider, "_CERT_PATH", Path(__file__))
+    monkeypatch.setattr(openai_provider, "Client", DummyClient)
+    monkeypatch.setattr(openai_provider, "_http_clients", {})
+    monkeypatch.setattr(openai_provider, "_key_cache", {})
+
+    leituras = []
+    original_read = openai_provider.ConfigParser.read
+
+    def counting_read(self, *args, **kwargs):
+        leituras.append(args)
+        return original_read(self, *args, **kwargs)
+
+    monkeypatch.setattr(openai_provider.ConfigParser, "read", counting_read)
+
+    captured = []
+
+    class CapturingAzureChat:
+        def __init__(self, *args, **kwargs):
+            captured.append(kwargs)
+
+    monkeypatch.setattr(openai_provider, "AzureChatOpenAI", CapturingAzureChat)
+
+    openai_provider.get_chat_model("m1")
+    openai_provider.get_chat_model("m2")
+
+    assert len(leituras) == 1
+    assert captured[0]["openai_api_key"] == "segredo"
+    assert captured[0]["http_client"] is captured[1]["http_client"]
+
+
+def test_embedding_backend_registry(monkeypatch):
+    """Seleciona o backend pela variável de ambiente ou pelo parâmetro."""
+    monkeypatch.setenv("EMBEDDING_BACKEND", "hashing")
+    monkeypatch.setenv("EMBEDDING_DIM", "64")
+    emb = openai_provider.get_embeddings()
+    assert isinstance(emb, openai_provider.HashingEmbeddings)
+    assert len(emb.embed_query("contrato")) == 64
+
+    openai_provider.register_embedding_backend("fixo", lambda model: ("fixo", model))
+    assert openai_provider.get_embeddings("m", backend="fixo") == ("fixo", "m")
+    monkeypatch.delitem(openai_provider._EMBEDDING_BACKENDS, "fixo")
+
+    with pytest.raises(ValueError):
+        openai_provider.get_embeddings(backend="inexistente")
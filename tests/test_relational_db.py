@@ -2,14 +2,20 @@ from datetime import datetime
 import sys
 from pathlib import Path
 
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
 # Permite importar módulos da aplicação durante os testes
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from app.storage.relational_db_adapter import (
+    Answer,
     Contract,
     Execution,
+    ExecutionResult,
     Prompt,
     RelationalDBAdapter,
 )
@@ -167,3 +173,490 @@ def test_prompt_crud_operations():
     count = session.query(Prompt).count()
     session.close()
     assert count == 0
+
+
+# Verifica projeção que adia as colunas volumosas
+def test_contract_heavy_columns_are_deferred():
+    """Lista contratos sem ler texto completo, embedding e linhas."""
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.add_contract_structured(contrato="C1", moeda="BRL", texto_completo="x" * 100)
+    db.add_contract_structured(contrato="C2", moeda="USD")
+
+    rows = db.list_contracts(fields=["contrato", "moeda"], order_by="contrato")
+    assert [r.contrato for r in rows] == ["C1", "C2"]
+    assert "texto_completo" in inspect(rows[0]).unloaded
+    assert "name" in inspect(rows[0]).unloaded
+
+    full = db.get_contract_by_contrato("C1")
+    assert full.texto_completo == "x" * 100
+    assert db.count_contracts() == 2
+
+    with pytest.raises(ValueError):
+        db.list_contracts(fields=["inexistente"])
+    with pytest.raises(ValueError):
+        db.list_contracts(order_by="inexistente")
+    rows = db.list_contracts(fields=["contrato"], order_by="-contrato")
+    assert [r.contrato for r in rows] == ["C2", "C1"]
+
+
+# Confere gravação binária dos embeddings e migração do JSON legado
+def test_embeddings_stored_as_float32_blobs(tmp_path):
+    """Migra vetores JSON existentes e lê arrays float32."""
+    db_url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    db = RelationalDBAdapter(db_url=db_url)
+    db.add_contract_structured(contrato="C1", vetor_embedding=[1.0, 0.0, 0.5])
+
+    # Simula linhas antigas gravadas como texto JSON, em banco sem versão
+    engine = db._engine
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO contracts (name, path, contrato, vetor_embedding) "
+                 "VALUES ('C2', 'C2', 'C2', '[0.25, 0.5, 0.75]')")
+        )
+        conn.execute(
+            text("INSERT INTO contracts (name, path, contrato, vetor_embedding) "
+                 "VALUES ('C3', 'C3', 'C3', 'null')")
+        )
+        conn.exec_driver_sql("PRAGMA user_version = 0")
+
+    db = RelationalDBAdapter(db_url=db_url)
+    with engine.connect() as conn:
+        tipos = conn.execute(
+            text("SELECT DISTINCT typeof(vetor_embedding) FROM contracts")
+        ).scalars().all()
+    assert sorted(tipos) == ["blob", "null"]
+    assert db.get_contract_by_contrato("C3").vetor_embedding is None
+
+    row = db.get_contract_by_contrato("C2")
+    assert row.vetor_embedding.dtype == np.float32
+    assert np.allclose(row.vetor_embedding, [0.25, 0.5, 0.75])
+
+    ids, matrix = db.get_embedding_matrix()
+    assert len(ids) == 2
+    assert matrix.shape == (2, 3)
+
+
+# Bancos já na versão atual não repetem as migrações na inicialização
+def test_migrations_gated_by_schema_version(tmp_path, monkeypatch):
+    from app.storage import relational_db_adapter as adapter_mod
+
+    db_url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    RelationalDBAdapter(db_url=db_url)
+    with create_engine(db_url).connect() as conn:
+        versao = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    assert versao == adapter_mod.SCHEMA_VERSION
+
+    def falhar(self):
+        raise AssertionError("migração executada novamente")
+
+    monkeypatch.setattr(RelationalDBAdapter, "_migrate", falhar)
+    db = RelationalDBAdapter(db_url=db_url)
+    db.add_contract_structured(contrato="C1")
+    assert db.count_contracts() == 1
+
+
+# Exercita a busca textual e a sincronização do índice FTS5
+def test_search_contracts_fulltext():
+    """Encontra contratos por termos e acompanha alterações."""
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.add_contract_structured(
+        contrato="C1",
+        nomeFornecedor="Construtora Atlântica",
+        objetoContrato="Manutenção de dutos",
+    )
+    db.add_contract_structured(
+        contrato="C2",
+        texto_completo="CNPJ 12.345.678/0001-90, cláusula 7.2 de reajuste",
+    )
+
+    results, total = db.search_contracts("atlantica")
+    assert total == 1
+    assert results[0]["contrato"] == "C1"
+    assert "[" in results[0]["snippet"]
+
+    results, total = db.search_contracts("12.345.678/0001-90")
+    assert [r["contrato"] for r in results] == ["C2"]
+
+    assert db.search_contracts("  ") == ([], 0)
+    assert db.search_contracts("qual o contrato", any_term=True) == ([], 0)
+    assert db._fulltext_query("qual o prazo do C1?", any_term=True) == '"prazo" OR "C1"'
+
+    db.clear_contracts()
+    assert db.search_contracts("atlantica") == ([], 0)
+
+
+# Índices FTS antigos, sem as colunas atuais, são recriados na migração
+def test_fulltext_index_rebuilt_with_new_columns(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    db = RelationalDBAdapter(db_url=db_url)
+    db.add_contract_structured(contrato="4600637168", fornecedor="0030013273")
+    with db._engine.begin() as conn:
+        conn.execute(text("DROP TABLE contracts_fts"))
+        conn.execute(text("DROP VIEW contracts_fts_source"))
+        conn.execute(
+            text(
+                "CREATE VIEW contracts_fts_source AS SELECT id, objetoContrato "
+                "FROM contracts"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE VIRTUAL TABLE contracts_fts USING fts5(objetoContrato, "
+                "content='contracts_fts_source', content_rowid='id')"
+            )
+        )
+        conn.exec_driver_sql("PRAGMA user_version = 1")
+
+    db = RelationalDBAdapter(db_url=db_url)
+    assert [r["contrato"] for r in db.search_contracts("4600637168")[0]] == ["4600637168"]
+    assert db.search_contracts("0030013273")[1] == 1
+
+
+# Filtra contratos por metadados usando os índices compostos
+def test_query_contracts_filters_and_sort():
+    """Combina igualdades, intervalos e ordenação."""
+    from datetime import date
+
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.add_contract_structured(
+        contrato="C1",
+        moeda="USD",
+        fimPrazo=date(2025, 3, 1),
+        valorContratoOriginal=500,
+    )
+    db.add_contract_structured(
+        contrato="C2",
+        moeda="USD",
+        fimPrazo=date(2025, 1, 1),
+        valorContratoOriginal=900,
+    )
+    db.add_contract_structured(
+        contrato="C3",
+        moeda="BRL",
+        fimPrazo=date(2025, 2, 1),
+        valorContratoOriginal=900,
+    )
+    db.add_contract_structured(
+        contrato="C4",
+        moeda="USD",
+        fimPrazo=date(2026, 1, 1),
+        valorContratoOriginal=900,
+    )
+
+    rows = db.query_contracts(
+        moeda="USD",
+        fimPrazoAte=date(2025, 12, 31),
+        valorMin=100,
+        fields=["contrato"],
+    )
+    assert [r.contrato for r in rows] == ["C2", "C1"]
+
+    rows = db.query_contracts(sort=["-valorContratoOriginal", "contrato"])
+    assert [r.contrato for r in rows] == ["C2", "C3", "C4", "C1"]
+
+    with pytest.raises(ValueError):
+        db.query_contracts(sort=["inexistente"])
+
+    # O planejador deve usar o índice composto de moeda e fim de prazo
+    with db._engine.connect() as conn:
+        plan = conn.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT id FROM contracts "
+                "WHERE moeda = 'USD' AND fimPrazo <= '2025-12-31'"
+            )
+        ).fetchall()
+    assert "ix_contracts_moeda_fimPrazo" in " ".join(str(r) for r in plan)
+
+
+# Verifica os agregados mantidos pelos gatilhos de contract_stats
+def test_contract_stats_incremental():
+    """Soma inserções, subtrai exclusões e normaliza valores em BRL."""
+    from datetime import date
+
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.set_exchange_rates({"USD": 5.0})
+    db.add_contract_structured(
+        contrato="C1", moeda="USD", taxaCambio=1.0, valorContratoOriginal=100,
+        fimPrazo=date(2025, 3, 10), empresa="1000",
+    )
+    db.add_contract_structured(
+        contrato="C2", moeda="BRL", taxaCambio=1.0, valorContratoOriginal=300,
+        fimPrazo=date(2025, 3, 20), empresa="1000",
+    )
+
+    assert db.get_contract_by_contrato("C1").valorBRL == 500.0
+    stats = db.get_contract_stats()
+    moedas = {s["chave"]: s for s in stats["moeda"]}
+    assert moedas["USD"]["valorOriginal"] == 100
+    assert moedas["USD"]["valorBRL"] == 500
+    assert stats["empresa"] == [
+        {"chave": "1000", "quantidade": 2, "valorOriginal": 400.0, "valorBRL": 800.0}
+    ]
+    assert stats["vencimento"][0]["chave"] == "2025-03"
+
+    db.clear_contracts()
+    assert all(v == [] for v in db.get_contract_stats().values())
+
+
+# valorBRL usa a taxa para USD do CSV e acompanha cotações e alterações
+def test_valor_brl_follows_rates_and_updates(monkeypatch):
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.add_contracts_structured(
+        [
+            {"contrato": "S1", "moeda": "SGD", "taxaCambio": 0.7855,
+             "valorContratoOriginal": 1000, "valorBRL": 1.0},
+            {"contrato": "B1", "moeda": "BRL", "taxaCambio": 1.0,
+             "valorContratoOriginal": 200},
+        ]
+    )
+    # Sem cotação do dólar não há como converter o valor em SGD
+    assert db.get_contract_by_contrato("S1").valorBRL is None
+    assert db.get_contract_by_contrato("B1").valorBRL == 200.0
+
+    assert db.set_exchange_rates({"USD": 5.0}) == 1
+    assert db.set_exchange_rates({"USD": 5.0}) == 0
+    assert db.get_contract_by_contrato("S1").valorBRL == pytest.approx(3927.5)
+    moedas = {s["chave"]: s for s in db.get_contract_stats()["moeda"]}
+    assert moedas["SGD"]["valorBRL"] == pytest.approx(3927.5)
+
+    # Cotação direta da moeda tem precedência sobre a conversão via dólar
+    db.set_exchange_rates({"SGD": 4.0})
+    assert db.get_contract_by_contrato("S1").valorBRL == 4000.0
+
+    seq = db.changes_since(0)[-1].seq
+    with db._engine.begin() as conn:
+        conn.execute(
+            text("UPDATE contracts SET valorContratoOriginal = 10 WHERE contrato = 'S1'")
+        )
+        conn.execute(text("UPDATE contracts SET moeda = 'USD' WHERE contrato = 'B1'"))
+    assert db.get_contract_by_contrato("S1").valorBRL == 40.0
+    assert db.get_contract_by_contrato("B1").valorBRL == 1000.0
+    moedas = {s["chave"]: s for s in db.get_contract_stats()["moeda"]}
+    assert moedas["SGD"]["valorBRL"] == 40.0
+    assert moedas["USD"]["valorBRL"] == 1000.0
+    assert "BRL" not in moedas
+    # O recálculo derivado não gera registros extras no log de alterações
+    assert [c.operacao for c in db.changes_since(seq)] == [
+        "update",
+        "update",
+    ]
+
+    # Recalcular valorBRL não descomprime o texto dos contratos
+    from app.storage import relational_db_adapter as adapter_mod
+
+    descompressoes = []
+    original = adapter_mod.decompress_text
+
+    def contar(value, dictionaries=None):
+        descompressoes.append(value)
+        return original(value, dictionaries)
+
+    monkeypatch.setattr(adapter_mod, "decompress_text", contar)
+    assert db.set_exchange_rates({"USD": 6.0}) == 1
+    assert descompressoes == []
+    assert [c.operacao for c in db.changes_since(seq)] == ["update", "update"]
+
+    with pytest.raises(ValueError):
+        db.set_exchange_rates({"EUR": 0})
+
+
+# Migra banco antigo sem a coluna valorBRL e sem agregados
+def test_stats_backfilled_for_existing_database(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'old.sqlite'}"
+    engine = create_engine(db_url)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE contracts (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+                "path VARCHAR NOT NULL, contrato VARCHAR, moeda VARCHAR, "
+                "valorContratoOriginal NUMERIC, taxaCambio FLOAT)"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO contracts (name, path, contrato, moeda, "
+                "valorContratoOriginal, taxaCambio) VALUES ('C1', 'C1', 'C1', 'EUR', 10, 1.2)"
+            )
+        )
+
+    db = RelationalDBAdapter(db_url=db_url)
+    assert db.get_contract_by_contrato("C1").valorBRL is None
+    assert db.get_contract_stats()["moeda"][0]["quantidade"] == 1
+    db.set_exchange_rates({"USD": 5.0})
+    assert db.get_contract_by_contrato("C1").valorBRL == pytest.approx(60.0)
+    assert db.get_contract_stats()["moeda"][0]["valorBRL"] == pytest.approx(60.0)
+
+
+# Verifica compressão transparente do texto completo
+def test_texto_completo_compressed_and_searchable(tmp_path):
+    """Grava BLOB comprimido, migra texto puro e mantém a busca textual."""
+    db_url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    db = RelationalDBAdapter(db_url=db_url)
+    corpus = [
+        f"CONTRATO {i}. CLÁUSULA PRIMEIRA - DO OBJETO: prestação de serviços de "
+        f"manutenção da unidade {i}. CLÁUSULA SEGUNDA - DO PREÇO: reajuste anual "
+        f"pelo IPCA conforme proposta {i * 7}." * 3
+        for i in range(300)
+    ]
+    db.add_contracts_structured(
+        {"contrato": f"C{i}", "texto_completo": t} for i, t in enumerate(corpus)
+    )
+    with db._engine.begin() as conn:
+        conn.execute(
+            text("UPDATE contracts SET texto_completo = 'texto antigo' WHERE id = 1")
+        )
+        conn.exec_driver_sql("PRAGMA user_version = 0")
+        tipo = conn.execute(
+            text("SELECT typeof(texto_completo) FROM contracts WHERE id = 2")
+        ).scalar()
+    assert tipo == "blob"
+
+    # Nova instância migra a linha em texto puro
+    db = RelationalDBAdapter(db_url=db_url)
+    assert db.get_contract(1).texto_completo == "texto antigo"
+    with db._engine.connect() as conn:
+        tipos = conn.execute(
+            text("SELECT DISTINCT typeof(texto_completo) FROM contracts")
+        ).scalars().all()
+    assert tipos == ["blob"]
+
+    dict_id = db.train_text_dictionary(dict_size=8 * 1024)
+    assert dict_id is not None
+    assert db.compress_texts(recompress=True) == 300
+    assert db.get_contract_by_contrato("C42").texto_completo == corpus[42]
+
+    # Gatilhos e visão do FTS descomprimem o texto para indexação e trechos
+    results, total = db.search_contracts("proposta 294")
+    assert total == 2
+    assert {r["contrato"] for r in results} == {"C42", "C294"}
+    assert all("[" in r["snippet"] for r in results)
+
+
+# Dicionário treinado em um banco não é usado para gravar em outro
+def test_text_dictionaries_are_per_database(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    corpus = [
+        f"CLÁUSULA {i} - DO REAJUSTE: o preço será reajustado pelo IPCA, "
+        f"conforme a proposta {i * 13} da contratada." * 4
+        for i in range(300)
+    ]
+    treinado = RelationalDBAdapter(db_url=f"sqlite:///{tmp_path / 'a.sqlite'}")
+    treinado.add_contracts_structured(
+        {"contrato": f"A{i}", "texto_completo": t} for i, t in enumerate(corpus)
+    )
+    assert treinado.train_text_dictionary(dict_size=8 * 1024) is not None
+
+    url = f"sqlite:///{tmp_path / 'b.sqlite'}"
+    outro = RelationalDBAdapter(db_url=url)
+    outro.add_contract_structured(contrato="B1", texto_completo=corpus[7])
+    treinado.add_contract_structured(contrato="A-novo", texto_completo=corpus[7])
+
+    with outro._engine.connect() as conn:
+        blob = conn.execute(text("SELECT texto_completo FROM contracts")).scalar()
+    assert zstandard.get_frame_parameters(blob[1:]).dict_id == 0
+    # Um processo novo lê o banco sem conhecer o dicionário do outro
+    assert RelationalDBAdapter(db_url=url).get_contract_by_contrato(
+        "B1"
+    ).texto_completo == corpus[7]
+    assert outro.search_contracts("proposta 91")[1] == 1
+    assert treinado.get_contract_by_contrato("A-novo").texto_completo == corpus[7]
+
+
+# Respostas idênticas são gravadas uma única vez e ``changed`` marca diferenças
+def test_execution_answers_deduplicated_with_changed_flag():
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.add_contract_structured(contrato="C1")
+    db.add_contract_structured(contrato="C2")
+    pid = db.add_prompt(nome="p", texto="T")
+
+    def run(respostas):
+        exec_id = db.create_execution("prompt_execution", "X", prompt_id=pid)
+        for contract_id, resposta in respostas.items():
+            db.add_execution_result(exec_id, contract_id, resposta, resposta[:3])
+        return exec_id
+
+    first = run({1: "sim, vigente", 2: "não"})
+    second = run({1: "sim, vigente", 2: "sim, renovado"})
+    # Execução ad-hoc não é comparada com as do prompt cadastrado
+    adhoc = db.create_execution("prompt_execution", "X", prompt_text="T")
+    db.add_execution_result(adhoc, 1, "sim, vigente", "sim")
+
+    assert [r.contract_id for r in db.get_execution_changes(first)] == [1, 2]
+    changes = db.get_execution_changes(second)
+    assert [r.contract_id for r in changes] == [2]
+    assert changes[0].resposta_completa == "sim, renovado"
+    assert len(db.get_execution_changes(adhoc)) == 1
+
+    session = db._Session()
+    assert session.query(Answer).count() == 3
+    session.close()
+
+
+# Respostas antigas gravadas na própria linha migram para ``answers``
+def test_legacy_answers_migrated(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'db.sqlite'}"
+    db = RelationalDBAdapter(db_url=db_url)
+    exec_id = db.create_execution("prompt_execution", "X", prompt_text="T")
+    with db._engine.begin() as conn:
+        for contract_id in (1, 2):
+            conn.execute(
+                text(
+                    "INSERT INTO execution_results "
+                    "(execution_id, contract_id, resposta_completa) "
+                    "VALUES (:e, :c, 'mesma resposta')"
+                ),
+                {"e": exec_id, "c": contract_id},
+            )
+        conn.exec_driver_sql("PRAGMA user_version = 0")
+
+    db = RelationalDBAdapter(db_url=db_url)
+    with db._engine.connect() as conn:
+        legado = conn.execute(
+            text(
+                "SELECT count(*) FROM execution_results "
+                "WHERE resposta_completa IS NOT NULL"
+            )
+        ).scalar()
+        answers = conn.execute(text("SELECT count(*) FROM answers")).scalar()
+    assert (legado, answers) == (0, 1)
+    session = db._Session()
+    rows = session.query(ExecutionResult).all()
+    session.close()
+    assert [r.resposta_completa for r in rows] == ["mesma resposta"] * 2
+
+    # Sem resultados apontando para ela, a resposta é removida
+    with db._engine.begin() as conn:
+        conn.execute(text("DELETE FROM execution_results"))
+    assert db.prune_answers() == 1
+
+
+# Inserções, alterações reais e exclusões geram registros sequenciais
+def test_contract_change_log_and_offsets():
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.add_contract_structured(contrato="C1", texto_completo="texto")
+    db.add_contract_structured(contrato="C2")
+    with db._engine.begin() as conn:
+        # Recompressão e embedding não alteram o conteúdo do contrato
+        conn.execute(text("UPDATE contracts SET vetor_embedding = x'00000000'"))
+        conn.execute(text("UPDATE contracts SET moeda = 'USD' WHERE id = 2"))
+    db.compress_texts(recompress=True)
+    db.clear_contracts()
+
+    changes = db.changes_since(0)
+    assert [(c.contract_id, c.operacao) for c in changes] == [
+        (1, "insert"),
+        (2, "insert"),
+        (2, "update"),
+        (1, "delete"),
+        (2, "delete"),
+    ]
+    assert [c.seq for c in changes] == sorted(c.seq for c in changes)
+    assert db.last_change_seq() == changes[-1].seq
+    assert [c.operacao for c in db.changes_since(changes[2].seq, limit=1)] == [
+        "delete"
+    ]
+
+    assert db.get_consumer_offset("teste") == 0
+    db.set_consumer_offset("teste", 3)
+    db.set_consumer_offset("teste", 4)
+    assert db.get_consumer_offset("teste") == 4
@@ -0,0 +1,105 @@
+import gzip
+import json
+import secrets
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import text
+
+from app.processing.retention import ExecutionRetentionJob
+from app.storage.relational_db_adapter import (
+    RelationalDBAdapter,
+    Execution,
+    ExecutionResult,
+)
+
+
+# Cria ``runs`` execuções concluídas de um prompt com um resultado cada
+def _criar_execucoes(db, prompt_id, runs):
+    ids = []
+    for i in range(runs):
+        exec_id = db.create_execution(
+            "prompt_execution", "ExhaustiveProcessor", prompt_id=prompt_id
+        )
+        # Texto aleatório para que a compressão não esconda o volume gravado
+        resposta = secrets.token_hex(2000) + str(i)
+        db.add_execution_result(exec_id, None, resposta, "ok")
+        db.update_execution(exec_id, status="success")
+        ids.append(exec_id)
+    return ids
+
+
+# Arquiva execuções além do limite e restaura sob demanda
+def test_archive_and_restore(tmp_path):
+    db = RelationalDBAdapter(db_url=f"sqlite:///{tmp_path / 'db.sqlite'}")
+    p1 = db.add_prompt(nome="p1", texto="T1")
+    p2 = db.add_prompt(nome="p2", texto="T2")
+    ids1 = _criar_execucoes(db, p1, 4)
+    _criar_execucoes(db, p2, 1)
+
+    assert db.executions_beyond_retention(2) == ids1[:2]
+
+    path = db.archive_execution(ids1[0], str(tmp_path / "arq"))
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        payload = json.load(f)
+    assert payload["results"][0]["resposta_simples"] == "ok"
+    assert db.get_execution(ids1[0]).archive_path == path
+    assert db.archive_execution(ids1[0], str(tmp_path / "arq")) is None
+    assert db.executions_beyond_retention(2) == [ids1[1]]
+
+    assert db.restore_execution(ids1[0]) == 1
+    assert not Path(path).exists()
+    session = db._Session()
+    restored = session.query(ExecutionResult).filter_by(execution_id=ids1[0]).all()
+    session.close()
+    assert restored[0].resposta_completa.endswith("0")
+
+
+# A rotina de manutenção é registrada como execução e libera espaço
+def test_retention_job_compacts(tmp_path):
+    db_file = tmp_path / "db.sqlite"
+    db = RelationalDBAdapter(db_url=f"sqlite:///{db_file}")
+    with db._engine.connect() as conn:
+        assert conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2
+    pid = db.add_prompt(nome="p", texto="T")
+    ids = _criar_execucoes(db, pid, 30)
+    size_before = db_file.stat().st_size
+
+    job = ExecutionRetentionJob(db, keep_last=1, archive_dir=str(tmp_path / "arq"))
+    exec_id = job.run()
+
+    row = db.get_execution(exec_id)
+    assert row.task_name == "execution_compaction"
+    assert row.status == "success"
+    assert "29 execuções arquivadas" in row.message
+    session = db._Session()
+    remaining = session.query(ExecutionResult.execution_id).all()
+    archived = session.query(Execution).filter(Execution.archive_path.isnot(None))
+    assert [r[0] for r in remaining] == [ids[-1]]
+    assert archived.count() == 29
+    session.close()
+    assert db_file.stat().st_size < size_before
+
+
+# ``compact`` devolve todas as páginas livres, não apenas uma
+def test_compact_releases_every_free_page(tmp_path):
+    db = RelationalDBAdapter(db_url=f"sqlite:///{tmp_path / 'db.sqlite'}")
+    with db._engine.begin() as conn:
+        conn.execute(text("CREATE TABLE rascunho (dados BLOB)"))
+        for _ in range(20):
+            conn.execute(
+                text("INSERT INTO rascunho VALUES (:d)"), {"d": secrets.token_bytes(8000)}
+            )
+        conn.execute(text("DROP TABLE rascunho"))
+    with db._engine.connect() as conn:
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+        livres = conn.execute(text("PRAGMA freelist_count")).scalar()
+    assert livres > 1
+
+    assert db.compact() == livres * page_size
+    with db._engine.connect() as conn:
+        assert conn.execute(text("PRAGMA freelist_count")).scalar() == 0
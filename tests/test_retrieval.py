@@ -0,0 +1,107 @@
+import asyncio
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Stubs leves para os módulos do langchain importados pelo pacote de chat
+langchain_stub = types.ModuleType("langchain")
+langchain_stub.embeddings = types.ModuleType("langchain.embeddings")
+langchain_stub.embeddings.OpenAIEmbeddings = object
+langchain_stub.chat_models = types.ModuleType("langchain.chat_models")
+langchain_stub.chat_models.ChatOpenAI = object
+langchain_stub.chains = types.ModuleType("langchain.chains")
+langchain_stub.chains.RetrievalQA = object
+sys.modules.setdefault("langchain", langchain_stub)
+sys.modules.setdefault("langchain.embeddings", langchain_stub.embeddings)
+sys.modules.setdefault("langchain.chat_models", langchain_stub.chat_models)
+sys.modules.setdefault("langchain.chains", langchain_stub.chains)
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.chat.retrieval import (
+    HybridRetriever,
+    LexicalContractRetriever,
+    reciprocal_rank_fusion,
+)
+from app.storage.relational_db_adapter import RelationalDBAdapter
+
+
+# Recuperador fixo que devolve sempre as mesmas fontes
+class StaticRetriever(BaseRetriever):
+    sources: list[str]
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return [Document(page_content=s, metadata={"source": s}) for s in self.sources]
+
+
+# Confere a ordem produzida pelo RRF
+def test_reciprocal_rank_fusion_orders_by_combined_rank():
+    a = [Document(page_content=s, metadata={"source": s}) for s in ["x", "y", "z"]]
+    b = [Document(page_content=s, metadata={"source": s}) for s in ["y", "w"]]
+    fused = reciprocal_rank_fusion([a, b], k=60)
+    assert [d.metadata["source"] for d, _ in fused] == ["y", "x", "w", "z"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
+
+
+# Pontuações de cada busca ficam em chaves próprias após a fusão
+def test_fusion_keeps_scores_of_each_retriever():
+    vetorial = [
+        Document(page_content="trecho", metadata={"source": "c1.pdf", "score": 0.8}),
+        Document(page_content="outro", metadata={"source": "c2.pdf", "score": 0.7}),
+    ]
+    lexical = [
+        Document(page_content="ficha", metadata={"source": "c1.pdf", "bm25_score": 12.5})
+    ]
+    fused = reciprocal_rank_fusion([vetorial, lexical])
+    doc, _ = fused[0]
+    assert doc.page_content == "trecho"
+    assert doc.metadata == {"source": "c1.pdf", "score": 0.8, "bm25_score": 12.5}
+    assert "bm25_score" not in fused[1][0].metadata
+    # Os documentos originais não são alterados
+    assert vetorial[0].metadata == {"source": "c1.pdf", "score": 0.8}
+
+
+# Verifica fusão e registro de latência nas versões síncrona e assíncrona
+def test_hybrid_retriever_fuses_and_records_latency():
+    hybrid = HybridRetriever(
+        retrievers={
+            "vector": StaticRetriever(sources=["a", "b", "c"]),
+            "lexical": StaticRetriever(sources=["c", "d"]),
+        },
+        k=2,
+    )
+    docs = hybrid.invoke("pergunta")
+    assert [d.metadata["source"] for d in docs] == ["c", "a"]
+    assert "rrf_score" in docs[0].metadata
+    assert set(hybrid.latencies) == {"vector", "lexical"}
+
+    docs = asyncio.run(hybrid.ainvoke("pergunta"))
+    assert [d.metadata["source"] for d in docs] == ["c", "a"]
+
+
+# Recupera contratos pelo índice lexical do banco
+def test_lexical_retriever_returns_contract_documents():
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.add_contract_structured(contrato="4600637168", nomeFornecedor="Navegação Sul")
+    db.add_contract_structured(contrato="4600000001", nomeFornecedor="Outro")
+
+    docs = LexicalContractRetriever(db=db).invoke("navegacao")
+    assert len(docs) == 1
+    assert docs[0].metadata["contrato"] == "4600637168"
+    assert "contrato: 4600637168" in docs[0].page_content
+    # BM25 não se mistura com a similaridade cosseno da busca vetorial
+    assert docs[0].metadata["bm25_score"] > 0
+    assert "score" not in docs[0].metadata
+
+    # Perguntas completas casam por qualquer termo relevante, inclusive o número
+    for pergunta in (
+        "qual o fornecedor do contrato 4600637168?",
+        "contratos da Navegação Sul",
+    ):
+        docs = LexicalContractRetriever(db=db).invoke(pergunta)
+        assert [d.metadata["contrato"] for d in docs] == ["4600637168"]
@@ -0,0 +1,94 @@
+import asyncio
+import sys
+import types
+from datetime import date
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Stubs leves para os módulos do langchain importados pelo pacote de chat
+langchain_stub = types.ModuleType("langchain")
+langchain_stub.embeddings = types.ModuleType("langchain.embeddings")
+langchain_stub.embeddings.OpenAIEmbeddings = object
+langchain_stub.chat_models = types.ModuleType("langchain.chat_models")
+langchain_stub.chat_models.ChatOpenAI = object
+sys.modules.setdefault("langchain", langchain_stub)
+sys.modules.setdefault("langchain.embeddings", langchain_stub.embeddings)
+sys.modules.setdefault("langchain.chat_models", langchain_stub.chat_models)
+
+import app.chat.chatbot as chatbot_mod
+from app.chat.chatbot import ContractChatbot
+from app.chat.router import QueryRouter
+from app.storage.relational_db_adapter import RelationalDBAdapter
+
+
+def _db(tmp_path):
+    db = RelationalDBAdapter(db_url=f"sqlite:///{tmp_path / 'db.sqlite'}")
+    db.add_contract_structured(
+        contrato="4600637168",
+        valorContratoOriginal=1234567.5,
+        moeda="BRL",
+        fimPrazo=date(2026, 3, 31),
+        nomeGerenteContrato="Maria Souza",
+        objetoContrato="Afretamento de embarcação",
+    )
+    return db
+
+
+# Números de contrato e intenções são extraídos da pergunta
+def test_detects_contract_numbers_and_intents():
+    pergunta = "Qual o valor e a data de vencimento do contrato 4600637168?"
+    assert QueryRouter.contract_numbers(pergunta) == ["4600637168"]
+    assert QueryRouter.contract_numbers("e o contrato C42?") == ["C42"]
+    campos = QueryRouter.intent_fields(pergunta)
+    assert campos[:2] == ["valorContratoOriginal", "moeda"]
+    assert "fimPrazo" in campos
+
+
+# Perguntas cadastrais são respondidas pelo banco e as abertas vão ao RAG
+def test_route_answers_metadata_questions(tmp_path):
+    router = QueryRouter(_db(tmp_path))
+
+    answer, sources = router.route("Quando termina o contrato 4600637168?")
+    assert answer == "Contrato 4600637168 — fim do prazo: 31/03/2026."
+    assert sources[0]["contrato"] == "4600637168"
+
+    answer, _ = router.route("Quem é o gerente do contrato 4600637168?")
+    assert "gerente: Maria Souza" in answer
+    answer, _ = router.route("valor do contrato 4600637168")
+    assert "valor original: 1.234.567,50" in answer
+    answer, _ = router.route("dados do contrato 4600637168")
+    assert "objetoContrato: Afretamento de embarcação" in answer
+
+    assert router.route("Explique a cláusula de reajuste do contrato 4600637168") is None
+    assert router.route("Quais contratos têm multa por atraso?") is None
+    assert router.route("Qual o valor do contrato 9999999999?") is None
+    assert router.stats() == {"questions": 7, "short_circuited": 4, "share": 4 / 7}
+
+
+# Modelo que falha se for chamado
+class FailingLLM:
+    def invoke(self, prompt):
+        raise AssertionError("o modelo não deveria ser chamado")
+
+    async def ainvoke(self, prompt):
+        self.invoke(prompt)
+
+
+# O chatbot não consulta vetor nem modelo para perguntas roteadas
+def test_chatbot_short_circuits_before_rag(monkeypatch, tmp_path):
+    monkeypatch.setattr(chatbot_mod, "get_chat_model", lambda model="x": FailingLLM())
+
+    def no_embedding(question):
+        raise AssertionError("o vetor não deveria ser consultado")
+
+    store = types.SimpleNamespace(generation=0, embed_query=no_embedding)
+    bot = ContractChatbot(store, relational_db=_db(tmp_path))
+
+    answer, _ = bot.ask("Qual a moeda do contrato 4600637168?")
+    assert answer == "Contrato 4600637168 — moeda: BRL."
+    answer, _ = asyncio.run(bot.aask("Qual a moeda do contrato 4600637168?"))
+    assert answer == "Contrato 4600637168 — moeda: BRL."
+    assert bot.router.stats()["short_circuited"] == 2
@@ -0,0 +1,212 @@
+import asyncio
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Stubs leves para os módulos do langchain importados pelo pacote de chat
+langchain_stub = types.ModuleType("langchain")
+langchain_stub.embeddings = types.ModuleType("langchain.embeddings")
+langchain_stub.embeddings.OpenAIEmbeddings = object
+langchain_stub.chat_models = types.ModuleType("langchain.chat_models")
+langchain_stub.chat_models.ChatOpenAI = object
+sys.modules.setdefault("langchain", langchain_stub)
+sys.modules.setdefault("langchain.embeddings", langchain_stub.embeddings)
+sys.modules.setdefault("langchain.chat_models", langchain_stub.chat_models)
+
+from langchain_core.documents import Document
+
+import app.chat.chatbot as chatbot_mod
+from app.chat.chatbot import ContractChatbot
+from app.chat.context import ContextPacker
+from app.chat.session import ChatSession, SessionStore
+
+
+# Contagem simples: um token por palavra
+def _palavras(text):
+    return len(text.split())
+
+
+# Relógio controlado manualmente
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# Sessões expiram por inatividade e o limite descarta a menos usada
+def test_session_store_ttl_and_lru():
+    clock = FakeClock()
+    store = SessionStore(max_size=2, ttl=10, clock=clock)
+    a = store.create()
+    a.add_turn("oi", "olá")
+    assert store.get(a.id) is a
+    assert len(a.id) == 32
+    b = store.create()
+    store.get(a.id)
+    c = store.create()  # descarta "b"
+    assert store.get(b.id) is None
+    assert store.get(a.id) is a
+    assert store.delete(c.id) and not store.delete(b.id)
+    # Ids desconhecidos ou expirados não criam sessões novas
+    assert store.get("inventado") is None
+    clock.now = 11
+    assert store.get(a.id) is None
+    assert not store.delete(a.id)
+
+
+# Trocas antigas saem do histórico até caber no orçamento
+def test_session_overflow_keeps_latest_turn():
+    session = ChatSession(id="s")
+    for i in range(4):
+        session.add_turn(f"pergunta {i}", "resposta " + "x " * 5)
+    removidas = session.overflow(_palavras, 20)
+    assert [p for p, _ in removidas] == ["pergunta 0", "pergunta 1"]
+    assert [p for p, _ in session.turns] == ["pergunta 2", "pergunta 3"]
+    # A troca mais recente nunca é descartada
+    assert [p for p, _ in session.overflow(_palavras, 1)] == ["pergunta 2"]
+    assert [p for p, _ in session.turns] == ["pergunta 3"]
+
+
+# Recuperador que registra as perguntas recebidas
+class RecordingRetriever:
+    def __init__(self):
+        self.queries = []
+
+    def invoke(self, question):
+        self.queries.append(question)
+        return [Document(page_content="trecho do contrato", metadata={"source": "a"})]
+
+    async def ainvoke(self, question):
+        return self.invoke(question)
+
+
+# Modelo que reescreve perguntas, resume o histórico e responde longamente
+class SessionLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        if prompt.endswith("Pergunta reescrita:"):
+            texto = "Qual o prazo do contrato 123?"
+        elif prompt.endswith("Resumo atualizado:"):
+            texto = "resumo " * 100
+        else:
+            texto = "resposta detalhada " * 10
+        return types.SimpleNamespace(content=texto)
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+
+def _bot(monkeypatch):
+    llm = SessionLLM()
+    monkeypatch.setattr(chatbot_mod, "get_chat_model", lambda model="x": llm)
+    async def aembed_query(question):
+        return [1.0]
+
+    store = types.SimpleNamespace(
+        generation=0, embed_query=lambda q: [1.0], aembed_query=aembed_query
+    )
+    bot = ContractChatbot(
+        store,
+        context_packer=ContextPacker(1000, count_tokens=_palavras),
+        history_tokens=60,
+        summary_tokens=30,
+    )
+    bot._retriever = RecordingRetriever()
+    bot.answer_cache.max_size = 0
+    return bot, llm
+
+
+# Perguntas de acompanhamento são reescritas e o prompt não cresce
+def test_session_rewrites_followups_and_bounds_prompt(monkeypatch):
+    bot, llm = _bot(monkeypatch)
+    session = ChatSession(id="s")
+
+    bot.ask("Qual o objeto do contrato 123?", session=session)
+    assert bot._retriever.queries == ["Qual o objeto do contrato 123?"]
+    assert len(llm.prompts) == 1
+
+    bot.ask("E o prazo?", session=session)
+    assert bot._retriever.queries[-1] == "Qual o prazo do contrato 123?"
+    assert "Usuário: Qual o objeto do contrato 123?" in llm.prompts[-1]
+
+    tamanhos = []
+    for i in range(10):
+        bot.ask(f"E a pergunta {i}?", session=session)
+        respostas = [p for p in llm.prompts if p.endswith("Resposta:")]
+        tamanhos.append(_palavras(respostas[-1]))
+    assert session.summary
+    assert _palavras(session.summary) <= 30
+    assert max(tamanhos[3:]) == min(tamanhos[3:])
+
+
+# O streaming registra a resposta completa na sessão
+def test_astream_records_turn(monkeypatch):
+    bot, llm = _bot(monkeypatch)
+
+    async def astream(prompt):
+        for token in ("prazo ", "de 12 meses"):
+            yield types.SimpleNamespace(content=token)
+
+    llm.astream = astream
+    session = ChatSession(id="s")
+
+    async def collect():
+        return [e async for e in bot.astream("Qual o prazo?", session=session)]
+
+    events = asyncio.run(collect())
+    assert events[0][0] == "sources"
+    assert session.turns == [("Qual o prazo?", "prazo de 12 meses")]
+
+
+# Perguntas simultâneas na mesma sessão são atendidas uma de cada vez
+def test_concurrent_turns_are_serialized(monkeypatch):
+    bot, llm = _bot(monkeypatch)
+    ativos = []
+    maximo = []
+
+    async def ainvoke(prompt):
+        ativos.append(prompt)
+        maximo.append(len(ativos))
+        await asyncio.sleep(0.01)
+        ativos.remove(prompt)
+        return llm.invoke(prompt)
+
+    llm.ainvoke = ainvoke
+    session = ChatSession(id="s")
+
+    async def main():
+        await asyncio.gather(
+            bot.aask("Qual o objeto do contrato 123?", session=session),
+            bot.aask("E o prazo?", session=session),
+        )
+
+    asyncio.run(main())
+    assert max(maximo) == 1
+    assert [p for p, _ in session.turns] == [
+        "Qual o objeto do contrato 123?",
+        "E o prazo?",
+    ]
+    # A segunda troca já viu a primeira no histórico e foi reescrita
+    assert bot._retriever.queries[-1] == "Qual o prazo do contrato 123?"
+
+
+# Respostas que dependem do histórico não entram no cache de respostas
+def test_answer_cache_bypassed_with_history(monkeypatch):
+    bot, llm = _bot(monkeypatch)
+    bot.answer_cache.max_size = 16
+    session = ChatSession(id="s")
+
+    bot.ask("Qual o prazo do contrato 123?", session=session)
+    assert bot.answer_cache.stats()["size"] == 1
+    bot.ask("E o prazo?", session=session)
+    assert bot.answer_cache.stats()["size"] == 1
+    assert bot.answer_cache.stats()["hits"] == 0
@@ -17,7 +17,12 @@ sys.modules.setdefault("langchain.embeddings", langchain_stub.embeddings)
 sys.modules.setdefault("langchain.vectorstores", langchain_stub.vectorstores)
 
 from app.ingestion.ingestor import ContractStructuredDataIngestor
-from app.storage.relational_db_adapter import RelationalDBAdapter, Contract, Execution
+from app.storage.relational_db_adapter import (
+    RelationalDBAdapter,
+    Contract,
+    ContractServiceLine,
+    Execution,
+)
 
 
 DATA_FILE = ROOT / "tests" / "data" / "contratos_tst.csv"
@@ -28,6 +33,14 @@ def _get_all(session):
     return session.query(Contract).order_by(Contract.contrato).all()
 
 
+def _all_rows(db):
+    """Abre sessão e devolve todos os contratos."""
+    session = db._Session()
+    rows = _get_all(session)
+    session.close()
+    return rows
+
+
 # Valida criação de registros a partir do CSV
 def test_ingest_structured_creates_records():
     """Gera registros no banco a partir do CSV."""
@@ -104,3 +117,23 @@ def test_ingest_creates_execution_record():
     assert len(exec_rows) == 1
     assert exec_rows[0].status == "success"
     assert exec_rows[0].id == exec_id
+
+
+# Confere a tabela normalizada de linhas de serviço
+def test_ingest_structured_populates_service_lines():
+    """Grava cada linha de serviço e permite filtrar contratos por item."""
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    ContractStructuredDataIngestor(DATA_FILE, db, batch_size=2).ingest()
+
+    session = db._Session()
+    lines = session.query(ContractServiceLine).all()
+    session.close()
+    total = sum(len(json.loads(r.linhasServico)) for r in _all_rows(db))
+    assert len(lines) == total
+
+    rows = list(db.query_contracts(descricaoItem="afretamento", fields=["contrato"]))
+    assert [r.contrato for r in rows] == ["4600308523"]
+
+    # ``%`` e ``_`` no filtro são literais, não curingas do LIKE
+    for prefixo in ("%", "_", "afret_mento", "\\"):
+        assert list(db.query_contracts(descricaoItem=prefixo)) == []
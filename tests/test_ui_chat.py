@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.ui import chat
+
+
+# Interpreta eventos SSE recebidos linha a linha
+def test_sse_events_parsing():
+    linhas = [
+        "event: sources",
+        'data: [{"source": "a.pdf", "score": 0.9}]',
+        "",
+        "event: token",
+        'data: "Olá"',
+        "",
+        "event: token",
+        'data: " mundo"',
+        "",
+        "event: done",
+        "data: {}",
+        "",
+    ]
+    eventos = list(chat._sse_events(linhas))
+    assert eventos == [
+        ("sources", [{"source": "a.pdf", "score": 0.9}]),
+        ("token", "Olá"),
+        ("token", " mundo"),
+        ("done", {}),
+    ]
+    assert chat._descrever_fonte(eventos[0][1][0]) == "a.pdf (pontuação 0.90)"
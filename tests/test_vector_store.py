@@ -2,6 +2,8 @@ import sys
 import types
 from pathlib import Path
 
+import pytest
+
 # Ajusta caminho para importar a aplicação
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
@@ -29,8 +31,11 @@ class DummyStore:
         self.added = []
         self.persist_called = False
 
-    def add_texts(self, texts, metadatas=None):
-        self.added.append((texts, metadatas))
+    def add_texts(self, texts, metadatas=None, ids=None):
+        self.added.append((texts, metadatas) if ids is None else (texts, metadatas, ids))
+
+    def delete(self, ids=None):
+        self.deleted = ids
 
     def persist(self):
         self.persist_called = True
@@ -81,3 +86,81 @@ def test_clear_reinitializes_store(monkeypatch, tmp_path):
     monkeypatch.setattr(vector_store_adapter, "Chroma", second_chroma)
     adapter.clear()
     assert adapter._store is second_store
+
+
+# Upsert repassa os ids ao Chroma e delete remove pelos ids
+def test_upsert_and_delete_documents(monkeypatch):
+    dummy_store = DummyStore()
+    monkeypatch.setattr(vector_store_adapter, "Chroma", lambda *a, **k: dummy_store)
+    monkeypatch.setattr(openai_provider, "get_embeddings", lambda: DummyEmbeddings())
+    adapter = vector_store_adapter.VectorStoreAdapter(persist_directory="test_db")
+
+    adapter.upsert_documents(["contract:1"], ["texto"], [{"contrato": "C1"}])
+    adapter.delete_documents(["contract:2"])
+    adapter.upsert_documents([], [])
+
+    assert dummy_store.added == [(["texto"], [{"contrato": "C1"}], ["contract:1"])]
+    assert dummy_store.deleted == ["contract:2"]
+
+
+# Com o backend NumPy o adaptador grava, busca e recarrega sem o Chroma
+def test_numpy_backend(monkeypatch, tmp_path):
+    from app.integrations.local_embeddings import HashingEmbeddings
+
+    monkeypatch.setattr(vector_store_adapter, "get_embeddings", lambda: HashingEmbeddings(64))
+    adapter = vector_store_adapter.VectorStoreAdapter(str(tmp_path), backend="numpy")
+    adapter.upsert_documents(
+        ["contract:1", "contract:2"],
+        ["reajuste anual pelo IPCA", "multa por atraso na entrega"],
+        [{"contrato": "C1", "moeda": "BRL"}, {"contrato": "C2", "moeda": "USD"}],
+    )
+    adapter.persist()
+
+    reopened = vector_store_adapter.VectorStoreAdapter(str(tmp_path), backend="numpy")
+    results = reopened.similarity_search("reajuste pelo IPCA", k=2)
+    assert [doc.metadata["contrato"] for doc, _ in results] == ["C1", "C2"]
+    assert results[0][1] > results[1][1]
+    (doc, _), = reopened.similarity_search("reajuste", k=2, where={"moeda": "USD"})
+    assert doc.page_content == "multa por atraso na entrega"
+
+    reopened.delete_documents(["contract:1"])
+    assert [d.metadata["contrato"] for d, _ in reopened.similarity_search("IPCA")] == ["C2"]
+
+
+# Metadados são regravados e documentos removidos pelo ``source``, sem reembedding
+@pytest.mark.parametrize("backend", ["numpy", "chroma"])
+def test_update_metadata_and_delete_where(monkeypatch, tmp_path, backend):
+    from app.integrations.local_embeddings import HashingEmbeddings
+
+    if backend == "chroma":
+        pytest.importorskip("chromadb")
+        from langchain_chroma import Chroma
+
+        monkeypatch.setattr(vector_store_adapter, "Chroma", Chroma)
+    embeddings = HashingEmbeddings(64)
+    monkeypatch.setattr(vector_store_adapter, "get_embeddings", lambda: embeddings)
+    adapter = vector_store_adapter.VectorStoreAdapter(str(tmp_path), backend=backend)
+    adapter.upsert_documents(
+        ["a", "b", "c"],
+        ["reajuste anual pelo IPCA", "multa por atraso", "seguro garantia"],
+        [{"source": "c1.pdf"}, {"source": "c1.pdf"}, {"source": "c2.pdf"}],
+    )
+    calls = []
+    monkeypatch.setattr(
+        embeddings, "embed_documents", lambda texts: calls.append(texts) or []
+    )
+
+    assert adapter.update_metadata({"source": "c1.pdf"}, {"moeda": "USD"}) == 2
+    assert calls == []
+    results = adapter.similarity_search("reajuste IPCA", k=3, where={"moeda": "USD"})
+    assert [doc.metadata for doc, _ in results] == [
+        {"source": "c1.pdf", "moeda": "USD"},
+        {"source": "c1.pdf", "moeda": "USD"},
+    ]
+    assert results[0][0].page_content == "reajuste anual pelo IPCA"
+
+    assert adapter.delete_where({"source": "c1.pdf"}) == 2
+    assert adapter.delete_where({"source": "c1.pdf"}) == 0
+    assert [d.page_content for d, _ in adapter.similarity_search("IPCA", k=3)] == [
+        "seguro garantia"
+    ]
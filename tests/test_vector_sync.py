@@ -0,0 +1,92 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.processing.vector_sync import ContractVectorSync
+from app.storage.relational_db_adapter import Contract, RelationalDBAdapter
+
+
+# Armazenamento vetorial em memória com os trechos gravados pela ingestão
+class DummyVectorStore:
+    def __init__(self):
+        self.docs = {}
+        self.updates = 0
+
+    def add(self, doc_id, text, metadata):
+        self.docs[doc_id] = (text, dict(metadata))
+
+    def update_metadata(self, where, metadata):
+        found = [i for i, (_, md) in self.docs.items() if md.get("source") == where["source"]]
+        for doc_id in found:
+            text, md = self.docs[doc_id]
+            self.docs[doc_id] = (text, {**md, **metadata})
+        self.updates += len(found)
+        return len(found)
+
+    def delete_where(self, where):
+        found = [i for i, (_, md) in self.docs.items() if md.get("source") == where["source"]]
+        for doc_id in found:
+            del self.docs[doc_id]
+        return len(found)
+
+    def persist(self):
+        pass
+
+
+# Cada execução processa somente as alterações desde a anterior
+def test_sync_processes_only_changes():
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.add_contract_structured(contrato="C1", path="data/c1.pdf", moeda="BRL")
+    db.add_contract_structured(contrato="C2", path="data/c2.pdf", moeda="BRL")
+    db.add_contract_structured(contrato="C3", moeda="BRL")
+    store = DummyVectorStore()
+    store.add("a", "trecho 1 do C1", {"source": "data/c1.pdf"})
+    store.add("b", "trecho 2 do C1", {"source": "data/c1.pdf"})
+    store.add("c", "texto do C2", {"source": "data/c2.pdf"})
+    sync = ContractVectorSync(store, db, batch_size=1)
+
+    exec_id = sync.run()
+    # Nenhum documento novo: os trechos existentes recebem os metadados
+    assert set(store.docs) == {"a", "b", "c"}
+    assert store.docs["a"] == (
+        "trecho 1 do C1",
+        {"source": "data/c1.pdf", "contract_id": 1, "contrato": "C1", "moeda": "BRL"},
+    )
+    assert store.docs["b"][1]["contrato"] == "C1"
+    assert db.get_execution(exec_id).status == "success"
+
+    store.updates = 0
+    sync.run()
+    assert store.updates == 0
+
+    session = db._Session()
+    session.query(Contract).filter_by(id=2).update({"moeda": "USD"})
+    session.query(Contract).filter_by(id=1).delete()
+    session.commit()
+    session.close()
+
+    sync.run()
+    assert store.updates == 1
+    assert set(store.docs) == {"c"}
+    assert store.docs["c"][0] == "texto do C2"
+    # Metadados usados nos filtros da busca vetorial acompanham o documento
+    assert store.docs["c"][1]["moeda"] == "USD"
+    assert db.get_consumer_offset("vector_store") == db.last_change_seq()
+
+
+# Recarga completa recria os contratos sem apagar os documentos do vetor
+def test_reload_keeps_documents_of_recreated_contracts():
+    db = RelationalDBAdapter(db_url="sqlite:///:memory:")
+    db.add_contract_structured(contrato="C1", path="data/c1.pdf", moeda="BRL")
+    store = DummyVectorStore()
+    store.add("a", "texto do C1", {"source": "data/c1.pdf"})
+    sync = ContractVectorSync(store, db, batch_size=1)
+    sync.run()
+
+    db.clear_contracts()
+    db.add_contract_structured(contrato="C1", path="data/c1.pdf", moeda="EUR")
+    sync.run()
+    assert store.docs["a"][1]["moeda"] == "EUR"